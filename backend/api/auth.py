@@ -1,43 +1,126 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
-from core.database import get_db
-from core.auth import authenticate_user, create_access_token, get_current_user
-from schemas.user import UserCreate, User, Token
+from sqlalchemy.ext.asyncio import AsyncSession
+from core.database import get_async_db
+from core.auth import (
+    authenticate_user, create_user_access_token, decode_access_token, get_current_user,
+    optional_oauth2_scheme, token_denylist, user_cache
+)
+from core.passwords import PasswordHasherBusy, password_hasher
+from core.permissions import require_profiling_token
+from core.throttle import login_throttle
+from schemas.user import UserCreate, User, Token, TokenRefresh
 from datetime import timedelta
 from core.config import settings
 import crud
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
+def _token_response(user, refresh_token: str) -> dict:
+    access_token_expires = timedelta(minutes=settings.access_token_expire_minutes)
+    return {
+        "access_token": create_user_access_token(user, expires_delta=access_token_expires),
+        "token_type": "bearer",
+        "refresh_token": refresh_token,
+        "expires_in": int(access_token_expires.total_seconds()),
+    }
+
+def _hasher_busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many authentication requests, try again shortly",
+        headers={"Retry-After": "1"},
+    )
+
 @router.post("/register", response_model=User)
-async def register(user: UserCreate, db: Session = Depends(get_db)):
-    db_user = crud.get_user_by_username(db, username=user.username)
+async def register(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    db_user = await crud.aio.get_user_by_username(db, username=user.username)
     if db_user:
         raise HTTPException(status_code=400, detail="Username already registered")
     
-    db_user = crud.get_user_by_email(db, email=user.email)
+    db_user = await crud.aio.get_user_by_email(db, email=user.email)
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     
-    return crud.create_user(db=db, user=user)
+    try:
+        hashed_password = await password_hasher.hash(user.password)
+    except PasswordHasherBusy:
+        raise _hasher_busy()
+    return await crud.aio.create_user(db=db, user=user, hashed_password=hashed_password)
 
 @router.post("/token", response_model=Token)
-async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = authenticate_user(db, form_data.username, form_data.password)
+async def login_for_access_token(
+    request: Request,
+    form_data: OAuth2PasswordRequestForm = Depends(),
+    db: AsyncSession = Depends(get_async_db),
+):
+    address = request.client.host if request.client else None
+    retry_after = login_throttle.check(form_data.username, address)
+    if retry_after:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many login attempts, try again later",
+            headers={"Retry-After": str(retry_after)},
+        )
+    login_throttle.attempt(address)
+    
+    try:
+        user = await authenticate_user(db, form_data.username, form_data.password)
+    except PasswordHasherBusy:
+        raise _hasher_busy()
     if not user:
+        login_throttle.failure(form_data.username)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    access_token_expires = timedelta(minutes=settings.access_token_expire_minutes)
-    access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
-    )
-    return {"access_token": access_token, "token_type": "bearer"}
+    login_throttle.success(form_data.username)
+    refresh_token = await crud.aio.create_refresh_token(db, user.id)
+    return _token_response(user, refresh_token)
+
+@router.post("/refresh", response_model=Token)
+async def refresh_access_token(body: TokenRefresh, db: AsyncSession = Depends(get_async_db)):
+    """Exchange a refresh token for a new access/refresh pair; the old refresh token stops working."""
+    rotated = await crud.aio.rotate_refresh_token(db, body.refresh_token)
+    if rotated is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or expired refresh token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    user, refresh_token = rotated
+    return _token_response(user, refresh_token)
+
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(
+    body: TokenRefresh,
+    token: str = Depends(optional_oauth2_scheme),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Revoke this session's refresh tokens and, if sent, the current access token."""
+    await crud.aio.revoke_refresh_token(db, body.refresh_token)
+    payload = decode_access_token(token) if token else None
+    if payload and payload.get("jti"):
+        token_denylist.revoke_token(payload["jti"], payload["exp"])
+
+@router.post("/logout/all", status_code=status.HTTP_204_NO_CONTENT)
+async def logout_everywhere(current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    """Revoke every refresh token of the user and all access tokens issued so far."""
+    version = await crud.aio.revoke_user_tokens(db, current_user.id)
+    token_denylist.revoke_user(current_user.id, version)
+    user_cache.invalidate_user(current_user.id)
 
 @router.get("/me", response_model=User)
 async def read_users_me(current_user: User = Depends(get_current_user)):
     return current_user
 
+@router.get("/cache/stats", dependencies=[Depends(require_profiling_token)])
+async def read_auth_cache_stats():
+    """Hit/miss counters of the authenticated user cache, for sizing it."""
+    return user_cache.stats()
+
+@router.get("/login/stats", dependencies=[Depends(require_profiling_token)])
+async def read_login_stats():
+    """Password hashing pool load and login throttling counters."""
+    return {"hasher": password_hasher.stats(), "throttle": login_throttle.stats()}
@@ -1,157 +1,368 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from core.database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import StreamingResponse
+from typing import Literal, Optional
+import math
+import orjson
+from sqlalchemy.ext.asyncio import AsyncSession
+from core.database import AsyncSessionLocal, get_async_db
 from core.auth import get_current_user
+from core.autosave import BufferedDiagram, autosave_buffer
+from core.permissions import (
+    require_diagram_access, require_project_access, require_saved_diagram_access, require_saved_project_access
+)
+from core.realtime import hub
+from core.locks import lock_service
+from core.spatial import spatial_indexes
+from core.http_cache import (
+    CACHE_CONTROL, diagram_etag, diagram_list_etag, if_match_fails, if_none_match, not_modified, set_etag
+)
+from models.diagram import Diagram as DiagramModel
+from models.project import Project as ProjectModel
 from schemas.user import User
-from schemas.diagram import DiagramCreate, Diagram, DiagramLock
+from schemas.diagram import (
+    DiagramCreate, DiagramUpdate, Diagram, DiagramSummary, DiagramLock, DiagramLockRenewal, DiagramContentPatch, DiagramContentPatchResult,
+    DiagramElement, DiagramElementBatch, DiagramElementBatchResult
+)
+from schemas.document import DiagramDocumentError, parse_diagram_document, validate_diagram_element
 import crud
 
 router = APIRouter(tags=["diagrams"])
 
-@router.get("/projects/{project_id}/diagrams/", response_model=list[Diagram])
+# Elements fetched per query when streaming a viewport
+ELEMENT_STREAM_CHUNK = 500
+
+def _raw_content_response(db_diagram: DiagramModel, etag: str) -> Response:
+    """Serialize a diagram with ``content`` embedded as JSON instead of an escaped string.
+
+    The stored text is spliced into the body as-is, so it is neither parsed
+    nor escaped. Content that did not parse as a diagram document when it was
+    saved (element_count is unset) is sent as a string, as in the default mode.
+    """
+    diagram = Diagram.model_validate(db_diagram)
+    fields = diagram.model_dump(mode="json", exclude={"content"})
+    if diagram.content is not None and db_diagram.element_count is not None:
+        body = orjson.dumps(fields)[:-1] + b',"content":' + diagram.content.encode("utf-8") + b"}"
+    else:
+        body = orjson.dumps({**fields, "content": diagram.content})
+    return Response(
+        content=body, media_type="application/json",
+        headers={"ETag": etag, "Cache-Control": CACHE_CONTROL},
+    )
+
+@router.get("/projects/{project_id}/diagrams/", response_model=list[DiagramSummary])
 async def read_diagrams(
     project_id: int, 
-    current_user: User = Depends(get_current_user), 
-    db: Session = Depends(get_db)
+    request: Request, 
+    response: Response, 
+    db_project: ProjectModel = Depends(require_saved_project_access), 
+    db: AsyncSession = Depends(get_async_db)
 ):
-    # Check if user has access to project
-    db_project = crud.get_project(db, project_id=project_id)
-    if db_project is None:
-        raise HTTPException(status_code=404, detail="Project not found")
-    if not crud.is_project_member(db, project_id=project_id, user_id=current_user.id):
-        raise HTTPException(status_code=403, detail="Not enough permissions")
-    
-    diagrams = crud.get_project_diagrams(db, project_id=project_id)
+    """List diagrams without content; fetch GET /diagrams/{id} to open one."""
+    diagrams = await crud.aio.get_project_diagram_summaries(db, project_id=project_id)
+    etag = diagram_list_etag(project_id, diagrams)
+    if if_none_match(request, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
     return diagrams
 
 @router.post("/projects/{project_id}/diagrams/", response_model=Diagram)
 async def create_diagram(
     project_id: int, 
     diagram: DiagramCreate, 
-    current_user: User = Depends(get_current_user), 
-    db: Session = Depends(get_db)
+    db_project: ProjectModel = Depends(require_project_access), 
+    db: AsyncSession = Depends(get_async_db)
 ):
-    # Check if user has access to project
-    db_project = crud.get_project(db, project_id=project_id)
-    if db_project is None:
-        raise HTTPException(status_code=404, detail="Project not found")
-    if not crud.is_project_member(db, project_id=project_id, user_id=current_user.id):
-        raise HTTPException(status_code=403, detail="Not enough permissions")
-    
     # Create a new diagram with the correct project_id
     diagram_data = diagram.model_dump()
     diagram_data['project_id'] = project_id
     diagram_with_project = DiagramCreate(**diagram_data)
-    return crud.create_diagram(db=db, diagram=diagram_with_project)
+    return await crud.aio.create_diagram(db=db, diagram=diagram_with_project)
 
 @router.get("/diagrams/{diagram_id}", response_model=Diagram)
 async def read_diagram(
+    request: Request, 
+    response: Response, 
+    content_format: Literal["string", "json"] = Query(default="string"), 
+    db_diagram: DiagramModel = Depends(require_diagram_access), 
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get a diagram; ``content_format=json`` embeds content as a JSON value rather than a string."""
+    # A buffered autosave is served as the diagram's current state
+    diagram = autosave_buffer.view(db_diagram)
+    # The access check loaded only metadata: revalidation never touches the content
+    etag = diagram_etag(diagram) if content_format == "string" else diagram_etag(diagram, content_format)
+    if if_none_match(request, etag):
+        return not_modified(etag)
+    if diagram is db_diagram:
+        diagram = await crud.aio.load_diagram_content(db, db_diagram=db_diagram)
+    if content_format == "json":
+        return _raw_content_response(diagram, etag)
+    set_etag(response, etag)
+    return diagram
+
+@router.put("/diagrams/{diagram_id}", response_model=Diagram)
+async def update_diagram(
     diagram_id: int, 
+    diagram_update: DiagramUpdate, 
+    request: Request, 
+    response: Response, 
+    db_diagram: DiagramModel = Depends(require_diagram_access), 
     current_user: User = Depends(get_current_user), 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    db_diagram = crud.get_diagram(db, diagram_id=diagram_id)
-    if db_diagram is None:
-        raise HTTPException(status_code=404, detail="Diagram not found")
+    # Optimistic concurrency: reject the write if the client saw an older version
+    current = autosave_buffer.view(db_diagram)
+    if if_match_fails(request, diagram_etag(current), diagram_etag(current, "json")):
+        raise HTTPException(status_code=412, detail="Diagram has changed since it was fetched")
+    fields = diagram_update.model_dump(exclude_unset=True)
+    document = None
+    if fields.get("content") is not None:
+        # Parsed once here; crud reuses the document for hashing, diffing and elements
+        try:
+            document = parse_diagram_document(fields["content"], db_diagram.diagram_type)
+        except DiagramDocumentError as exc:
+            raise RequestValidationError(exc.located(("body", "content")))
+    discarded = False
+    if autosave_buffer.enabled and document is not None and fields.keys() == {"content"}:
+        # Write-behind: acknowledged now, stored with the next flush of the diagram
+        pending, changed = await autosave_buffer.accept(db_diagram, fields["content"], document, current_user.id)
+        if pending is not None:
+            buffered = BufferedDiagram(db_diagram, pending)
+            set_etag(response, diagram_etag(buffered))
+            if changed:
+                await hub.publish(diagram_id, {
+                    "type": "content.replaced",
+                    "revision": pending.revision,
+                    "name": db_diagram.name,
+                    "user_id": current_user.id,
+                })
+            return buffered
+        discarded = changed  # back to the stored content
+    elif autosave_buffer.pending(diagram_id) is not None:
+        # Renames and direct saves are written after the buffered save they follow
+        await autosave_buffer.flush(diagram_id)
+        await db.refresh(db_diagram)
+    previous_revision = db_diagram.revision
+    updated = await crud.aio.update_diagram(
+        db=db, diagram_id=diagram_id, diagram_update=fields, user_id=current_user.id, document=document
+    )
+    updated = await crud.aio.load_diagram_content(db, db_diagram=updated)
+    set_etag(response, diagram_etag(updated))
+    content_changed = updated.revision != previous_revision or discarded
+    if not content_changed and fields.keys() <= {"content"}:
+        return updated  # identical content, nothing was saved
+    # Content can be megabytes: viewers get the new revision and refetch
+    await hub.publish(diagram_id, {
+        "type": "content.replaced" if content_changed else "diagram.updated",
+        "revision": updated.revision,
+        "name": updated.name,
+        "user_id": current_user.id,
+    })
+    return updated
+
+@router.patch("/diagrams/{diagram_id}/content", response_model=DiagramContentPatchResult)
+async def patch_diagram_content(
+    diagram_id: int, 
+    patch: DiagramContentPatch, 
+    response: Response, 
+    db_diagram: DiagramModel = Depends(require_saved_diagram_access), 
+    current_user: User = Depends(get_current_user), 
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Apply an RFC 6902 JSON Patch to the diagram content at a given base revision."""
+    operations = [
+        operation.model_dump(by_alias=True, exclude_unset=True)
+        for operation in patch.operations
+    ]
+    try:
+        patched = await crud.aio.patch_diagram_content(
+            db=db, diagram_id=diagram_id, base_revision=patch.base_revision, operations=operations,
+            user_id=current_user.id
+        )
+    except ValueError as exc:  # JsonPatchError or malformed stored content
+        raise HTTPException(status_code=422, detail=f"Cannot apply patch: {exc}")
     
-    # Check if user has access to project
-    if not crud.is_project_member(db, project_id=db_diagram.project_id, user_id=current_user.id):
-        raise HTTPException(status_code=403, detail="Not enough permissions")
+    if patched is None:
+        raise HTTPException(status_code=409, detail="Diagram content has changed since base revision")
+    set_etag(response, diagram_etag(patched))
+    if patched.revision == patch.base_revision:
+        return patched  # patch left the content unchanged
     
-    return db_diagram
+    await hub.publish(diagram_id, {
+        "type": "content.patched",
+        "base_revision": patch.base_revision,
+        "revision": patched.revision,
+        "operations": operations,
+        "user_id": current_user.id,
+    })
+    return patched
 
-@router.put("/diagrams/{diagram_id}", response_model=Diagram)
-async def update_diagram(
+def _parse_bbox(bbox: str) -> tuple:
+    try:
+        x1, y1, x2, y2 = (float(value) for value in bbox.split(","))
+    except (ValueError, OverflowError):
+        raise HTTPException(status_code=400, detail="Invalid bbox, expected x1,y1,x2,y2")
+    if not all(math.isfinite(value) for value in (x1, y1, x2, y2)):
+        raise HTTPException(status_code=422, detail="bbox coordinates must be finite numbers")
+    x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
+    return min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2)
+
+async def _stream_elements(diagram_id: int, keys_by_type: list[tuple]):
+    """NDJSON lines of the given elements, fetched and sent chunk by chunk."""
+    # The request's session is gone once streaming starts
+    async with AsyncSessionLocal() as db:
+        for element_type, keys in keys_by_type:
+            for start in range(0, len(keys), ELEMENT_STREAM_CHUNK):
+                rows = await crud.aio.get_diagram_elements_by_keys(
+                    db, diagram_id=diagram_id, element_type=element_type,
+                    keys=keys[start:start + ELEMENT_STREAM_CHUNK]
+                )
+                yield b"".join(
+                    orjson.dumps(DiagramElement.model_validate(row).model_dump(mode="json")) + b"\n"
+                    for row in rows
+                )
+
+@router.get("/diagrams/{diagram_id}/elements", response_model=list[DiagramElement])
+async def read_diagram_elements(
+    diagram_id: int, 
+    element_type: Optional[Literal["node", "edge"]] = None, 
+    bbox: Optional[str] = Query(default=None, description="Viewport x1,y1,x2,y2"), 
+    db_diagram: DiagramModel = Depends(require_saved_diagram_access), 
+    db: AsyncSession = Depends(get_async_db)
+):
+    """List diagram elements.
+
+    With ``bbox`` only the nodes intersecting the viewport and the edges
+    incident to them are returned, streamed as NDJSON (nodes first) so large
+    diagrams can be rendered progressively.
+    """
+    if bbox is None:
+        return await crud.aio.get_diagram_elements(db, diagram_id=diagram_id, element_type=element_type)
+    
+    box = _parse_bbox(bbox)
+    index = spatial_indexes.get(diagram_id, db_diagram.revision)
+    if index is None:
+        index = await crud.aio.build_diagram_spatial_index(db, diagram_id=diagram_id, revision=db_diagram.revision)
+        spatial_indexes.put(diagram_id, index)
+    nodes, edges = index.query(*box)
+    keys_by_type = [
+        (kind, keys) for kind, keys in (("node", nodes), ("edge", edges))
+        if element_type in (None, kind)
+    ]
+    await db.close()
+    return StreamingResponse(_stream_elements(diagram_id, keys_by_type), media_type="application/x-ndjson")
+
+@router.post("/diagrams/{diagram_id}/elements/batch", response_model=DiagramElementBatchResult)
+async def apply_diagram_element_batch(
     diagram_id: int, 
-    diagram_update: dict, 
+    batch: DiagramElementBatch, 
+    response: Response, 
+    db_diagram: DiagramModel = Depends(require_saved_diagram_access), 
     current_user: User = Depends(get_current_user), 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    db_diagram = crud.get_diagram(db, diagram_id=diagram_id)
-    if db_diagram is None:
-        raise HTTPException(status_code=404, detail="Diagram not found")
+    """Upsert and delete nodes/edges in one transaction, updating the content to match."""
+    errors = []
+    for index, item in enumerate(batch.upsert):
+        try:
+            validate_diagram_element(item.element_type, item.data, db_diagram.diagram_type)
+        except DiagramDocumentError as exc:
+            errors.extend(exc.located(("body", "upsert", index, "data")))
+    if errors:
+        raise RequestValidationError(errors)
+    upserts = [(item.element_type, item.data) for item in batch.upsert]
+    deletes = [(item.element_type, item.key) for item in batch.delete]
+    previous_revision = db_diagram.revision
+    try:
+        updated = await crud.aio.apply_diagram_element_batch(
+            db, diagram_id=diagram_id, base_revision=batch.base_revision, upserts=upserts, deletes=deletes,
+            user_id=current_user.id
+        )
+    except ValueError as exc:  # stored content is not a diagram document
+        raise HTTPException(status_code=422, detail=f"Cannot apply element batch: {exc}")
     
-    # Check if user has access to project
-    if not crud.is_project_member(db, project_id=db_diagram.project_id, user_id=current_user.id):
-        raise HTTPException(status_code=403, detail="Not enough permissions")
+    if updated is None:
+        raise HTTPException(status_code=409, detail="Diagram content has changed since base revision")
+    set_etag(response, diagram_etag(updated))
+    result = {
+        "id": updated.id, "revision": updated.revision, "updated_at": updated.updated_at,
+        "upserted": len(upserts), "deleted": len(deletes),
+    }
+    if updated.revision == previous_revision:
+        return result  # batch left the content unchanged
     
-    return crud.update_diagram(db=db, diagram_id=diagram_id, diagram_update=diagram_update)
+    await hub.publish(diagram_id, {
+        "type": "elements.changed",
+        "base_revision": previous_revision,
+        "revision": updated.revision,
+        "upsert": [item.model_dump() for item in batch.upsert],
+        "delete": [item.model_dump() for item in batch.delete],
+        "user_id": current_user.id,
+    })
+    return result
 
 @router.delete("/diagrams/{diagram_id}")
 async def delete_diagram(
     diagram_id: int, 
+    db_diagram: DiagramModel = Depends(require_diagram_access), 
     current_user: User = Depends(get_current_user), 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    db_diagram = crud.get_diagram(db, diagram_id=diagram_id)
-    if db_diagram is None:
-        raise HTTPException(status_code=404, detail="Diagram not found")
-    
-    # Check if user has access to project
-    if not crud.is_project_member(db, project_id=db_diagram.project_id, user_id=current_user.id):
-        raise HTTPException(status_code=403, detail="Not enough permissions")
-    
-    crud.delete_diagram(db=db, diagram_id=diagram_id)
+    await crud.aio.delete_diagram(db=db, diagram_id=diagram_id)
+    # The id can be handed out again, with revisions counting from zero
+    spatial_indexes.invalidate(diagram_id)
+    await hub.publish(diagram_id, {"type": "diagram.deleted", "user_id": current_user.id})
     return {"message": "Diagram deleted successfully"}
 
 # Lock endpoints
 @router.post("/diagrams/{diagram_id}/lock", response_model=DiagramLock)
 async def lock_diagram(
     diagram_id: int, 
-    current_user: User = Depends(get_current_user), 
-    db: Session = Depends(get_db)
+    db_diagram: DiagramModel = Depends(require_diagram_access), 
+    current_user: User = Depends(get_current_user)
 ):
-    db_diagram = crud.get_diagram(db, diagram_id=diagram_id)
-    if db_diagram is None:
-        raise HTTPException(status_code=404, detail="Diagram not found")
-    
-    # Check if user has access to project
-    if not crud.is_project_member(db, project_id=db_diagram.project_id, user_id=current_user.id):
-        raise HTTPException(status_code=403, detail="Not enough permissions")
-    
-    # Check if diagram is already locked
-    existing_lock = crud.get_active_diagram_lock(db, diagram_id=diagram_id)
-    if existing_lock:
-        # If locked by another user, return the existing lock instead of error
-        if existing_lock.user_id != current_user.id:
-            return existing_lock
-    
-    return crud.create_or_update_diagram_lock(db=db, diagram_id=diagram_id, user_id=current_user.id)
+    # If locked by another user, return the existing lock instead of error
+    lock, acquired = await lock_service.acquire(diagram_id, current_user)
+    if acquired:
+        await hub.publish(diagram_id, {
+            "type": "lock.acquired",
+            "lock": DiagramLock.model_validate(lock).model_dump(mode="json"),
+        })
+    return lock
+
+@router.post("/diagrams/{diagram_id}/lock/heartbeat", response_model=DiagramLockRenewal)
+async def renew_diagram_lock(
+    diagram_id: int, 
+    current_user: User = Depends(get_current_user)
+):
+    """Extend the current user's lock lease.
+
+    Only the holder can renew, and they passed the access check when
+    acquiring, so this does not touch the database with the memory store.
+    """
+    expires_at = await lock_service.renew(diagram_id, current_user.id)
+    if expires_at is None:
+        raise HTTPException(status_code=409, detail="Diagram lock is not held by the current user")
+    return {"diagram_id": diagram_id, "expires_at": expires_at}
 
 @router.delete("/diagrams/{diagram_id}/lock")
 async def unlock_diagram(
     diagram_id: int, 
-    current_user: User = Depends(get_current_user), 
-    db: Session = Depends(get_db)
+    db_diagram: DiagramModel = Depends(require_saved_diagram_access), 
+    current_user: User = Depends(get_current_user)
 ):
-    db_diagram = crud.get_diagram(db, diagram_id=diagram_id)
-    if db_diagram is None:
-        raise HTTPException(status_code=404, detail="Diagram not found")
-    
-    # Check if user has access to project
-    if not crud.is_project_member(db, project_id=db_diagram.project_id, user_id=current_user.id):
-        raise HTTPException(status_code=403, detail="Not enough permissions")
-    
-    crud.unlock_diagram(db=db, diagram_id=diagram_id, user_id=current_user.id)
+    if await lock_service.release(diagram_id, current_user.id):
+        await hub.publish(diagram_id, {"type": "lock.released", "user_id": current_user.id})
     return {"message": "Diagram unlocked successfully"}
 
 @router.get("/diagrams/{diagram_id}/lock", response_model=DiagramLock)
 async def get_diagram_lock(
     diagram_id: int, 
-    current_user: User = Depends(get_current_user), 
-    db: Session = Depends(get_db)
+    db_diagram: DiagramModel = Depends(require_diagram_access)
 ):
-    db_diagram = crud.get_diagram(db, diagram_id=diagram_id)
-    if db_diagram is None:
-        raise HTTPException(status_code=404, detail="Diagram not found")
-    
-    # Check if user has access to project
-    if not crud.is_project_member(db, project_id=db_diagram.project_id, user_id=current_user.id):
-        raise HTTPException(status_code=403, detail="Not enough permissions")
-    
-    lock = crud.get_active_diagram_lock(db, diagram_id=diagram_id)
+    lock = await lock_service.get(diagram_id)
     if lock is None:
         raise HTTPException(status_code=404, detail="Diagram is not locked")
     
     return lock
-
@@ -0,0 +1,89 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from typing import Literal, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from core.config import settings
+from core.content_store import read_content, stored_hash
+from core.database import get_async_db
+from core.export import EXPORT_FORMATS, ExportBusy, ExportUnavailable, export_key, export_service
+from core.http_cache import make_etag, if_none_match, not_modified, set_etag
+from core.permissions import require_profiling_token, require_saved_diagram_access
+from models.diagram import Diagram as DiagramModel
+import crud
+
+router = APIRouter(tags=["exports"])
+
+async def _export_response(
+    request: Request,
+    db: AsyncSession,
+    db_diagram: DiagramModel,
+    export_format: str,
+    width: Optional[int] = None,
+    filename: Optional[str] = None,
+) -> Response:
+    content = None
+    digest = db_diagram.content_hash
+    if digest is None:
+        # Legacy row without a stored hash: the content is needed to derive the key
+        db_diagram = await crud.aio.load_diagram_content(db, db_diagram=db_diagram)
+        content = read_content(db_diagram)
+        digest = stored_hash(db_diagram)
+
+    key = export_key(digest, export_format, width)
+    etag = make_etag("export", key)
+    if if_none_match(request, etag):
+        return not_modified(etag)
+
+    data = await export_service.cached(key)
+    if data is None:
+        if content is None:
+            db_diagram = await crud.aio.load_diagram_content(db, db_diagram=db_diagram)
+            content = read_content(db_diagram)
+        try:
+            data = await export_service.render(key, content, export_format, width)
+        except ExportUnavailable as exc:
+            raise HTTPException(status_code=501, detail=str(exc))
+        except ExportBusy:
+            raise HTTPException(
+                status_code=503, detail="Too many exports in progress, try again shortly",
+                headers={"Retry-After": "1"},
+            )
+
+    response = Response(content=data, media_type=EXPORT_FORMATS[export_format])
+    set_etag(response, etag)
+    if filename:
+        response.headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+def _filename(db_diagram: DiagramModel, export_format: str) -> str:
+    # Header-safe ASCII name; the diagram name may contain anything
+    name = "".join(ch if ch.isascii() and (ch.isalnum() or ch in "-_ ") else "_" for ch in db_diagram.name)
+    return f"{name.strip() or 'diagram'}.{export_format}"
+
+@router.get("/diagrams/{diagram_id}/export")
+async def export_diagram(
+    request: Request,
+    export_format: Literal["svg", "png", "pdf"] = Query(default="svg", alias="format"),
+    width: Optional[int] = Query(default=None, ge=16, le=8192),
+    download: bool = False,
+    db_diagram: DiagramModel = Depends(require_saved_diagram_access),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Render the diagram as SVG, PNG or PDF (PNG/PDF need cairosvg on the server)."""
+    filename = _filename(db_diagram, export_format) if download else None
+    return await _export_response(request, db, db_diagram, export_format, width=width, filename=filename)
+
+@router.get("/diagrams/{diagram_id}/thumbnail")
+async def read_diagram_thumbnail(
+    request: Request,
+    export_format: Literal["svg", "png"] = Query(default="svg", alias="format"),
+    width: int = Query(default=settings.export_thumbnail_width, ge=16, le=1024),
+    db_diagram: DiagramModel = Depends(require_saved_diagram_access),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Small preview image of the diagram for dashboards and diagram lists."""
+    return await _export_response(request, db, db_diagram, export_format, width=width)
+
+@router.get("/exports/stats", dependencies=[Depends(require_profiling_token)])
+async def read_export_stats():
+    """Process pool and render cache counters."""
+    return export_service.stats()
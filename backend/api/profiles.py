@@ -0,0 +1,26 @@
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import FileResponse
+from core.database import recent_slow_queries
+from core.permissions import require_profiling_token
+from core.profiling import profile_store
+
+router = APIRouter(prefix="/profiles", tags=["profiles"])
+
+@router.get("/", dependencies=[Depends(require_profiling_token)])
+async def list_profiles():
+    """Stored request profiles, newest first."""
+    return profile_store.list()
+
+@router.get("/slow-queries", dependencies=[Depends(require_profiling_token)])
+async def list_slow_queries():
+    """The latest statements over SLOW_QUERY_THRESHOLD_MS, newest first."""
+    return list(reversed(recent_slow_queries))
+
+@router.get("/{profile_id}", dependencies=[Depends(require_profiling_token)])
+async def download_profile(profile_id: str):
+    found = profile_store.get(profile_id)
+    if found is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    path, meta = found
+    media_type = "text/html" if meta["format"] == "html" else "application/octet-stream"
+    return FileResponse(path, media_type=media_type, filename=f"profile-{profile_id}.{meta['format']}")
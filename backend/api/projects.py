@@ -1,55 +1,252 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from core.database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from typing import Optional
+from datetime import datetime
+import base64
+import binascii
+import orjson
+from sqlalchemy.ext.asyncio import AsyncSession
+from core.config import settings
+from core.database import AsyncSessionLocal, get_async_db
 from core.auth import get_current_user
+from core.permissions import require_project_access, require_saved_project_access
+from core.http_cache import project_etag, if_none_match, not_modified, set_etag
+from core.spatial import spatial_indexes
+from core.project_archive import (
+    ARCHIVE_FORMAT, ARCHIVE_MEDIA_TYPE, ARCHIVE_VERSION, ArchiveError, dump_record, read_records
+)
+from models.diagram import DiagramType
+from models.project import Project as ProjectModel
 from schemas.user import User
-from schemas.project import ProjectCreate, Project
+from schemas.document import DiagramDocumentError, parse_diagram_document, validate_diagram_document
+from schemas.project import ProjectCreate, Project, ProjectImportResult, ProjectPage
 import crud
 
 router = APIRouter(prefix="/projects", tags=["projects"])
 
+def _encode_cursor(project: ProjectModel) -> str:
+    # The anchor's sort key travels in the cursor: it is not looked up again,
+    # so the next page is right even if that project changes or is deleted
+    activity = project.updated_at or project.created_at
+    payload = orjson.dumps([activity.isoformat(), project.id])
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+def _decode_cursor(cursor: str) -> tuple:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        activity, project_id = orjson.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(activity), int(project_id)
+    except (binascii.Error, orjson.JSONDecodeError, TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
 @router.get("/", response_model=list[Project])
 async def read_projects(
     skip: int = 0, 
     limit: int = 100, 
     current_user: User = Depends(get_current_user), 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    projects = crud.get_user_accessible_projects(db, user_id=current_user.id, skip=skip, limit=limit)
+    projects = await crud.aio.get_user_accessible_projects(db, user_id=current_user.id, skip=skip, limit=limit)
     return projects
 
+@router.get("/page", response_model=ProjectPage)
+async def read_projects_page(
+    cursor: Optional[str] = None, 
+    limit: int = Query(default=50, ge=1, le=200), 
+    current_user: User = Depends(get_current_user), 
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Keyset-paginated project list; pass next_cursor back to get the following page."""
+    after = _decode_cursor(cursor) if cursor else None
+    # Fetch one extra row to know whether another page exists
+    projects = await crud.aio.get_user_accessible_projects_page(
+        db, user_id=current_user.id, after=after, limit=limit + 1
+    )
+    next_cursor = _encode_cursor(projects[limit - 1]) if len(projects) > limit else None
+    return {"items": projects[:limit], "next_cursor": next_cursor}
+
 @router.post("/", response_model=Project)
 async def create_project(
     project: ProjectCreate, 
     current_user: User = Depends(get_current_user), 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
+):
+    return await crud.aio.create_project(db=db, project=project, user_id=current_user.id)
+
+async def _stream_project_archive(project_id: int, name: str, description: Optional[str], owner_id: int):
+    """NDJSON archive of a project, read and sent one batch of diagrams at a time."""
+    # The request's session is gone once streaming starts
+    async with AsyncSessionLocal() as db:
+        owner = await crud.aio.get_user(db, user_id=owner_id)
+        yield dump_record(
+            "header", format=ARCHIVE_FORMAT, version=ARCHIVE_VERSION,
+            exported_at=datetime.utcnow().isoformat() + "Z",
+        )
+        yield dump_record("project", name=name, description=description, owner=owner.username if owner else None)
+        
+        members = await crud.aio.get_project_archive_members(db, project_id=project_id)
+        if members:
+            yield b"".join(dump_record("member", username=m.username, email=m.email) for m in members)
+        
+        diagram_count = 0
+        after_id = 0
+        while True:
+            batch = await crud.aio.get_project_archive_diagrams(
+                db, project_id=project_id, after_id=after_id, limit=settings.project_archive_batch_size
+            )
+            if not batch:
+                break
+            after_id = batch[-1].pop("id")
+            for record in batch[:-1]:
+                record.pop("id")
+            diagram_count += len(batch)
+            yield b"".join(dump_record("diagram", **record) for record in batch)
+        yield dump_record("end", members=len(members), diagrams=diagram_count)
+
+@router.get("/{project_id}/export")
+async def export_project(db_project: ProjectModel = Depends(require_saved_project_access)):
+    """Stream the project, its members and its diagrams as an NDJSON archive."""
+    filename = f"project-{db_project.id}.ndjson"
+    return StreamingResponse(
+        _stream_project_archive(db_project.id, db_project.name, db_project.description, db_project.owner_id),
+        media_type=ARCHIVE_MEDIA_TYPE,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+def _archive_diagram(record: dict, line: int) -> dict:
+    name, diagram_type, content = record.get("name"), record.get("diagram_type"), record.get("content")
+    if not isinstance(name, str) or not name.strip():
+        raise ArchiveError("Diagram name is required", line)
+    if diagram_type not in DiagramType._value2member_map_:
+        raise ArchiveError(f"Unknown diagram type: {diagram_type}", line)
+    diagram_type = DiagramType(diagram_type)
+    document = None
+    try:
+        if isinstance(content, str):
+            document = parse_diagram_document(content, diagram_type)
+        elif content is not None:
+            document = validate_diagram_document(content, diagram_type)
+            content = orjson.dumps(content).decode()
+    except DiagramDocumentError as exc:
+        raise ArchiveError(f"Invalid content of diagram {name!r}: {exc}", line)
+    return {"name": name, "diagram_type": diagram_type, "content": content, "document": document}
+
+async def _import_archive(db: AsyncSession, records, owner_id: int, name: Optional[str]) -> dict:
+    project_id = None
+    usernames, batch = [], []
+    diagram_count = 0
+    header_seen = end_seen = False
+    async for line, record in records:
+        kind = record["type"]
+        if end_seen:
+            raise ArchiveError("Data after the end record", line)
+        if not header_seen:
+            if kind != "header" or record.get("format") != ARCHIVE_FORMAT:
+                raise ArchiveError("Not a project archive", line)
+            if not isinstance(record.get("version"), int) or record["version"] > ARCHIVE_VERSION:
+                raise ArchiveError(f"Unsupported archive version: {record.get('version')}", line)
+            header_seen = True
+        elif kind == "project":
+            if project_id is not None:
+                raise ArchiveError("Duplicate project record", line)
+            project_name = name or record.get("name")
+            if not isinstance(project_name, str) or not project_name.strip():
+                raise ArchiveError("Project name is required", line)
+            description = record.get("description")
+            project_id = await crud.aio.create_imported_project(
+                db, owner_id=owner_id, name=project_name,
+                description=description if isinstance(description, str) else None,
+            )
+        elif project_id is None:
+            raise ArchiveError("Expected the project record", line)
+        elif kind == "member":
+            if isinstance(record.get("username"), str):
+                usernames.append(record["username"])
+        elif kind == "diagram":
+            batch.append(_archive_diagram(record, line))
+            if len(batch) >= settings.project_archive_batch_size:
+                diagram_count += await crud.aio.import_diagram_batch(
+                    db, project_id=project_id, diagrams=batch, user_id=owner_id
+                )
+                batch = []
+        elif kind == "end":
+            end_seen = True
+            expected = record.get("diagrams")
+            if isinstance(expected, int) and expected != diagram_count + len(batch):
+                raise ArchiveError(f"Archive lists {expected} diagrams but contains {diagram_count + len(batch)}", line)
+        else:
+            raise ArchiveError(f"Unknown record type: {kind}", line)
+    if not end_seen:
+        raise ArchiveError("Archive is truncated (no end record)")
+    
+    if batch:
+        diagram_count += await crud.aio.import_diagram_batch(
+            db, project_id=project_id, diagrams=batch, user_id=owner_id
+        )
+    added = await crud.aio.add_imported_members(
+        db, project_id=project_id, owner_id=owner_id, usernames=usernames
+    )
+    return {
+        "project_id": project_id,
+        "diagrams": diagram_count,
+        "members": added,
+        "skipped_members": sorted(set(usernames) - set(added)),
+    }
+
+@router.post("/import", response_model=ProjectImportResult, status_code=status.HTTP_201_CREATED)
+async def import_project(
+    request: Request, 
+    name: Optional[str] = None, 
+    current_user: User = Depends(get_current_user), 
+    db: AsyncSession = Depends(get_async_db)
 ):
-    return crud.create_project(db=db, project=project, user_id=current_user.id)
+    """Create a project from an archive made by GET /projects/{id}/export, in one transaction.
+
+    The body is the NDJSON archive (optionally gzip-compressed); ``name``
+    overrides the archived project name. Members are matched by username.
+    """
+    records = read_records(
+        request.stream(), request.headers.get("content-encoding"), settings.project_import_max_line_bytes
+    )
+    try:
+        result = await _import_archive(db, records, current_user.id, name)
+    except ArchiveError as exc:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail=str(exc))
+    except BaseException:
+        await db.rollback()
+        raise
+    await db.commit()
+    project = await crud.aio.get_project(db, project_id=result.pop("project_id"))
+    return {"project": project, **result}
 
 @router.get("/{project_id}", response_model=Project)
 async def read_project(
-    project_id: int, 
-    current_user: User = Depends(get_current_user), 
-    db: Session = Depends(get_db)
+    request: Request, 
+    response: Response, 
+    db_project: ProjectModel = Depends(require_project_access)
 ):
-    db_project = crud.get_project(db, project_id=project_id)
-    if db_project is None:
-        raise HTTPException(status_code=404, detail="Project not found")
-    if not crud.is_project_member(db, project_id=project_id, user_id=current_user.id):
-        raise HTTPException(status_code=403, detail="Not enough permissions")
+    etag = project_etag(db_project)
+    if if_none_match(request, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
     return db_project
 
 @router.delete("/{project_id}")
 async def delete_project(
     project_id: int, 
     current_user: User = Depends(get_current_user), 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    db_project = crud.get_project(db, project_id=project_id)
+    db_project = await crud.aio.get_project(db, project_id=project_id)
     if db_project is None:
         raise HTTPException(status_code=404, detail="Project not found")
     if db_project.owner_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not enough permissions")
-    crud.delete_project(db=db, project_id=project_id)
+    diagrams = await crud.aio.get_project_diagram_summaries(db, project_id=project_id)
+    await crud.aio.delete_project(db=db, project_id=project_id)
+    # Diagram ids can be handed out again, with revisions counting from zero
+    for diagram in diagrams:
+        spatial_indexes.invalidate(diagram.id)
     return {"message": "Project deleted successfully"}
 
@@ -0,0 +1,63 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, WebSocket, WebSocketDisconnect, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+from core.database import get_async_db
+from core.auth import get_user_from_token
+from core.realtime import Subscriber, hub
+from core.autosave import autosave_buffer
+from core.locks import lock_service
+from schemas.diagram import DiagramLock
+import crud
+
+router = APIRouter(tags=["realtime"])
+
+@router.websocket("/ws/diagrams/{diagram_id}")
+async def diagram_channel(
+    websocket: WebSocket,
+    diagram_id: int,
+    token: Optional[str] = Query(default=None),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Push stream of content, lock and presence events for one diagram.
+
+    Browsers cannot set headers on WebSocket requests, so the access token is
+    passed as the ``token`` query parameter.
+    """
+    try:
+        user = await get_user_from_token(token, db)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    
+    db_diagram, is_member = await crud.aio.get_diagram_with_access(db, diagram_id=diagram_id, user_id=user.id)
+    if db_diagram is None or not is_member:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    
+    lock = await lock_service.get(diagram_id)
+    snapshot = {
+        "revision": autosave_buffer.view(db_diagram).revision,
+        "lock": DiagramLock.model_validate(lock).model_dump(mode="json") if lock else None,
+    }
+    # Release the pooled connection: the socket may stay open for hours
+    await db.close()
+    
+    subscriber = Subscriber(websocket, user_id=user.id, username=user.username)
+    await hub.connect(diagram_id, subscriber, snapshot)
+    try:
+        while True:
+            message = await websocket.receive_json()
+            message_type = message.get("type") if isinstance(message, dict) else None
+            if message_type == "ping":
+                subscriber.offer('{"type":"pong"}')
+            elif message_type == "presence.update":
+                # Cursor/selection state is relayed as-is to the other viewers
+                await hub.publish(diagram_id, {
+                    "type": "presence.update",
+                    **subscriber.presence(),
+                    "state": message.get("state"),
+                })
+    except (WebSocketDisconnect, ValueError):
+        pass
+    finally:
+        await hub.disconnect(diagram_id, subscriber)
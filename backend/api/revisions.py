@@ -0,0 +1,72 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from core.database import get_async_db
+from core.auth import get_current_user
+from core.permissions import require_saved_diagram_access
+from core.realtime import hub
+from models.diagram import Diagram as DiagramModel
+from schemas.user import User
+from schemas.diagram import Diagram, DiagramRevisionInfo, DiagramRevisionContent
+from schemas.document import DiagramDocumentError, parse_diagram_document
+import crud
+
+router = APIRouter(tags=["revisions"])
+
+async def _revision_content(db: AsyncSession, diagram_id: int, revision: int):
+    rebuilt = await crud.aio.get_diagram_revision_content(db, diagram_id=diagram_id, revision=revision)
+    if rebuilt is None:
+        raise HTTPException(status_code=404, detail="Revision not found")
+    return rebuilt
+
+@router.get("/diagrams/{diagram_id}/revisions", response_model=list[DiagramRevisionInfo])
+async def read_diagram_revisions(
+    diagram_id: int, 
+    before: Optional[int] = None, 
+    limit: int = Query(default=50, ge=1, le=200), 
+    db_diagram: DiagramModel = Depends(require_saved_diagram_access), 
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Revision history, newest first; pass the last revision as ``before`` for the next page."""
+    return await crud.aio.list_diagram_revisions(db, diagram_id=diagram_id, before=before, limit=limit)
+
+@router.get("/diagrams/{diagram_id}/revisions/{revision}", response_model=DiagramRevisionContent)
+async def read_diagram_revision(
+    diagram_id: int, 
+    revision: int, 
+    db_diagram: DiagramModel = Depends(require_saved_diagram_access), 
+    db: AsyncSession = Depends(get_async_db)
+):
+    db_revision, content = await _revision_content(db, diagram_id, revision)
+    return {**DiagramRevisionInfo.model_validate(db_revision).model_dump(), "content": content}
+
+@router.post("/diagrams/{diagram_id}/revisions/{revision}/restore", response_model=Diagram)
+async def restore_diagram_revision(
+    diagram_id: int, 
+    revision: int, 
+    db_diagram: DiagramModel = Depends(require_saved_diagram_access), 
+    current_user: User = Depends(get_current_user), 
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Save the content of an earlier revision as a new revision."""
+    _, content = await _revision_content(db, diagram_id, revision)
+    # Revisions saved before content was validated may not be valid documents
+    try:
+        document = parse_diagram_document(content, db_diagram.diagram_type)
+    except DiagramDocumentError as exc:
+        raise HTTPException(status_code=422, detail=f"Revision {revision} is not a valid diagram: {exc}")
+    previous_revision = db_diagram.revision
+    updated = await crud.aio.update_diagram(
+        db=db, diagram_id=diagram_id, diagram_update={"content": content}, user_id=current_user.id,
+        document=document,
+    )
+    updated = await crud.aio.load_diagram_content(db, db_diagram=updated)
+    if updated.revision != previous_revision:
+        await hub.publish(diagram_id, {
+            "type": "content.replaced",
+            "revision": updated.revision,
+            "name": updated.name,
+            "user_id": current_user.id,
+            "restored_from": revision,
+        })
+    return updated
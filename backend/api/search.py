@@ -0,0 +1,31 @@
+from fastapi import APIRouter, Depends, Query
+from typing import Literal, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from core.database import get_async_db
+from core.permissions import require_saved_project_access
+from models.diagram import DiagramType
+from models.project import Project as ProjectModel
+from schemas.diagram import DiagramSearchHit
+import crud
+
+router = APIRouter(tags=["search"])
+
+@router.get("/projects/{project_id}/search", response_model=list[DiagramSearchHit])
+async def search_project(
+    project_id: int,
+    q: str = Query(min_length=1, max_length=200),
+    element_type: Optional[Literal["node", "edge"]] = None,
+    diagram_type: Optional[DiagramType] = None,
+    limit: int = Query(default=50, ge=1, le=200),
+    project: ProjectModel = Depends(require_saved_project_access),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Elements of the project's diagrams whose labels or attributes match every word of ``q``.
+
+    Words match as prefixes; hits are ranked best first and point to the
+    diagram and the element id inside its content.
+    """
+    return await crud.aio.search_project_elements(
+        db, project_id=project_id, query=q, limit=limit,
+        element_type=element_type, diagram_type=diagram_type,
+    )
@@ -0,0 +1,7 @@
+"""
+Load tests and micro-benchmarks for the API hot paths.
+
+Run ``python -m benchmarks --help`` from the backend directory. The package
+only imports the application once the command line has chosen the database,
+so nothing here should be imported from the app itself.
+"""
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Нагрузочные тесты и микробенчмарки API IDMS.
+
+Создаёт синтетические данные (пользователи, проекты с участниками, диаграммы
+BPMN и ERD заданного размера), прогоняет сценарии — вход, список проектов,
+открытие диаграммы, автосохранение, захват и снятие блокировки — и выводит
+p50/p95/p99, пропускную способность и число SQL-запросов на запрос.
+
+По умолчанию приложение запускается внутри процесса на временной базе SQLite.
+С --serve тот же прогон идёт через запущенный здесь uvicorn, с --target — через
+уже работающий сервер (данные создаются в базе из DATABASE_URL, она должна
+совпадать с базой сервера). Результат можно сохранить в JSON (--output) и
+сравнить с прошлым прогоном (--compare).
+
+    python -m benchmarks [--scenarios login,autosave] [--requests 500] [--concurrency 8]
+                         [--serve | --target http://localhost:8000] [--micro]
+                         [--output results.json] [--compare baseline.json]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+
+DEFAULT_SCENARIOS = "login,projects,open,autosave,lock"
+
+def parse_args():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Нагрузочные тесты API IDMS")
+    parser.add_argument("--scenarios", default=DEFAULT_SCENARIOS, help="сценарии через запятую (пусто — ни одного)")
+    parser.add_argument("--requests", type=int, default=200, help="запросов на сценарий")
+    parser.add_argument("--warmup", type=int, default=20, help="прогревочных запросов на сценарий (не измеряются)")
+    parser.add_argument("--concurrency", type=int, default=8, help="одновременных клиентов")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--projects-per-user", type=int, default=2)
+    parser.add_argument("--members-per-project", type=int, default=2)
+    parser.add_argument("--diagrams-per-project", type=int, default=4)
+    parser.add_argument("--nodes", type=int, default=60, help="узлов на диаграмму")
+    parser.add_argument("--database-url", help="база для прогона (по умолчанию временная SQLite)")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--serve", action="store_true", help="запустить uvicorn и гонять сценарии через HTTP")
+    target.add_argument("--target", help="адрес уже запущенного сервера")
+    parser.add_argument("--server-workers", type=int, default=1, help="процессов uvicorn для --serve")
+    parser.add_argument("--micro", action="store_true", help="добавить микробенчмарки обработки содержимого")
+    parser.add_argument("--micro-iterations", type=int, default=200)
+    parser.add_argument("--output", help="файл для результатов в JSON")
+    parser.add_argument("--compare", help="JSON прошлого прогона для сравнения")
+    return parser.parse_args()
+
+def configure_environment(args, directory: str):
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    elif not args.target:
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(directory, 'benchmark.db')}"
+    # Every worker logs in from the same address many times over
+    os.environ.setdefault("LOGIN_MAX_ATTEMPTS_PER_ADDRESS", str(10 ** 9))
+    os.environ.setdefault("LOGIN_MAX_FAILURES_PER_USER", str(10 ** 9))
+
+def run(args) -> dict:
+    # Imported only now: core.config reads the environment prepared above
+    from core.database import SessionLocal, engine
+    from core.search import install_search_index
+    from models import Base
+    from benchmarks import runner
+    from benchmarks.data import DatasetOptions, generate_dataset
+    from benchmarks.micro import run_micro
+    from benchmarks.report import result_document
+    from benchmarks.scenarios import SCENARIOS
+
+    names = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        sys.exit(f"Неизвестные сценарии: {', '.join(unknown)}. Доступны: {', '.join(SCENARIOS)}")
+
+    mode = "live" if args.target else "serve" if args.serve else "in-process"
+    options = DatasetOptions(
+        users=args.users, projects_per_user=args.projects_per_user,
+        members_per_project=args.members_per_project, diagrams_per_project=args.diagrams_per_project,
+        nodes=args.nodes, seed=args.seed,
+    )
+    scenarios, dataset_info = {}, None
+    if names:
+        Base.metadata.create_all(bind=engine)
+        install_search_index(engine)
+        with SessionLocal() as db:
+            dataset = generate_dataset(db, options)
+        dataset_info = {
+            "users": len(dataset.users), "projects": dataset.projects,
+            "diagrams": dataset.diagrams, "elements": dataset.elements,
+        }
+        print(
+            f"Данные: {dataset.projects} проектов, {dataset.diagrams} диаграмм, "
+            f"{dataset.elements} элементов ({engine.url.render_as_string(hide_password=True)})"
+        )
+        drive = lambda client, counter: runner.run_scenarios(
+            client, counter, dataset, names, args.concurrency, args.requests, args.warmup, args.seed
+        )
+
+        async def in_process():
+            async with runner.in_process_client() as (client, counter):
+                return await drive(client, counter)
+
+        async def live(base_url: str):
+            async with runner.live_client(base_url, args.concurrency) as (client, counter):
+                return await drive(client, counter)
+
+        if args.target:
+            scenarios = asyncio.run(live(args.target))
+        elif args.serve:
+            with runner.serve(args.server_workers) as base_url:
+                scenarios = asyncio.run(live(base_url))
+        else:
+            scenarios = asyncio.run(in_process())
+
+    micro = run_micro(args.nodes, args.micro_iterations, args.seed) if args.micro else {}
+    recorded = {
+        "requests": args.requests, "warmup": args.warmup, "concurrency": args.concurrency,
+        "scenarios": names, "dataset": vars(options), "database": engine.dialect.name,
+    }
+    return result_document(mode, recorded, dataset_info, scenarios, micro)
+
+def main():
+    args = parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        configure_environment(args, directory)
+        results = run(args)
+        from benchmarks.report import compare, format_table
+
+        print(format_table(results))
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as output:
+                json.dump(results, output, indent=2, ensure_ascii=False)
+            print(f"Результаты записаны в {args.output}")
+        if args.compare:
+            with open(args.compare, encoding="utf-8") as baseline_file:
+                baseline = json.load(baseline_file)
+            print(f"\nСравнение с {args.compare} (положительное изменение задержки — медленнее):")
+            for row in compare(results, baseline):
+                print(
+                    f"  {row['name']:<18} p50 {row['p50']:>8}  p95 {row['p95']:>8}  "
+                    f"p99 {row['p99']:>8}  rps {row['throughput']:>8}"
+                )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+Synthetic benchmark data: users, projects with members, BPMN and ERD diagrams.
+
+Everything is derived from the seed, so runs with the same options build the
+same dataset. Rows are written through the crud layer with the batched inserts
+the project import uses, which is far quicker than seeding through the API.
+"""
+import random
+from dataclasses import dataclass, field
+import orjson
+from sqlalchemy.orm import Session
+from core.passwords import pwd_context
+from models.diagram import Diagram, DiagramType
+from schemas.user import UserCreate
+import crud
+
+PASSWORD = "benchmark-password"
+
+@dataclass
+class DatasetOptions:
+    users: int = 8
+    projects_per_user: int = 2
+    members_per_project: int = 2
+    diagrams_per_project: int = 4
+    nodes: int = 60  # nodes per diagram; edges are roughly as many
+    seed: int = 1
+
+@dataclass
+class BenchUser:
+    username: str
+    own_diagrams: list[int] = field(default_factory=list)
+    visible_diagrams: list[int] = field(default_factory=list)
+
+@dataclass
+class Dataset:
+    users: list[BenchUser]
+    projects: int
+    diagrams: int
+    elements: int
+
+def _grid_position(index: int, columns: int, width: int, height: int) -> dict:
+    return {"x": (index % columns) * width, "y": (index // columns) * height}
+
+def bpmn_document(nodes: int, rng: random.Random) -> dict:
+    """A process: start event, tasks with an occasional gateway branch, end event."""
+    count = max(nodes, 2)
+    document = {"nodes": [], "edges": []}
+    for index in range(count):
+        if index == 0 or index == count - 1:
+            kind, shape, size = ("start" if index == 0 else "end"), "circle", (78, 78)
+        elif index % 6 == 0:
+            kind, shape, size = "gateway", "diamond", (120, 120)
+        else:
+            kind, shape, size = "task", "rectangle", (200, 96)
+        document["nodes"].append({
+            "id": f"{kind}-{index}",
+            "type": "shape",
+            "position": _grid_position(index, 8, 260, 180),
+            "width": size[0],
+            "height": size[1],
+            "data": {
+                "label": f"{kind.capitalize()} {index} {rng.choice(['review', 'approve', 'send', 'check', 'store'])}",
+                "shape": shape,
+                "width": size[0],
+                "height": size[1],
+                "background": "#ffffff",
+                "borderColor": "#2563eb",
+                "borderWidth": 2,
+                "textColor": "#111827",
+            },
+        })
+    ids = [node["id"] for node in document["nodes"]]
+    for index in range(count - 1):
+        document["edges"].append({"id": f"flow-{index}", "source": ids[index], "target": ids[index + 1]})
+        if ids[index].startswith("gateway") and index + 3 < count:
+            document["edges"].append({
+                "id": f"branch-{index}", "source": ids[index], "target": ids[index + 3], "label": "no",
+            })
+    return document
+
+def erd_document(nodes: int, rng: random.Random) -> dict:
+    """Entities with attributes, joined pairwise through relationship nodes."""
+    entities = max(nodes * 2 // 3, 2)
+    document = {"nodes": [], "edges": []}
+    for index in range(entities):
+        attributes = [{"name": "id", "type": "integer", "primary": True}] + [
+            {"name": f"field_{column}", "type": rng.choice(["text", "integer", "date", "boolean"]), "primary": False}
+            for column in range(rng.randint(2, 7))
+        ]
+        document["nodes"].append({
+            "id": f"entity-{index}",
+            "type": "shape",
+            "position": _grid_position(index, 6, 320, 300),
+            "data": {
+                "label": f"Entity{index}",
+                "shape": "entity",
+                "width": 240,
+                "height": 200,
+                "borderColor": "#2563eb",
+                "attributes": attributes,
+            },
+        })
+    for index in range(1, entities):
+        other = rng.randrange(index)
+        relationship = f"relationship-{index}"
+        document["nodes"].append({
+            "id": relationship,
+            "type": "shape",
+            "position": _grid_position(index, 6, 320, 300),
+            "data": {"label": f"has_{index}", "shape": "relationship", "width": 140, "height": 140},
+        })
+        cardinality = {"sourceCardinality": "one", "targetCardinality": rng.choice(["one", "many"])}
+        document["edges"].append({
+            "id": f"erd-edge-{index}-a", "source": f"entity-{other}", "target": relationship,
+            "type": "erd", "data": cardinality,
+        })
+        document["edges"].append({
+            "id": f"erd-edge-{index}-b", "source": relationship, "target": f"entity-{index}",
+            "type": "erd", "data": cardinality,
+        })
+    return document
+
+def diagram_document(diagram_type: DiagramType, nodes: int, rng: random.Random) -> dict:
+    if diagram_type == DiagramType.ERD:
+        return erd_document(nodes, rng)
+    return bpmn_document(nodes, rng)
+
+def generate_dataset(db: Session, options: DatasetOptions) -> Dataset:
+    """Create the benchmark users and their projects; existing users are reused."""
+    rng = random.Random(options.seed)
+    # One Argon2 hash for everyone: seeding should not take longer than the benchmark
+    hashed_password = pwd_context.hash(PASSWORD)
+    users = []
+    for index in range(options.users):
+        username = f"bench{options.seed}-user{index}"
+        if crud.get_user_by_username(db, username) is None:
+            crud.create_user(
+                db,
+                UserCreate(username=username, email=f"{username}@example.com", password=PASSWORD),
+                hashed_password=hashed_password,
+            )
+        users.append(BenchUser(username=username))
+
+    user_ids = {user.username: crud.get_user_by_username(db, user.username).id for user in users}
+    projects = diagrams = elements = 0
+    for owner in users:
+        for project_index in range(options.projects_per_user):
+            project_id = crud.create_imported_project(
+                db, owner_id=user_ids[owner.username], name=f"{owner.username} project {project_index}",
+                description="Benchmark project",
+            )
+            others = [user for user in users if user is not owner]
+            members = rng.sample(others, min(options.members_per_project, len(others)))
+            crud.add_imported_members(
+                db, project_id=project_id, owner_id=user_ids[owner.username],
+                usernames=[member.username for member in members],
+            )
+            batch = []
+            for diagram_index in range(options.diagrams_per_project):
+                diagram_type = DiagramType.ERD if diagram_index % 2 else DiagramType.BPMN
+                document = diagram_document(diagram_type, options.nodes, rng)
+                elements += len(document["nodes"]) + len(document["edges"])
+                batch.append({
+                    "name": f"{diagram_type.value.upper()} {diagram_index}",
+                    "diagram_type": diagram_type,
+                    "content": orjson.dumps(document).decode(),
+                })
+            crud.import_diagram_batch(db, project_id=project_id, diagrams=batch, user_id=user_ids[owner.username])
+            db.commit()
+            ids = [row.id for row in db.query(Diagram.id).filter(Diagram.project_id == project_id).order_by(Diagram.id)]
+            owner.own_diagrams.extend(ids)
+            owner.visible_diagrams.extend(ids)
+            for member in members:
+                member.visible_diagrams.extend(ids)
+            projects += 1
+            diagrams += len(ids)
+    return Dataset(users=users, projects=projects, diagrams=diagrams, elements=elements)
@@ -0,0 +1,48 @@
+"""
+Micro-benchmarks of the content pipeline every save goes through, timed
+without HTTP or a database: compression, element projection, JSON Patch and
+SVG rendering of a generated diagram.
+"""
+import random
+import time
+import orjson
+from core.content_store import decode_content, encode_content
+from core.diagram_elements import element_rows
+from core.export import render_svg
+from core.json_patch import apply_patch, create_patch
+from models.diagram import DiagramType
+from benchmarks.data import diagram_document
+from benchmarks.report import summarize
+
+def _cases(nodes: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    document = diagram_document(DiagramType.BPMN, nodes, rng)
+    content = orjson.dumps(document).decode()
+    stored = encode_content(content, document=document)
+    edited = orjson.loads(content)
+    for node in rng.sample(edited["nodes"], max(len(edited["nodes"]) // 20, 1)):
+        node["position"] = {"x": rng.randrange(2000), "y": rng.randrange(1500)}
+    operations = create_patch(document, edited)
+    return {
+        "encode_content": lambda: encode_content(content, document=document),
+        "decode_content": lambda: decode_content(stored["content_blob"], stored["content_encoding"], stored["content"]),
+        "element_rows": lambda: element_rows(document),
+        "create_patch": lambda: create_patch(document, edited),
+        "apply_patch": lambda: apply_patch(document, operations),
+        "render_svg": lambda: render_svg(document),
+    }
+
+def run_micro(nodes: int, iterations: int, seed: int = 1, names=None) -> dict:
+    results = {}
+    for name, case in _cases(nodes, seed).items():
+        if names and name not in names:
+            continue
+        case()  # warm caches and lazy imports
+        timings = []
+        started = time.perf_counter()
+        for _ in range(iterations):
+            start = time.perf_counter()
+            case()
+            timings.append(time.perf_counter() - start)
+        results[name] = summarize(timings, time.perf_counter() - started)
+    return results
@@ -0,0 +1,101 @@
+"""
+Benchmark statistics, the JSON result document and comparison with a baseline.
+"""
+import platform
+import subprocess
+from datetime import datetime
+from typing import Optional
+
+RESULT_VERSION = 1
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    """Linear-interpolated percentile of already sorted values (fraction in 0..1)."""
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+def summarize(
+    latencies: list[float], duration: float, statuses: Optional[dict] = None, queries: Optional[int] = None
+) -> dict:
+    """Summary of one scenario; latencies and duration are in seconds, the output in milliseconds."""
+    values = sorted(latencies)
+    count = len(values)
+    statuses = statuses or {}
+    errors = sum(total for status, total in statuses.items() if not str(status).startswith("2"))
+    return {
+        "requests": count,
+        "errors": errors,
+        "statuses": {str(status): total for status, total in sorted(statuses.items(), key=str)},
+        "duration_s": round(duration, 4),
+        "throughput_rps": round(count / duration, 2) if duration > 0 else None,
+        "latency_ms": {
+            "mean": round(sum(values) / count * 1000, 3) if count else 0.0,
+            "p50": round(percentile(values, 0.50) * 1000, 3),
+            "p95": round(percentile(values, 0.95) * 1000, 3),
+            "p99": round(percentile(values, 0.99) * 1000, 3),
+            "max": round(values[-1] * 1000, 3) if count else 0.0,
+        },
+        "sql_queries_per_request": round(queries / count, 2) if queries is not None and count else None,
+    }
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5, check=True
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def result_document(mode: str, options: dict, dataset: Optional[dict], scenarios: dict, micro: dict) -> dict:
+    return {
+        "version": RESULT_VERSION,
+        "meta": {
+            "created_at": datetime.utcnow().isoformat() + "Z",
+            "git_revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "mode": mode,
+            "options": options,
+            "dataset": dataset,
+        },
+        "scenarios": scenarios,
+        "micro": micro,
+    }
+
+def _change(current, baseline) -> str:
+    if current is None or not baseline:
+        return "n/a"
+    return f"{(current - baseline) / baseline * 100:+.1f}%"
+
+def compare(current: dict, baseline: dict) -> list[dict]:
+    """Per benchmark: p50/p95/p99 and throughput changes relative to a baseline result."""
+    rows = []
+    for section in ("scenarios", "micro"):
+        for name, summary in current.get(section, {}).items():
+            before = baseline.get(section, {}).get(name)
+            if before is None:
+                continue
+            row = {"name": name}
+            for key in ("p50", "p95", "p99"):
+                row[key] = _change(summary["latency_ms"][key], before["latency_ms"][key])
+            row["throughput"] = _change(summary["throughput_rps"], before["throughput_rps"])
+            rows.append(row)
+    return rows
+
+def format_table(results: dict) -> str:
+    lines = [
+        f"{'benchmark':<18}{'req':>7}{'err':>6}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'sql/req':>9}"
+    ]
+    for section in ("scenarios", "micro"):
+        for name, summary in results.get(section, {}).items():
+            latency = summary["latency_ms"]
+            queries = summary["sql_queries_per_request"]
+            lines.append(
+                f"{name:<18}{summary['requests']:>7}{summary['errors']:>6}{summary['throughput_rps'] or 0:>10.1f}"
+                f"{latency['p50']:>10.2f}{latency['p95']:>10.2f}{latency['p99']:>10.2f}"
+                f"{'-' if queries is None else queries:>9}"
+            )
+    return "\n".join(lines)
@@ -0,0 +1,176 @@
+"""
+Drives the scenarios with concurrent workers, in-process or against a live server.
+
+In-process runs talk to the FastAPI app through httpx's ASGI transport, with
+the app's startup and shutdown hooks run around them, and count the SQL
+statements every engine executes. Live runs go over HTTP to a uvicorn either
+started here (``serve``) or already running; SQL counts are not available
+there.
+"""
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Optional
+from sqlalchemy import event
+from benchmarks.data import Dataset
+from benchmarks.report import summarize
+from benchmarks.scenarios import SCENARIOS, Worker, sign_in
+
+try:
+    import httpx
+except ImportError:  # comes with the test tooling, not with the server requirements
+    httpx = None
+
+SERVER_START_TIMEOUT = 30
+
+class QueryCounter:
+    """Counts SQL statements executed on a set of engines."""
+
+    def __init__(self, engines):
+        self.count = 0
+        self._engines = list({id(engine): engine for engine in engines}.values())
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+    def install(self):
+        for engine in self._engines:
+            event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def remove(self):
+        for engine in self._engines:
+            event.remove(engine, "before_cursor_execute", self._on_execute)
+
+def _require_httpx():
+    if httpx is None:
+        raise RuntimeError("Benchmarks need httpx: pip install httpx")
+
+@asynccontextmanager
+async def in_process_client():
+    """(client, QueryCounter) bound to the app in this process."""
+    _require_httpx()
+    from main import app
+    from core.database import engine, async_engine, async_read_engine
+    counter = QueryCounter([engine, async_engine.sync_engine, async_read_engine.sync_engine])
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+            counter.install()
+            try:
+                yield client, counter
+            finally:
+                counter.remove()
+
+@asynccontextmanager
+async def live_client(base_url: str, connections: int):
+    """(client, None) for a server reachable at base_url."""
+    _require_httpx()
+    limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        yield client, None
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+@contextmanager
+def serve(workers: int = 1):
+    """Start uvicorn on a free port with this process's environment; yields the base URL."""
+    _require_httpx()
+    port = _free_port()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        env=os.environ.copy(),
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + SERVER_START_TIMEOUT
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with code {process.returncode}")
+            try:
+                if httpx.get(f"{base_url}/health", timeout=1).status_code == 200:
+                    break
+            except httpx.TransportError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError("uvicorn did not start in time")
+            time.sleep(0.2)
+        yield base_url
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+def make_workers(dataset: Dataset, concurrency: int, seed: int) -> list[Worker]:
+    """Workers cycle through the users; each gets its own diagram while there are enough."""
+    users = [user for user in dataset.users if user.own_diagrams]
+    workers = []
+    for index in range(concurrency):
+        user = users[index % len(users)]
+        diagram_id = user.own_diagrams[(index // len(users)) % len(user.own_diagrams)]
+        workers.append(Worker(index=index, user=user, diagram_id=diagram_id, rng=random.Random(seed * 1000 + index)))
+    return workers
+
+async def _drive(client, scenario, workers: list[Worker], requests: int, record: bool):
+    latencies, statuses = [], {}
+    remaining = requests
+
+    async def loop(worker: Worker):
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            try:
+                response = await scenario.step(client, worker)
+                status = response.status_code
+            except httpx.TransportError as exc:
+                status = type(exc).__name__
+            elapsed = time.perf_counter() - start
+            if record:
+                latencies.append(elapsed)
+                statuses[status] = statuses.get(status, 0) + 1
+
+    await asyncio.gather(*(loop(worker) for worker in workers))
+    return latencies, statuses
+
+async def run_scenario(
+    client, counter: Optional[QueryCounter], name: str, workers: list[Worker], requests: int, warmup: int
+) -> dict:
+    scenario = SCENARIOS[name]
+    if scenario.setup is not None:
+        for worker in workers:
+            await scenario.setup(client, worker)
+    if warmup:
+        await _drive(client, scenario, workers, warmup, record=False)
+    queries_before = counter.count if counter else None
+    started = time.perf_counter()
+    latencies, statuses = await _drive(client, scenario, workers, requests, record=True)
+    duration = time.perf_counter() - started
+    queries = counter.count - queries_before if counter else None
+    return summarize(latencies, duration, statuses, queries)
+
+async def run_scenarios(
+    client, counter: Optional[QueryCounter], dataset: Dataset, names: list[str],
+    concurrency: int, requests: int, warmup: int, seed: int,
+) -> dict:
+    workers = make_workers(dataset, concurrency, seed)
+    for worker in workers:
+        await sign_in(client, worker)
+    results = {}
+    for name in names:
+        results[name] = await run_scenario(client, counter, name, workers, requests, warmup)
+        # Leave no locks behind for the next scenario
+        for worker in workers:
+            if worker.state.pop("locked", False):
+                await client.delete(f"/diagrams/{worker.diagram_id}/lock", headers=worker.headers)
+    return results
@@ -0,0 +1,91 @@
+"""
+Benchmark scenarios: one HTTP request per step, each mirroring what the
+frontend does on a hot path.
+
+A step takes the client and the worker and returns the response; ``setup``
+runs once per worker before timing starts. Workers keep their own state
+(token, known revision, lock held), so steps of different workers never
+conflict with each other.
+"""
+import random
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Optional
+import orjson
+from benchmarks.data import PASSWORD, BenchUser
+
+@dataclass
+class Worker:
+    index: int
+    user: BenchUser
+    diagram_id: int  # the diagram this worker edits and locks
+    rng: random.Random
+    token: Optional[str] = None
+    state: dict = field(default_factory=dict)
+
+    @property
+    def headers(self) -> dict:
+        return {"Authorization": f"Bearer {self.token}"}
+
+@dataclass
+class Scenario:
+    name: str
+    description: str
+    step: Callable[[Any, Worker], Awaitable[Any]]
+    setup: Optional[Callable[[Any, Worker], Awaitable[None]]] = None
+
+async def sign_in(client, worker: Worker):
+    response = await client.post("/auth/token", data={"username": worker.user.username, "password": PASSWORD})
+    response.raise_for_status()
+    worker.token = response.json()["access_token"]
+
+async def _login(client, worker: Worker):
+    return await client.post("/auth/token", data={"username": worker.user.username, "password": PASSWORD})
+
+async def _list_projects(client, worker: Worker):
+    return await client.get("/projects/", headers=worker.headers)
+
+async def _open_diagram(client, worker: Worker):
+    diagram_id = worker.rng.choice(worker.user.visible_diagrams)
+    return await client.get(f"/diagrams/{diagram_id}", headers=worker.headers)
+
+async def _load_for_autosave(client, worker: Worker):
+    response = await client.get(f"/diagrams/{worker.diagram_id}", headers=worker.headers)
+    response.raise_for_status()
+    diagram = response.json()
+    worker.state["revision"] = diagram["revision"]
+    worker.state["nodes"] = orjson.loads(diagram["content"])["nodes"]
+
+async def _autosave(client, worker: Worker):
+    # A drag or a rename touches one node; the editor sends it as an element batch
+    node = worker.rng.choice(worker.state["nodes"])
+    node["position"] = {"x": worker.rng.randrange(0, 2000), "y": worker.rng.randrange(0, 1500)}
+    node["data"]["label"] = f"{node['data'].get('label', '').split(' #')[0]} #{worker.rng.randrange(1000)}"
+    response = await client.post(
+        f"/diagrams/{worker.diagram_id}/elements/batch",
+        json={"base_revision": worker.state["revision"], "upsert": [{"element_type": "node", "data": node}]},
+        headers=worker.headers,
+    )
+    if response.status_code == 200:
+        worker.state["revision"] = response.json()["revision"]
+    return response
+
+async def _lock_churn(client, worker: Worker):
+    path = f"/diagrams/{worker.diagram_id}/lock"
+    if worker.state.get("locked"):
+        response = await client.delete(path, headers=worker.headers)
+    else:
+        response = await client.post(path, headers=worker.headers)
+    if response.status_code == 200:
+        worker.state["locked"] = not worker.state.get("locked")
+    return response
+
+SCENARIOS = {
+    scenario.name: scenario
+    for scenario in (
+        Scenario("login", "POST /auth/token (Argon2 verify, token issue)", _login),
+        Scenario("projects", "GET /projects/", _list_projects),
+        Scenario("open", "GET /diagrams/{id} with full content", _open_diagram),
+        Scenario("autosave", "POST /diagrams/{id}/elements/batch, one node moved", _autosave, _load_for_autosave),
+        Scenario("lock", "POST and DELETE /diagrams/{id}/lock, alternating", _lock_churn),
+    )
+}
@@ -1,15 +1,145 @@
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Any, Optional
+import secrets
+import threading
+import time
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from core.database import get_db
+from core.database import get_async_db
 from core.config import settings
+from core.passwords import pwd_context, password_hasher
+from models.user import User
 
-pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token", auto_error=False)
+
+class TokenCache:
+    """Bounded LRU cache of verified access tokens to user principals with TTL expiry."""
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple[float, int, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, _, principal = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return principal
+
+    def set(self, key: str, principal: Any, user_id: int, expires_at: Optional[float] = None):
+        """Store a principal; expires_at is a time.monotonic() deadline (e.g. the token expiry)."""
+        if self.max_size <= 0:
+            return
+        deadline = time.monotonic() + self.ttl_seconds
+        if expires_at is not None:
+            deadline = min(deadline, expires_at)
+        with self._lock:
+            self._entries[key] = (deadline, user_id, principal)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate_user(self, user_id: int):
+        with self._lock:
+            stale = [key for key, (_, owner_id, _) in self._entries.items() if owner_id == user_id]
+            for key in stale:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+user_cache = TokenCache(
+    max_size=settings.auth_cache_max_size,
+    ttl_seconds=settings.auth_cache_ttl_seconds,
+)
+
+class TokenDenylist:
+    """In-memory record of revoked access tokens, kept only until they would expire anyway.
+
+    Access tokens are verified from their claims alone, so logout adds the token id (jti)
+    here and "log out everywhere" records the user's new token version: tokens carrying an
+    older version are refused.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._tokens: "OrderedDict[str, float]" = OrderedDict()
+        self._versions: dict[int, tuple[int, float]] = {}
+        self._lock = threading.Lock()
+
+    def _prune(self, now: float):
+        while self._tokens and next(iter(self._tokens.values())) <= now:
+            self._tokens.popitem(last=False)
+        for user_id in [uid for uid, (_, until) in self._versions.items() if until <= now]:
+            del self._versions[user_id]
+
+    def revoke_token(self, jti: str, expires_at: float):
+        """expires_at is the token's exp claim (Unix time)."""
+        with self._lock:
+            self._prune(time.time())
+            # Access tokens share one lifetime, so insertion order is close to expiry order
+            self._tokens[jti] = expires_at
+            while len(self._tokens) > self.max_size:
+                self._tokens.popitem(last=False)
+
+    def revoke_user(self, user_id: int, version: int):
+        """Refuse the user's tokens issued with a version below ``version``."""
+        until = time.time() + settings.access_token_expire_minutes * 60
+        with self._lock:
+            self._versions[user_id] = (version, until)
+
+    def is_revoked(self, payload: dict) -> bool:
+        with self._lock:
+            if payload.get("jti") in self._tokens:
+                return True
+            entry = self._versions.get(payload.get("uid"))
+            return entry is not None and payload.get("ver", 0) < entry[0]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._tokens) + len(self._versions)
+
+token_denylist = TokenDenylist(max_size=settings.token_denylist_max_size)
+
+# Drop cached principals as soon as the underlying user row changes
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_cached_user(mapper, connection, target):
+    user_cache.invalidate_user(target.id)
 
 def verify_password(plain_password, hashed_password):
     # Убеждаемся, что plain_password - это строка
@@ -26,15 +156,17 @@ def get_password_hash(password):
     return pwd_context.hash(password)
 
 def get_user_by_username(db: Session, username: str):
-    from models.user import User
     return db.query(User).filter(User.username == username).first()
 
-def authenticate_user(db: Session, username: str, password: str):
-    user = get_user_by_username(db, username)
-    if not user:
-        return False
-    if not verify_password(password, user.hashed_password):
+async def authenticate_user(db: AsyncSession, username: str, password: str):
+    """Check credentials with argon2 off the event loop, upgrading outdated hashes on success."""
+    user = await db.run_sync(get_user_by_username, username)
+    valid, new_hash = await password_hasher.verify(password, user.hashed_password if user else None)
+    if not user or not valid:
         return False
+    if new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
     return user
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
@@ -47,23 +179,71 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, settings.secret_key, algorithm=settings.algorithm)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    from schemas.user import TokenData
+def create_user_access_token(user, expires_delta: Optional[timedelta] = None):
+    """Access token whose claims are enough to build the principal without a users lookup."""
+    return create_access_token(
+        data={
+            "sub": user.username,
+            "uid": user.id,
+            "ver": user.token_version or 0,
+            "email": user.email,
+            "ctd": user.created_at.isoformat() if user.created_at else None,
+            "jti": secrets.token_hex(8),
+        },
+        expires_delta=expires_delta,
+    )
+
+def decode_access_token(token: str) -> Optional[dict]:
+    try:
+        return jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
+    except JWTError:
+        return None
+
+async def get_user_from_token(token: str, db: AsyncSession):
+    """Resolve an access token to a user principal, raising 401 if it is not valid."""
+    from schemas.user import TokenData, User as UserPrincipal
+    
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-        token_data = TokenData(username=username)
-    except JWTError:
+    if not token:
+        raise credentials_exception
+    
+    payload = decode_access_token(token)
+    if payload is None or payload.get("sub") is None:
         raise credentials_exception
-    user = get_user_by_username(db, username=token_data.username)
+    
+    # Токены с id пользователя и версией проверяются по подписи и списку отзыва, без запроса к БД
+    if "uid" in payload and payload.get("ctd"):
+        if token_denylist.is_revoked(payload):
+            raise credentials_exception
+        return UserPrincipal(
+            id=payload["uid"],
+            username=payload["sub"],
+            email=payload["email"],
+            created_at=payload["ctd"],
+        )
+    
+    # Старые токены (только sub): кэш ключуется по подписи, она уникальна для каждого токена
+    signature = token.rsplit(".", 1)[-1]
+    principal = user_cache.get(signature)
+    if principal is not None:
+        return principal
+    
+    token_data = TokenData(username=payload["sub"])
+    user = await db.run_sync(get_user_by_username, token_data.username)
     if user is None:
         raise credentials_exception
-    return user
+    
+    # Кэшируем отсоединённый от сессии снимок пользователя, а не ORM-объект
+    principal = UserPrincipal.model_validate(user)
+    expires_at = None
+    if payload.get("exp") is not None:
+        expires_at = time.monotonic() + (payload["exp"] - time.time())
+    user_cache.set(signature, principal, user_id=user.id, expires_at=expires_at)
+    return principal
 
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
+    return await get_user_from_token(token, db)
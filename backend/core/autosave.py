@@ -0,0 +1,289 @@
+"""
+Write-behind buffer for diagram autosaves.
+
+The editor saves the whole document after every pause in editing. With
+``autosave_flush_interval_seconds`` set, a content-only save is validated,
+kept in memory and acknowledged at once with the revision it will be stored
+as; later saves of the same diagram replace it. Pending content is written
+(one update, one revision) every interval, when the lock is released or
+expires, and on shutdown, which uvicorn runs on SIGTERM. Reads of the diagram
+(GET /diagrams/{id}) see the pending content; handlers that work on stored
+content or history depend on ``require_saved_diagram_access``, which writes
+the diagram's pending save first.
+
+With ``autosave_log_path`` set every accepted save is appended (and
+fsync'd) to a log before it is acknowledged; at startup the log is replayed,
+so saves survive a crash between flushes. The log is rewritten after each
+flush to hold only what is still pending.
+
+Pending saves live in the process that accepted them: enable the buffer only
+with a single worker.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+import orjson
+from core.config import settings
+from core.content_store import content_hash, count_elements
+from core.database import AsyncSessionLocal
+from core.metrics import Counter, registry
+import crud
+
+logger = logging.getLogger(__name__)
+
+# How long the revision of a flush is remembered, for requests that loaded the row before it
+COMMITTED_MEMORY_SECONDS = 300
+
+autosave_buffered = registry.register(Counter(
+    "idms_autosave_buffered_total", "Content saves accepted into the write-behind buffer."
+))
+autosave_flushed = registry.register(Counter(
+    "idms_autosave_flushed_total", "Buffered saves written to the database."
+))
+
+@dataclass
+class PendingSave:
+    diagram_id: int
+    project_id: int
+    revision: int  # the revision the flush will store
+    content: str
+    document: Optional[dict]
+    content_hash: str
+    element_count: Optional[int]
+    user_id: Optional[int]
+    updated_at: datetime
+    saves: int = 1
+
+    def record(self) -> bytes:
+        return orjson.dumps({
+            "diagram_id": self.diagram_id, "project_id": self.project_id, "revision": self.revision,
+            "user_id": self.user_id, "content": self.content, "updated_at": self.updated_at,
+        }) + b"\n"
+
+class BufferedDiagram:
+    """A diagram as it will be once its pending save is written; serializes like the row."""
+
+    def __init__(self, db_diagram, pending: PendingSave):
+        self.id = db_diagram.id
+        self.name = db_diagram.name
+        self.diagram_type = db_diagram.diagram_type
+        self.project_id = db_diagram.project_id
+        self.created_at = db_diagram.created_at
+        self.content = pending.content
+        self.revision = pending.revision
+        self.updated_at = pending.updated_at
+        self.element_count = pending.element_count
+
+class AutosaveBuffer:
+    def __init__(self, interval_seconds: float, log_path: Optional[str], log_fsync: bool):
+        self.interval_seconds = interval_seconds
+        self.log_path = log_path
+        self.log_fsync = log_fsync
+        self._pending: dict[int, PendingSave] = {}
+        self._committed: dict[int, tuple] = {}
+        self._locks: dict[int, list] = {}  # diagram id -> [lock, tasks holding or awaiting it]
+        self._log_lock = asyncio.Lock()
+        self._file_lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.interval_seconds > 0
+
+    @asynccontextmanager
+    async def _locked(self, diagram_id: int):
+        entry = self._locks.setdefault(diagram_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            # Forget the lock once nothing is pending and no other task wants it
+            if not entry[1] and diagram_id not in self._pending:
+                del self._locks[diagram_id]
+
+    def pending(self, diagram_id: int) -> Optional[PendingSave]:
+        return self._pending.get(diagram_id)
+
+    def view(self, db_diagram):
+        """The row itself, or a BufferedDiagram if a save of it is pending."""
+        pending = self._pending.get(db_diagram.id)
+        return db_diagram if pending is None else BufferedDiagram(db_diagram, pending)
+
+    async def accept(self, db_diagram, content: str, document: dict, user_id: Optional[int]):
+        """Buffer a validated content save; returns (pending save, changed).
+
+        The pending save is None when the content is what the database
+        already holds: nothing needs writing, and ``changed`` tells whether a
+        pending save was discarded for it.
+        """
+        diagram_id = db_diagram.id
+        digest = content_hash(content)
+        async with self._locked(diagram_id):
+            pending = self._pending.get(diagram_id)
+            if pending is not None and pending.content_hash == digest:
+                return pending, False
+            committed = self._committed.get(diagram_id, (0, 0))[0]
+            # The row was loaded before a flush committed: its hash is stale too
+            stale = committed > (db_diagram.revision or 0)
+            if not stale and db_diagram.content_hash == digest:
+                if pending is not None:
+                    del self._pending[diagram_id]
+                    await self._append(orjson.dumps({"diagram_id": diagram_id, "content": None}) + b"\n")
+                    return None, True
+                return None, False
+            now = datetime.utcnow()
+            if pending is None:
+                pending = PendingSave(
+                    diagram_id=diagram_id, project_id=db_diagram.project_id,
+                    revision=max(db_diagram.revision or 0, committed) + 1,
+                    content=content, document=document, content_hash=digest,
+                    element_count=count_elements(content, document), user_id=user_id, updated_at=now,
+                )
+                self._pending[diagram_id] = pending
+            else:
+                pending.content, pending.document, pending.content_hash = content, document, digest
+                pending.element_count = count_elements(content, document)
+                pending.user_id, pending.updated_at = user_id, now
+                pending.saves += 1
+            autosave_buffered.inc()
+            await self._append(pending.record())
+            return pending, True
+
+    async def _write(self, pending: PendingSave) -> None:
+        async with AsyncSessionLocal() as db:
+            saved = await crud.aio.update_diagram(
+                db, diagram_id=pending.diagram_id, diagram_update={"content": pending.content},
+                user_id=pending.user_id, document=pending.document,
+            )
+        if saved is None:
+            return  # the diagram was deleted meanwhile
+        if saved.revision != pending.revision:
+            logger.warning(
+                "Buffered save of diagram %d was acknowledged as revision %d but stored as %d",
+                pending.diagram_id, pending.revision, saved.revision,
+            )
+        self._committed[pending.diagram_id] = (saved.revision, time.monotonic())
+        autosave_flushed.inc()
+
+    async def flush(self, diagram_id: int) -> None:
+        """Write the diagram's pending save, if any, before returning."""
+        if diagram_id not in self._pending:
+            return
+        async with self._locked(diagram_id):
+            pending = self._pending.get(diagram_id)
+            if pending is None:
+                return
+            # Stays visible (and in the log) until it is committed
+            await self._write(pending)
+            del self._pending[diagram_id]
+
+    async def flush_project(self, project_id: int) -> None:
+        for pending in [p for p in self._pending.values() if p.project_id == project_id]:
+            await self.flush(pending.diagram_id)
+
+    async def flush_all(self) -> None:
+        for diagram_id in list(self._pending):
+            try:
+                await self.flush(diagram_id)
+            except Exception:
+                logger.exception("Could not write the buffered save of diagram %d", diagram_id)
+        await self._compact_log()
+        cutoff = time.monotonic() - COMMITTED_MEMORY_SECONDS
+        self._committed = {key: value for key, value in self._committed.items() if value[1] >= cutoff}
+
+    # Append log
+    def _write_file(self, data: bytes, mode: str) -> None:
+        with self._file_lock:
+            with open(self.log_path, mode) as log_file:
+                log_file.write(data)
+                if self.log_fsync:
+                    log_file.flush()
+                    os.fsync(log_file.fileno())
+
+    async def _append(self, record: bytes) -> None:
+        if self.log_path:
+            async with self._log_lock:
+                await asyncio.to_thread(self._write_file, record, "ab")
+
+    async def _compact_log(self) -> None:
+        """Rewrite the log with just the saves still pending."""
+        if not self.log_path:
+            return
+        async with self._log_lock:
+            data = b"".join(pending.record() for pending in self._pending.values())
+            await asyncio.to_thread(self._write_file, data, "wb")
+
+    def _read_log(self) -> dict:
+        """Last logged save per diagram; a torn last line (crash mid-append) is ignored."""
+        saves = {}
+        try:
+            with open(self.log_path, "rb") as log_file:
+                for line in log_file:
+                    try:
+                        record = orjson.loads(line)
+                    except orjson.JSONDecodeError:
+                        continue
+                    saves[record["diagram_id"]] = record
+        except FileNotFoundError:
+            pass
+        return saves
+
+    async def _replay_log(self) -> int:
+        """Store logged saves newer than the database; returns how many could not be."""
+        saves = await asyncio.to_thread(self._read_log)
+        replayed = failed = 0
+        async with AsyncSessionLocal() as db:
+            for diagram_id, record in saves.items():
+                if record.get("content") is None:
+                    continue
+                try:
+                    db_diagram = await crud.aio.get_diagram(db, diagram_id=diagram_id)
+                    if db_diagram is None or (db_diagram.revision or 0) >= record["revision"]:
+                        continue
+                    await crud.aio.update_diagram(
+                        db, diagram_id=diagram_id, diagram_update={"content": record["content"]},
+                        user_id=record.get("user_id"),
+                    )
+                    replayed += 1
+                except Exception:
+                    await db.rollback()
+                    failed += 1
+                    logger.exception("Could not restore the logged autosave of diagram %d", diagram_id)
+        if replayed:
+            logger.warning("Restored %d unsaved diagram autosaves from %s", replayed, self.log_path)
+        return failed
+
+    async def _flush_forever(self):
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            try:
+                await self.flush_all()
+            except Exception:
+                logger.exception("Autosave flush failed")
+
+    async def start(self):
+        # A log that could not be replayed fully is kept for another attempt
+        if self.log_path and not await self._replay_log():
+            await self._compact_log()
+        if self.enabled:
+            self._task = asyncio.create_task(self._flush_forever())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush_all()
+
+autosave_buffer = AutosaveBuffer(
+    interval_seconds=settings.autosave_flush_interval_seconds,
+    log_path=settings.autosave_log_path,
+    log_fsync=settings.autosave_log_fsync,
+)
@@ -0,0 +1,176 @@
+"""
+Negotiated response compression (zstd, brotli, gzip).
+
+The client's Accept-Encoding is matched against the codecs available in this
+process: gzip always, brotli and zstd when the optional ``brotli`` and
+``zstandard`` packages are installed. Bodies below the size threshold,
+already-encoded responses and non-text media types are passed through.
+Compressible responses always carry ``Vary: Accept-Encoding``, compressed or
+not, and a compressed body gets its own ETag (see core.http_cache), so
+shared caches keep the encodings apart.
+"""
+import zlib
+from typing import Optional
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from core.config import settings
+from core.http_cache import encoded_etag
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSIBLE_TYPES = (
+    "text/", "application/json", "application/x-ndjson", "application/javascript", "application/xml",
+    "image/svg+xml",
+)
+
+class _Gzip:
+    def __init__(self):
+        self._compressor = zlib.compressobj(settings.compression_gzip_level, zlib.DEFLATED, 31)
+    
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+    
+    def flush(self) -> bytes:
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+    
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+class _Brotli:
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=settings.compression_brotli_quality)
+    
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+    
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+    
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+class _Zstd:
+    def __init__(self):
+        self._compressor = zstandard.ZstdCompressor(level=settings.compression_zstd_level).compressobj()
+    
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+    
+    def flush(self) -> bytes:
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+    
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+# Server preference order when the client accepts several
+CODECS = {"gzip": _Gzip}
+if brotli is not None:
+    CODECS = {"br": _Brotli, **CODECS}
+if zstandard is not None:
+    CODECS = {"zstd": _Zstd, **CODECS}
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick the preferred codec the client accepts (q > 0), or None."""
+    accepted = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    for encoding in CODECS:
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+class CompressionMiddleware:
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http":
+            encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+            await _CompressionResponder(self.app, encoding, self.minimum_size)(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
+
+class _CompressionResponder:
+    def __init__(self, app: ASGIApp, encoding: Optional[str], minimum_size: int) -> None:
+        self.app = app
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.send: Optional[Send] = None
+        self.initial_message: Message = {}
+        self.compressor = None
+        self.started = False
+        self.passthrough = False
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        self.send = send
+        await self.app(scope, receive, self.send_compressed)
+    
+    def _should_compress(self, headers: Headers) -> bool:
+        if "content-encoding" in headers:
+            return False
+        content_type = headers.get("content-type", "")
+        return content_type.startswith(COMPRESSIBLE_TYPES)
+    
+    async def send_compressed(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            # Hold the headers until the first body chunk shows the size
+            self.initial_message = message
+            headers = MutableHeaders(raw=message["headers"])
+            compressible = self._should_compress(headers)
+            if compressible:
+                # Identity or not, the body depends on the request's Accept-Encoding
+                headers.add_vary_header("Accept-Encoding")
+            self.passthrough = self.encoding is None or not compressible
+            return
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+        
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if not self.started:
+            self.started = True
+            if self.passthrough or (len(body) < self.minimum_size and not more_body):
+                self.passthrough = True
+                await self.send(self.initial_message)
+                await self.send(message)
+                return
+            self.compressor = CODECS[self.encoding]()
+            headers = MutableHeaders(raw=self.initial_message["headers"])
+            headers["Content-Encoding"] = self.encoding
+            if "etag" in headers:
+                headers["ETag"] = encoded_etag(headers["etag"], self.encoding)
+            if more_body:
+                del headers["Content-Length"]
+            else:
+                body = self.compressor.compress(body) + self.compressor.finish()
+                headers["Content-Length"] = str(len(body))
+                await self.send(self.initial_message)
+                await self.send({"type": "http.response.body", "body": body})
+                return
+            await self.send(self.initial_message)
+        elif self.passthrough:
+            await self.send(message)
+            return
+        
+        # Streaming response: flush every chunk so the client can use it right away
+        chunk = self.compressor.compress(body)
+        chunk += self.compressor.flush() if more_body else self.compressor.finish()
+        await self.send({"type": "http.response.body", "body": chunk, "more_body": more_body})
@@ -1,14 +1,128 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Literal, Optional
 
 class Settings(BaseSettings):
     secret_key: str = "your-secret-key-here-change-in-production"
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 30
+    # Refresh tokens rotate on every use; reusing a rotated one revokes its whole family
+    refresh_token_expire_days: int = 30
+    # Revoked access tokens (logout) are remembered in memory until they expire
+    token_denylist_max_size: int = 10000
     database_url: str = "sqlite:///./idms.db"
+    # Async URL for the API; derived from database_url (aiosqlite/asyncpg) if unset
+    async_database_url: Optional[str] = None
+    # Cache of verified access tokens -> user principals
+    auth_cache_max_size: int = 1024
+    auth_cache_ttl_seconds: int = 60
+    
+    # Argon2 parameters; stored hashes made with other values are upgraded on the next login
+    password_hash_type: Literal["id", "i", "d"] = "id"
+    password_hash_time_cost: int = 3
+    password_hash_memory_cost: int = 65536  # KiB
+    password_hash_parallelism: int = 4
+    # Hashing runs in its own thread pool; queued operations beyond the cap are refused with 503
+    password_hash_workers: int = 2
+    password_hash_max_pending: int = 32
+    # Login throttling: failed attempts per username, all attempts per client address
+    login_max_failures_per_user: int = 5
+    login_max_attempts_per_address: int = 50
+    login_throttle_window_seconds: int = 300
+    login_throttle_max_keys: int = 10000
+    
+    # Engine profile: "sqlite" or "server" (PostgreSQL/MySQL); detected from database_url if unset
+    database_profile: Optional[Literal["sqlite", "server"]] = None
+    # Server profile connection pool
+    db_pool_size: int = 10
+    db_max_overflow: int = 20
+    db_pool_timeout: int = 30
+    db_pool_recycle: int = 1800
+    db_pool_pre_ping: bool = True
+    # SQLite profile
+    sqlite_journal_mode: Literal["wal", "delete", "truncate", "persist", "memory", "off"] = "wal"
+    sqlite_synchronous: Literal["off", "normal", "full", "extra"] = "normal"
+    sqlite_mmap_size: int = 256 * 1024 * 1024
+    sqlite_busy_timeout_ms: int = 5000
+    # With WAL, reads use their own query-only pool while writes share one connection
+    sqlite_read_write_split: bool = True
+    sqlite_read_pool_size: int = 5
+    
+    # Real-time collaboration: "memory" for a single worker, "redis" to fan out across workers
+    realtime_backend: Literal["memory", "redis"] = "memory"
+    redis_url: str = "redis://localhost:6379/0"
+    realtime_queue_size: int = 256
+    
+    # Diagram locks are leases renewed by heartbeats; "database" shares them across workers
+    lock_store: Literal["memory", "database"] = "memory"
+    lock_ttl_seconds: int = 60
+    lock_sweep_interval_seconds: int = 30
+    
+    # Write-behind autosave: content-only saves are kept in memory and written at most once per
+    # interval per diagram, and on unlock, lock expiry and shutdown (0 writes every save at once).
+    # With autosave_log_path every accepted save is also appended to a log replayed at startup.
+    # Pending saves live in one process, so buffering needs a single worker. Off by default:
+    # until it is enabled the write-behind path only runs in tests (tests/test_autosave.py).
+    autosave_flush_interval_seconds: float = 0.0
+    autosave_log_path: Optional[str] = None
+    autosave_log_fsync: bool = True
+    
+    # Diagram content storage: "zlib"/"zstd" keep it compressed in a binary column, "none" as plain text
+    content_compression: Literal["none", "zlib", "zstd"] = "zlib"
+    content_compression_level: Optional[int] = None
+    
+    # Revision history: full snapshot every N revisions, deltas in between; older revisions
+    # are compacted away once past the retention window, always keeping the last few
+    revision_snapshot_interval: int = 20
+    revision_retention_days: int = 90
+    revision_keep_last: int = 50
+    revision_compaction_interval_seconds: int = 3600
+    
+    # Viewport queries: grid cell size (canvas units) and number of diagrams kept indexed per worker
+    spatial_index_cell_size: int = 512
+    spatial_index_cache_size: int = 32
+    
+    # Diagram export (SVG; PNG/PDF need cairosvg): renders run in a process pool, results are
+    # cached by content hash in memory and, if export_cache_dir is set, on disk for all workers
+    export_workers: int = 2
+    export_max_pending: int = 16
+    export_cache_max_bytes: int = 64 * 1024 * 1024
+    export_cache_dir: Optional[str] = None
+    export_thumbnail_width: int = 320
+    
+    # Project archives (GET /projects/{id}/export, POST /projects/import): diagrams per batch
+    # and the largest single NDJSON record accepted on import
+    project_archive_batch_size: int = 100
+    project_import_max_line_bytes: int = 32 * 1024 * 1024
+    
+    # Instrumentation: Prometheus metrics on /metrics; a request running more SQL statements than the
+    # budget, or one statement this many times (N+1), is logged as a warning (0 disables a check)
+    metrics_enabled: bool = True
+    metrics_query_budget: int = 20
+    metrics_repeated_query_threshold: int = 5
+    
+    # Request profiling (pyinstrument if installed, else cProfile): requests carrying X-Profile-Token
+    # equal to profiling_token, plus a random share of all requests, kept only when slow enough
+    profiling_token: Optional[str] = None
+    profiling_sample_rate: float = 0.0
+    profiling_min_duration_ms: int = 500
+    profiling_interval_ms: float = 1.0
+    profiling_dir: Optional[str] = None
+    profiling_max_profiles: int = 50
+    
+    # Slow SQL log: statements slower than the threshold are logged with their parameter shape and
+    # EXPLAIN plan, and the latest few kept for GET /profiles/slow-queries (0 disables)
+    slow_query_threshold_ms: int = 200
+    slow_query_explain: bool = True
+    slow_query_history: int = 100
+    
+    # HTTP response compression, negotiated from Accept-Encoding (zstd/br need zstandard/brotli)
+    response_compression: bool = True
+    compression_minimum_size: int = 1024
+    compression_gzip_level: int = 6
+    compression_brotli_quality: int = 4
+    compression_zstd_level: int = 3
     
     class Config:
         env_file = ".env"
 
 settings = Settings()
-
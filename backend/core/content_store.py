@@ -0,0 +1,116 @@
+"""
+Compressed, content-addressed storage for diagram content.
+
+Content is stored in Diagram.content_blob, compressed with the codec named in
+Diagram.content_encoding, and keyed by the SHA-256 of the uncompressed text in
+Diagram.content_hash. Rows written before compression was enabled (or with
+CONTENT_COMPRESSION=none) keep the text in the legacy Diagram.content column;
+read_content() handles both, so callers never look at the columns directly.
+"""
+import hashlib
+import json
+import zlib
+from typing import Any, Optional, Tuple
+from core.config import settings
+
+ZLIB = "zlib"
+ZSTD = "zstd"
+IDENTITY = "identity"
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError as exc:
+        raise RuntimeError("The zstandard package is required for zstd-compressed diagram content") from exc
+    return zstandard
+
+def _compress(data: bytes, encoding: str, level: Optional[int]) -> bytes:
+    if encoding == IDENTITY:
+        return data
+    if encoding == ZLIB:
+        return zlib.compress(data, zlib.Z_DEFAULT_COMPRESSION if level is None else level)
+    if encoding == ZSTD:
+        return _zstd().ZstdCompressor(level=3 if level is None else level).compress(data)
+    raise ValueError(f"Unknown content encoding: {encoding}")
+
+def _decompress(blob: bytes, encoding: str) -> bytes:
+    if encoding == IDENTITY:
+        return blob
+    if encoding == ZLIB:
+        return zlib.decompress(blob)
+    if encoding == ZSTD:
+        return _zstd().ZstdDecompressor().decompress(blob)
+    raise ValueError(f"Unknown content encoding: {encoding}")
+
+def compress_text(text: str) -> Tuple[bytes, str]:
+    """Compress arbitrary text with the configured codec; returns (blob, encoding)."""
+    encoding = IDENTITY if settings.content_compression == "none" else settings.content_compression
+    return _compress(text.encode("utf-8"), encoding, settings.content_compression_level), encoding
+
+def decompress_text(blob: bytes, encoding: str) -> str:
+    return _decompress(blob, encoding).decode("utf-8")
+
+def content_hash(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+def count_elements(content: str, document: Any = None) -> Optional[int]:
+    """Number of nodes and edges in a diagram document, None if it is not one."""
+    if document is None:
+        try:
+            document = json.loads(content)
+        except ValueError:
+            return None
+    if not isinstance(document, dict):
+        return None
+    return sum(len(document.get(key) or ()) for key in ("nodes", "edges"))
+
+def encode_content(content: Optional[str], digest: Optional[str] = None, document: Any = None) -> dict:
+    """Column values that store ``content`` with the configured codec.
+
+    Besides the content itself this fills the size and element-count
+    metadata that diagram listings read instead of the content.
+    """
+    if content is None:
+        return {
+            "content": None, "content_blob": None, "content_encoding": None, "content_hash": None,
+            "content_size": None, "element_count": None,
+        }
+    data = content.encode("utf-8")
+    values = {
+        "content_hash": digest or hashlib.sha256(data).hexdigest(),
+        "content_size": len(data),
+        "element_count": count_elements(content, document),
+    }
+    encoding = settings.content_compression
+    if encoding == "none":
+        return {**values, "content": content, "content_blob": None, "content_encoding": None}
+    blob = _compress(data, encoding, settings.content_compression_level)
+    return {**values, "content": None, "content_blob": blob, "content_encoding": encoding}
+
+def decode_content(blob: Optional[bytes], encoding: Optional[str], legacy: Optional[str] = None) -> Optional[str]:
+    if blob is None:
+        return legacy
+    return _decompress(blob, encoding).decode("utf-8")
+
+def read_content(db_diagram) -> Optional[str]:
+    """Uncompressed content of a Diagram row, whichever way it is stored."""
+    return decode_content(db_diagram.content_blob, db_diagram.content_encoding, db_diagram.content)
+
+def stored_hash(db_diagram) -> Optional[str]:
+    """Hash of the stored content; computed for legacy rows that predate hashing."""
+    if db_diagram.content_hash is not None:
+        return db_diagram.content_hash
+    if db_diagram.content is not None:
+        return content_hash(db_diagram.content)
+    return None
+
+def store_content(db_diagram, content: Optional[str], document: Any = None) -> Tuple[dict, bool]:
+    """Column values for saving ``content`` and whether they differ from what is stored.
+
+    Identical saves are detected by hash so they can be skipped without
+    touching the row or bumping its revision.
+    """
+    digest = content_hash(content) if content is not None else None
+    if digest == stored_hash(db_diagram):
+        return {}, False
+    return encode_content(content, digest, document), True
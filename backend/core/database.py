@@ -1,10 +1,219 @@
-from sqlalchemy import create_engine
+import logging
+import time
+from collections import deque
+from datetime import datetime
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.sql.dml import UpdateBase
 from core.config import settings
 
-engine = create_engine(settings.database_url, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+slow_query_logger = logging.getLogger(__name__ + ".slow_queries")
+
+# Async drivers used by the request path for each backend
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "mysql": "mysql+aiomysql",
+}
+
+def _database_profile(url) -> str:
+    if settings.database_profile:
+        return settings.database_profile
+    return "sqlite" if url.get_backend_name() == "sqlite" else "server"
+
+def _is_memory_database(url) -> bool:
+    return url.database in (None, "", ":memory:")
+
+def _async_url(url):
+    if settings.async_database_url:
+        return make_url(settings.async_database_url)
+    return url.set(drivername=ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername))
+
+def _apply_sqlite_pragmas(engine, query_only: bool = False):
+    @event.listens_for(getattr(engine, "sync_engine", engine), "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"PRAGMA journal_mode={settings.sqlite_journal_mode}")
+        cursor.execute(f"PRAGMA synchronous={settings.sqlite_synchronous}")
+        cursor.execute(f"PRAGMA busy_timeout={int(settings.sqlite_busy_timeout_ms)}")
+        cursor.execute(f"PRAGMA mmap_size={int(settings.sqlite_mmap_size)}")
+        if query_only:
+            cursor.execute("PRAGMA query_only=ON")
+        cursor.close()
+
+def _create_engines(factory, url, **pool_options):
+    """Build (primary engine, read engine) for the configured profile.
+
+    factory is create_engine or create_async_engine; pool_options are passed
+    to every pooled engine (e.g. the async-compatible pool class).
+    """
+    if _database_profile(url) == "server":
+        engine = factory(
+            url,
+            pool_size=settings.db_pool_size,
+            max_overflow=settings.db_max_overflow,
+            pool_timeout=settings.db_pool_timeout,
+            pool_recycle=settings.db_pool_recycle,
+            pool_pre_ping=settings.db_pool_pre_ping,
+            **pool_options,
+        )
+        return engine, engine
+    
+    connect_args = {"check_same_thread": False}
+    if _is_memory_database(url):
+        engine = factory(url, connect_args=connect_args)
+        return engine, engine
+    
+    split = settings.sqlite_read_write_split and settings.sqlite_journal_mode == "wal"
+    if not split:
+        engine = factory(url, connect_args=connect_args, **pool_options)
+        _apply_sqlite_pragmas(engine)
+        return engine, engine
+    
+    # SQLite allows one writer at a time: queue writers on a single pooled
+    # connection instead of letting them fight over the file lock, while WAL
+    # lets readers proceed concurrently on their own pool.
+    engine = factory(
+        url, connect_args=connect_args, pool_size=1, max_overflow=0,
+        pool_timeout=settings.db_pool_timeout, **pool_options,
+    )
+    _apply_sqlite_pragmas(engine)
+    read_engine = factory(
+        url, connect_args=connect_args, pool_size=settings.sqlite_read_pool_size,
+        max_overflow=settings.db_max_overflow, pool_timeout=settings.db_pool_timeout,
+        **pool_options,
+    )
+    _apply_sqlite_pragmas(read_engine, query_only=True)
+    return engine, read_engine
+
+class RoutingSession(Session):
+    """Session that reads from read_bind until it first writes, then uses primary_bind.
+
+    Once a transaction has written, every later statement in it goes to the
+    primary engine so the session always reads its own writes.
+    """
+    primary_bind = None
+    read_bind = None
+    _wrote = False
+    
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if self._wrote or self._flushing or isinstance(clause, UpdateBase):
+            self._wrote = True
+            return self.primary_bind
+        return self.read_bind
+
+@event.listens_for(RoutingSession, "after_commit")
+@event.listens_for(RoutingSession, "after_rollback")
+def _reset_session_routing(session):
+    session._wrote = False
+
+def _session_class(engine, read_engine):
+    if read_engine is engine:
+        return Session
+    return type("RoutingSession", (RoutingSession,), {
+        "primary_bind": engine,
+        "read_bind": read_engine,
+    })
+
+_url = make_url(settings.database_url)
+
+# Synchronous engine: schema creation, scripts and maintenance commands
+engine, read_engine = _create_engines(create_engine, _url)
+SessionLocal = sessionmaker(
+    autocommit=False, autoflush=False, bind=engine,
+    class_=_session_class(engine, read_engine),
+)
+
+# Async engine: used by the API so queries never block the event loop
+async_engine, async_read_engine = _create_engines(
+    create_async_engine, _async_url(_url), poolclass=AsyncAdaptedQueuePool
+)
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False,
+    sync_session_class=_session_class(async_engine.sync_engine, async_read_engine.sync_engine),
+)
+
+# Slow SQL log: the latest entries stay in memory for GET /profiles/slow-queries
+recent_slow_queries = deque(maxlen=max(settings.slow_query_history, 1))
+EXPLAINABLE_STATEMENTS = ("SELECT", "WITH", "UPDATE", "DELETE")
+
+def _value_shape(value) -> str:
+    if isinstance(value, (str, bytes, bytearray)):
+        return f"{type(value).__name__}[{len(value)}]"
+    return type(value).__name__
+
+def _parameter_shape(parameters, executemany: bool) -> str:
+    """Types and sizes of the bound parameters, never their values."""
+    if executemany:
+        rows = list(parameters or ())
+        return f"{len(rows)} x {_parameter_shape(rows[0], False)}" if rows else "0 rows"
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{name}: {_value_shape(value)}" for name, value in parameters.items()) + "}"
+    return "(" + ", ".join(_value_shape(value) for value in parameters or ()) + ")"
+
+def _explain(conn, statement: str, parameters) -> str:
+    """Query plan from the same connection; a raw DBAPI cursor, so engine events don't see it."""
+    sqlite = conn.dialect.name == "sqlite"
+    cursor = conn.connection.cursor()
+    try:
+        if sqlite:
+            cursor.execute("EXPLAIN QUERY PLAN " + statement, parameters)
+            rows = cursor.fetchall()
+        else:
+            # A failed statement would abort the request's transaction; contain it in a savepoint
+            cursor.execute("SAVEPOINT slow_query_explain")
+            try:
+                cursor.execute("EXPLAIN " + statement, parameters)
+                rows = cursor.fetchall()
+            except Exception:
+                cursor.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+                raise
+            finally:
+                cursor.execute("RELEASE SAVEPOINT slow_query_explain")
+    finally:
+        cursor.close()
+    # SQLite: (id, parent, notused, detail); PostgreSQL: one text column per line
+    return "\n".join(str(row[-1]) if sqlite or len(row) == 1 else " | ".join(map(str, row)) for row in rows)
+
+def _install_slow_query_log(sync_engine):
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("slow_query_start", []).append(time.perf_counter())
+    
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def log_slow_query(conn, cursor, statement, parameters, context, executemany):
+        elapsed_ms = (time.perf_counter() - conn.info["slow_query_start"].pop()) * 1000
+        if elapsed_ms < settings.slow_query_threshold_ms:
+            return
+        plan = None
+        verb = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+        # Plain EXPLAIN only plans the statement, writes included; it never runs it
+        if settings.slow_query_explain and not executemany and verb in EXPLAINABLE_STATEMENTS:
+            try:
+                plan = _explain(conn, statement, parameters)
+            except Exception as exc:  # the plan is a diagnostic, never fail the query over it
+                plan = f"EXPLAIN failed: {exc}"
+        entry = {
+            "statement": statement,
+            "parameters": _parameter_shape(parameters, executemany),
+            "duration_ms": round(elapsed_ms, 2),
+            "explain": plan,
+            "logged_at": datetime.utcnow().isoformat() + "Z",
+        }
+        recent_slow_queries.append(entry)
+        slow_query_logger.warning(
+            "Slow SQL (%.1f ms) %s params %s%s",
+            elapsed_ms, " ".join(statement.split()), entry["parameters"], f"\n{plan}" if plan else "",
+        )
+
+if settings.slow_query_threshold_ms > 0:
+    _sync_engines = (engine, read_engine, async_engine.sync_engine, async_read_engine.sync_engine)
+    for _engine in {id(sync_engine): sync_engine for sync_engine in _sync_engines}.values():
+        _install_slow_query_log(_engine)
 
 Base = declarative_base()
 
@@ -15,3 +224,22 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def _pool_status(pool) -> dict:
+    status = {"pool": type(pool).__name__}
+    for name in ("size", "checkedin", "checkedout", "overflow"):
+        method = getattr(pool, name, None)
+        if callable(method):
+            status[name] = method()
+    return status
+
+def get_pool_status() -> dict:
+    """Connection pool statistics of the database engines, for monitoring."""
+    status = {"profile": _database_profile(_url), "primary": _pool_status(async_engine.pool)}
+    if async_read_engine is not async_engine:
+        status["read"] = _pool_status(async_read_engine.pool)
+    status["sync"] = _pool_status(engine.pool)
+    return status
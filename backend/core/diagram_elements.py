@@ -0,0 +1,176 @@
+"""
+Projection of diagram documents onto DiagramElement rows.
+
+A diagram document is a JSON object whose ``nodes`` and ``edges`` arrays
+hold elements identified by their ``id``. Each element maps to one row keyed
+by (element_type, element_key), where element_type is "node" or "edge" and
+element_key is the element id; the row keeps the element JSON, the text a
+user would search for and, for nodes, its position so elements can be
+queried without parsing documents.
+"""
+import json
+from typing import Iterable, Optional
+from core.json_patch import JsonPatchError, parse_pointer
+
+COLLECTIONS = {"node": "nodes", "edge": "edges"}
+ELEMENT_TYPES = {collection: element_type for element_type, collection in COLLECTIONS.items()}
+
+def element_key(element) -> Optional[str]:
+    if not isinstance(element, dict) or element.get("id") is None:
+        return None
+    return str(element["id"])
+
+def _coordinate(value) -> Optional[int]:
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return int(round(value))
+
+def node_position(node: dict) -> tuple:
+    """Canvas position of a node.
+
+    Child nodes store ``position`` relative to their parent; the editor also
+    saves ``positionAbsolute``, which is preferred when present.
+    """
+    for field in ("positionAbsolute", "position"):
+        position = node.get(field)
+        if isinstance(position, dict):
+            return _coordinate(position.get("x")), _coordinate(position.get("y"))
+    return None, None
+
+def node_size(node: dict) -> tuple:
+    """Rendered width and height of a node, 0 when unknown."""
+    style = node.get("style") if isinstance(node.get("style"), dict) else {}
+    return tuple(
+        _coordinate(node.get(dimension)) or _coordinate(style.get(dimension)) or 0
+        for dimension in ("width", "height")
+    )
+
+def edge_endpoints(edge: dict) -> tuple:
+    """Keys of the nodes an edge connects."""
+    return tuple(
+        str(edge[end]) if edge.get(end) is not None else None
+        for end in ("source", "target")
+    )
+
+# Text fields of element data that are worth searching
+TEXT_FIELDS = ("label", "header", "description", "sourceCardinality", "targetCardinality")
+
+def _text_values(value) -> list:
+    if isinstance(value, str):
+        return [value] if value.strip() else []
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return [str(value)]
+    return []
+
+def element_text(element: dict) -> Optional[str]:
+    """Searchable text of an element: labels, headers, ERD attributes, edge labels."""
+    data = element.get("data") if isinstance(element.get("data"), dict) else {}
+    parts = _text_values(element.get("label"))
+    for field in TEXT_FIELDS:
+        parts.extend(_text_values(data.get(field)))
+    attributes = data.get("attributes")
+    for attribute in attributes if isinstance(attributes, list) else []:
+        if isinstance(attribute, dict):
+            parts.extend(_text_values(attribute.get("name")))
+            parts.extend(_text_values(attribute.get("type")))
+        else:
+            parts.extend(_text_values(attribute))
+    return "\n".join(parts) or None
+
+def element_row(element_type: str, element: dict) -> dict:
+    """Column values of the DiagramElement row for one document element."""
+    x, y = node_position(element) if element_type == "node" else (None, None)
+    return {
+        "element_type": element_type,
+        "element_key": element_key(element),
+        "element_data": json.dumps(element, ensure_ascii=False, separators=(",", ":")),
+        "search_text": element_text(element),
+        "position_x": x,
+        "position_y": y,
+    }
+
+def _elements(document, element_type: str) -> list:
+    elements = document.get(COLLECTIONS[element_type]) if isinstance(document, dict) else None
+    return elements if isinstance(elements, list) else []
+
+def element_rows(document, keys: Optional[Iterable[tuple]] = None) -> dict:
+    """Rows for the document's elements, keyed by (element_type, element_key).
+
+    With ``keys`` only those elements are returned; elements without an id
+    cannot be addressed and are left out.
+    """
+    wanted = set(keys) if keys is not None else None
+    rows = {}
+    for element_type in COLLECTIONS:
+        for element in _elements(document, element_type):
+            key = element_key(element)
+            if key is None or (wanted is not None and (element_type, key) not in wanted):
+                continue
+            rows[(element_type, key)] = element_row(element_type, element)
+    return rows
+
+def touched_elements(document, operations: list[dict]) -> Optional[set]:
+    """Elements changed by JSON Patch ``operations`` on ``document`` (already applied).
+
+    Returns None when the operations add, remove or reorder whole elements
+    (or rewrite an element id), in which case the projection has to be
+    rebuilt from the full document.
+    """
+    touched = set()
+    for operation in operations:
+        for pointer in (operation.get("path"), operation.get("from")):
+            if pointer is None:
+                continue
+            try:
+                tokens = parse_pointer(pointer)
+            except JsonPatchError:
+                return None
+            if not tokens:
+                return None
+            element_type = ELEMENT_TYPES.get(tokens[0])
+            if element_type is None:
+                continue  # outside nodes/edges, nothing to project
+            if len(tokens) < 3 or tokens[2] == "id" or not tokens[1].isdigit():
+                return None
+            elements = _elements(document, element_type)
+            index = int(tokens[1])
+            key = element_key(elements[index]) if index < len(elements) else None
+            if key is None:
+                return None
+            touched.add((element_type, key))
+    return touched
+
+def apply_element_batch(document, upserts: list[tuple], deletes: Iterable[tuple]) -> dict:
+    """Apply upserts and deletes to the document's element arrays in place.
+
+    ``upserts`` are (element_type, element) pairs: an element whose id is
+    already present is replaced where it stands, new ones are appended in the
+    given order. ``deletes`` are (element_type, element_key) pairs.
+    """
+    if not isinstance(document, dict):
+        raise JsonPatchError("Diagram content is not a JSON object")
+    deleted = set(deletes)
+    for element_type, collection in COLLECTIONS.items():
+        elements = document.get(collection)
+        if elements is None:
+            elements = []
+        elif not isinstance(elements, list):
+            raise JsonPatchError(f"Diagram content member '{collection}' is not an array")
+        positions = {element_key(element): index for index, element in enumerate(elements)}
+        for upsert_type, element in upserts:
+            if upsert_type != element_type:
+                continue
+            index = positions.get(element_key(element))
+            if index is None:
+                positions[element_key(element)] = len(elements)
+                elements.append(element)
+            else:
+                elements[index] = element
+        if deleted:
+            elements = [
+                element for element in elements
+                if (element_type, element_key(element)) not in deleted
+            ]
+        if elements or collection in document:
+            document[collection] = elements
+    return document
@@ -0,0 +1,496 @@
+"""
+Server-side export of diagrams to SVG, PNG and PDF.
+
+Diagram documents are React Flow JSON: ``nodes`` carry a position, a size and
+``data`` with the ShapeNode styling (shape, label, colours, border), ``edges``
+connect node ids. ``render_svg`` draws that geometry without a browser; PNG and
+PDF are converted from the SVG with the optional ``cairosvg`` package.
+
+Rendering is CPU-bound, so ``ExportService`` runs it in a process pool and keeps
+results in an LRU cache (optionally mirrored to a directory) keyed by the content
+hash, format and size: repeat views of an unchanged diagram never render again,
+and concurrent requests for the same image share one render.
+"""
+import asyncio
+import hashlib
+import json
+import math
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+from xml.sax.saxutils import escape
+
+from core.config import settings
+from core.diagram_elements import edge_endpoints, element_key, node_position, node_size
+
+try:
+    import cairosvg
+except (ImportError, OSError):  # optional: only needed for PNG/PDF; OSError when libcairo is missing
+    cairosvg = None
+
+# Bump when the drawing changes so cached images are not reused
+RENDERER_VERSION = 1
+
+EXPORT_FORMATS = {
+    "svg": "image/svg+xml",
+    "png": "image/png",
+    "pdf": "application/pdf",
+}
+
+DEFAULT_NODE_SIZE = (160, 80)
+PADDING = 24
+FONT_FAMILY = "Inter, Arial, Helvetica, sans-serif"
+FONT_SIZE = 13
+LINE_HEIGHT = 1.3
+
+
+class ExportUnavailable(Exception):
+    """The requested format needs an optional package that is not installed."""
+
+
+class ExportBusy(Exception):
+    """Too many renders are already queued."""
+
+
+def _number(value, default):
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+        return default
+    return value
+
+
+def _attr(value) -> str:
+    return escape(str(value), {'"': "&quot;"})
+
+
+def _node_box(node: dict) -> Optional[tuple]:
+    x, y = node_position(node)
+    if x is None or y is None:
+        return None
+    data = node.get("data") if isinstance(node.get("data"), dict) else {}
+    width, height = node_size(node)
+    width = width or _number(data.get("width"), DEFAULT_NODE_SIZE[0])
+    height = height or _number(data.get("height"), DEFAULT_NODE_SIZE[1])
+    return x, y, max(width, 1), max(height, 1)
+
+
+def _label_lines(label) -> list:
+    if label is None:
+        return []
+    return [line for line in str(label).splitlines()] or [""]
+
+
+def _text(lines, cx, top, color, size, weight=None, anchor="middle") -> str:
+    if not lines:
+        return ""
+    weight_attr = f' font-weight="{_attr(weight)}"' if weight else ""
+    spans = "".join(
+        f'<tspan x="{cx:g}" dy="{(size if index == 0 else size * LINE_HEIGHT):g}">{escape(line)}</tspan>'
+        for index, line in enumerate(lines)
+    )
+    return (
+        f'<text x="{cx:g}" y="{top:g}" fill="{_attr(color)}" font-size="{size:g}"'
+        f'{weight_attr} text-anchor="{anchor}">{spans}</text>'
+    )
+
+
+def _centered_text(lines, cx, cy, color, size, weight=None) -> str:
+    block = size + size * LINE_HEIGHT * (len(lines) - 1)
+    return _text(lines, cx, cy - block / 2 - size * 0.2, color, size, weight)
+
+
+def _shape(shape: str, x, y, w, h, style: dict) -> str:
+    fill, stroke, width = style["fill"], style["stroke"], style["stroke_width"]
+    paint = f'fill="{_attr(fill)}" stroke="{_attr(stroke)}" stroke-width="{width:g}"'
+    if style.get("dash"):
+        paint += ' stroke-dasharray="6 4"'
+    cx, cy = x + w / 2, y + h / 2
+
+    if shape == "circle":
+        return f'<ellipse cx="{cx:g}" cy="{cy:g}" rx="{w / 2:g}" ry="{h / 2:g}" {paint}/>'
+    if shape in ("diamond", "relationship"):
+        points = f"{cx:g},{y:g} {x + w:g},{cy:g} {cx:g},{y + h:g} {x:g},{cy:g}"
+        return f'<polygon points="{points}" {paint}/>'
+    if shape == "parallelogram":
+        skew = min(w * 0.2, 24)
+        points = f"{x + skew:g},{y:g} {x + w:g},{y:g} {x + w - skew:g},{y + h:g} {x:g},{y + h:g}"
+        return f'<polygon points="{points}" {paint}/>'
+    if shape == "triangle":
+        points = f"{cx:g},{y:g} {x + w:g},{y + h:g} {x:g},{y + h:g}"
+        return f'<polygon points="{points}" {paint}/>'
+    if shape == "cylinder":
+        ry = min(h * 0.15, 14)
+        body = (
+            f"M{x:g},{y + ry:g} A{w / 2:g},{ry:g} 0 0 1 {x + w:g},{y + ry:g} "
+            f"V{y + h - ry:g} A{w / 2:g},{ry:g} 0 0 1 {x:g},{y + h - ry:g} Z"
+        )
+        rim = f"M{x:g},{y + ry:g} A{w / 2:g},{ry:g} 0 0 0 {x + w:g},{y + ry:g}"
+        return f'<path d="{body}" {paint}/><path d="{rim}" fill="none" stroke="{_attr(stroke)}" stroke-width="{width:g}"/>'
+    if shape == "data-object":
+        fold = min(w, h) * 0.25
+        page = f"M{x:g},{y:g} H{x + w - fold:g} L{x + w:g},{y + fold:g} V{y + h:g} H{x:g} Z"
+        corner = f"M{x + w - fold:g},{y:g} V{y + fold:g} H{x + w:g}"
+        return f'<path d="{page}" {paint}/><path d="{corner}" fill="none" stroke="{_attr(stroke)}" stroke-width="{width:g}"/>'
+    if shape == "annotation":
+        bracket = f"M{x + 12:g},{y:g} H{x:g} V{y + h:g} H{x + 12:g}"
+        return f'<path d="{bracket}" fill="none" stroke="{_attr(stroke)}" stroke-width="{width:g}"/>'
+
+    radius = max(0, min(_number(style.get("radius"), 0), w / 2, h / 2))
+    rect = f'<rect x="{x:g}" y="{y:g}" width="{w:g}" height="{h:g}" rx="{radius:g}" {paint}/>'
+    if style.get("double"):
+        inset = width + 3
+        rect += (
+            f'<rect x="{x + inset:g}" y="{y + inset:g}" width="{max(w - 2 * inset, 0):g}" '
+            f'height="{max(h - 2 * inset, 0):g}" rx="{max(radius - inset, 0):g}" fill="none" '
+            f'stroke="{_attr(stroke)}" stroke-width="{width:g}"/>'
+        )
+    return rect
+
+
+def _attribute_names(attributes) -> list:
+    names = []
+    for attribute in attributes if isinstance(attributes, list) else []:
+        if isinstance(attribute, dict):
+            name = attribute.get("name") or attribute.get("label") or ""
+            if attribute.get("type"):
+                name = f"{name}: {attribute['type']}"
+            if attribute.get("primary") or attribute.get("isPrimaryKey"):
+                name = f"PK {name}"
+            names.append(str(name))
+        elif attribute is not None:
+            names.append(str(attribute))
+    return names
+
+
+def _render_node(node: dict, box: tuple) -> str:
+    x, y, w, h = box
+    data = node.get("data") if isinstance(node.get("data"), dict) else {}
+    shape = data.get("shape") or "rectangle"
+    border_style = data.get("borderStyle")
+    style = {
+        "fill": data.get("background") or "#ffffff",
+        "stroke": data.get("borderColor") or "#1f2937",
+        "stroke_width": _number(data.get("borderWidth"), 2),
+        "radius": data.get("borderRadius", 12),
+        "dash": bool(data.get("borderDash")) or border_style in ("dashed", "dotted"),
+        "double": bool(data.get("doubleBorder")) or border_style == "double",
+    }
+    color = data.get("textColor") or "#111827"
+    size = _number(data.get("fontSize"), FONT_SIZE)
+    weight = data.get("fontWeight")
+    parts = [_shape(shape, x, y, w, h, style)]
+    lines = _label_lines(data.get("label", "Element"))
+    cx = x + w / 2
+
+    if shape == "entity" or data.get("header") or data.get("attributes"):
+        # Header band with the name, attribute rows below
+        header_lines = _label_lines(data.get("header")) or lines
+        header_height = size * LINE_HEIGHT * max(len(header_lines), 1) + 12
+        parts.append(
+            f'<line x1="{x:g}" y1="{y + header_height:g}" x2="{x + w:g}" y2="{y + header_height:g}" '
+            f'stroke="{_attr(style["stroke"])}" stroke-width="{style["stroke_width"]:g}"/>'
+        )
+        parts.append(_text(header_lines, cx, y + 6, color, size, weight or 600))
+        attributes = _attribute_names(data.get("attributes"))
+        if attributes:
+            parts.append(_text(attributes, x + 10, y + header_height + 6, color, size - 1, anchor="start"))
+    elif shape == "lane":
+        parts.append(_text(lines, x + 12, y + 8, color, size, weight or 600, anchor="start"))
+    elif data.get("showLabelInside", True) is False or data.get("labelPosition") == "bottom":
+        parts.append(_text(lines, cx, y + h + 4, color, size, weight))
+    else:
+        parts.append(_centered_text(lines, cx, y + h / 2, color, size, weight))
+    return "".join(parts)
+
+
+def _clip_to_box(inside: tuple, outside: tuple, box: tuple) -> tuple:
+    """Point where the segment inside->outside leaves the box."""
+    (ix, iy), (ox, oy) = inside, outside
+    x, y, w, h = box
+    dx, dy = ox - ix, oy - iy
+    scales = []
+    if dx:
+        scales.append(((x + w) - ix) / dx if dx > 0 else (x - ix) / dx)
+    if dy:
+        scales.append(((y + h) - iy) / dy if dy > 0 else (y - iy) / dy)
+    scale = min([s for s in scales if s >= 0] or [0])
+    scale = min(scale, 1)
+    return ix + dx * scale, iy + dy * scale
+
+
+def _has_marker(edge: dict, field: str) -> bool:
+    marker = edge.get(field)
+    return bool(marker) and (not isinstance(marker, dict) or bool(marker.get("type")))
+
+
+def _render_edge(edge: dict, boxes: dict) -> str:
+    source, target = edge_endpoints(edge)
+    if source not in boxes or target not in boxes:
+        return ""
+    source_box, target_box = boxes[source], boxes[target]
+    start = (source_box[0] + source_box[2] / 2, source_box[1] + source_box[3] / 2)
+    end = (target_box[0] + target_box[2] / 2, target_box[1] + target_box[3] / 2)
+    x1, y1 = _clip_to_box(start, end, source_box)
+    x2, y2 = _clip_to_box(end, start, target_box)
+
+    style = edge.get("style") if isinstance(edge.get("style"), dict) else {}
+    stroke = style.get("stroke") or "#1f2937"
+    stroke_width = _number(style.get("strokeWidth"), 2)
+    attrs = f'stroke="{_attr(stroke)}" stroke-width="{stroke_width:g}" fill="none"'
+    if style.get("strokeDasharray"):
+        attrs += f' stroke-dasharray="{_attr(style["strokeDasharray"])}"'
+    elif edge.get("animated"):
+        attrs += ' stroke-dasharray="5 5"'
+    if _has_marker(edge, "markerEnd"):
+        attrs += ' marker-end="url(#arrow)"'
+    if _has_marker(edge, "markerStart"):
+        attrs += ' marker-start="url(#arrow-start)"'
+    parts = [f'<line x1="{x1:g}" y1="{y1:g}" x2="{x2:g}" y2="{y2:g}" {attrs}/>']
+
+    label = edge.get("label")
+    data = edge.get("data") if isinstance(edge.get("data"), dict) else {}
+    label = label if label not in (None, "") else data.get("label")
+    if label not in (None, ""):
+        lines = _label_lines(label)
+        mx, my = (x1 + x2) / 2, (y1 + y2) / 2
+        size = FONT_SIZE - 1
+        width = max(len(line) for line in lines) * size * 0.6 + 12
+        height = size * LINE_HEIGHT * len(lines) + 6
+        parts.append(
+            f'<rect x="{mx - width / 2:g}" y="{my - height / 2:g}" width="{width:g}" height="{height:g}" '
+            f'rx="4" fill="#f8fafc"/>'
+        )
+        parts.append(_centered_text(lines, mx, my, "#1f2937", size))
+    return "".join(parts)
+
+
+def render_svg(document, width: Optional[int] = None) -> str:
+    """SVG of a diagram document; with ``width`` the image is scaled to that pixel width."""
+    if not isinstance(document, dict):
+        document = {}
+    nodes = [node for node in document.get("nodes") or [] if isinstance(node, dict)]
+    edges = [edge for edge in document.get("edges") or [] if isinstance(edge, dict)]
+
+    boxes, drawable = {}, []
+    for node in nodes:
+        if node.get("hidden"):
+            continue
+        box = _node_box(node)
+        if box is None:
+            continue
+        key = element_key(node)
+        if key is not None:
+            boxes[key] = box
+        drawable.append((node, box))
+
+    if drawable:
+        min_x = min(box[0] for _, box in drawable) - PADDING
+        min_y = min(box[1] for _, box in drawable) - PADDING
+        max_x = max(box[0] + box[2] for _, box in drawable) + PADDING
+        # Labels under a shape hang below its box
+        max_y = max(box[1] + box[3] for _, box in drawable) + PADDING + FONT_SIZE * 2
+    else:
+        min_x, min_y, max_x, max_y = 0, 0, 320, 180
+    view_width, view_height = max_x - min_x, max_y - min_y
+
+    if width:
+        pixel_width = width
+        pixel_height = max(1, round(view_height * width / view_width))
+    else:
+        pixel_width, pixel_height = math.ceil(view_width), math.ceil(view_height)
+
+    # Lanes and other containers go underneath their children
+    drawable.sort(key=lambda item: 0 if (item[0].get("data") or {}).get("shape") == "lane" else 1)
+    body = "".join(_render_node(node, box) for node, box in drawable)
+    lines = "".join(_render_edge(edge, boxes) for edge in edges if not edge.get("hidden"))
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{pixel_width}" height="{pixel_height}" '
+        f'viewBox="{min_x:g} {min_y:g} {view_width:g} {view_height:g}" '
+        f'font-family="{_attr(FONT_FAMILY)}">'
+        '<defs>'
+        '<marker id="arrow" viewBox="0 0 10 10" refX="9" refY="5" markerWidth="8" markerHeight="8" '
+        'orient="auto"><path d="M0,0 L10,5 L0,10 z" fill="#1f2937"/></marker>'
+        '<marker id="arrow-start" viewBox="0 0 10 10" refX="1" refY="5" markerWidth="8" markerHeight="8" '
+        'orient="auto"><path d="M10,0 L0,5 L10,10 z" fill="#1f2937"/></marker>'
+        '</defs>'
+        f'<rect x="{min_x:g}" y="{min_y:g}" width="{view_width:g}" height="{view_height:g}" fill="#ffffff"/>'
+        f'{body}{lines}</svg>'
+    )
+
+
+def render_diagram(content: Optional[str], export_format: str, width: Optional[int] = None) -> bytes:
+    """Render stored diagram content; runs in a worker process."""
+    try:
+        document = json.loads(content) if content else {}
+    except ValueError:
+        document = {}
+    svg = render_svg(document, width=width)
+    if export_format == "svg":
+        return svg.encode("utf-8")
+    if cairosvg is None:
+        raise ExportUnavailable(f"{export_format.upper()} export requires the cairosvg package")
+    if export_format == "png":
+        return cairosvg.svg2png(bytestring=svg.encode("utf-8"))
+    return cairosvg.svg2pdf(bytestring=svg.encode("utf-8"))
+
+
+def export_available(export_format: str) -> bool:
+    return export_format == "svg" or cairosvg is not None
+
+
+def export_key(content_hash: Optional[str], export_format: str, width: Optional[int] = None) -> str:
+    """Cache key of one rendering; identical content renders identically across diagrams."""
+    raw = f"{RENDERER_VERSION}:{content_hash}:{export_format}:{width or 0}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class RenderCache:
+    """LRU of rendered images bounded by total bytes, optionally mirrored to a directory."""
+
+    def __init__(self, max_bytes: int, directory: Optional[str] = None):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return data
+        if self.directory:
+            try:
+                with open(self._path(key), "rb") as file:
+                    data = file.read()
+            except OSError:
+                data = None
+            if data is not None:
+                self._remember(key, data)
+                with self._lock:
+                    self.hits += 1
+                return data
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def _remember(self, key: str, data: bytes):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous)
+            self._entries[key] = data
+            self._size += len(data)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def set(self, key: str, data: bytes):
+        self._remember(key, data)
+        if self.directory:
+            path = self._path(key)
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                # Write then rename so other workers never read a partial file
+                temporary = f"{path}.{os.getpid()}.tmp"
+                with open(temporary, "wb") as file:
+                    file.write(data)
+                os.replace(temporary, path)
+            except OSError:
+                pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "directory": self.directory,
+            }
+
+
+class ExportService:
+    """Renders in a process pool, caches the results and coalesces concurrent renders."""
+
+    def __init__(self, workers: int, max_pending: int, cache: RenderCache):
+        self.workers = max(1, workers)
+        self.max_pending = max(1, max_pending)
+        self.cache = cache
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self.renders = 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn: forking a process that holds database and event loop threads is unsafe
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+    async def cached(self, key: str) -> Optional[bytes]:
+        if self.cache.directory:
+            return await asyncio.to_thread(self.cache.get, key)
+        return self.cache.get(key)
+
+    async def render(self, key: str, content: Optional[str], export_format: str,
+                     width: Optional[int] = None) -> bytes:
+        if not export_available(export_format):
+            raise ExportUnavailable(f"{export_format.upper()} export requires the cairosvg package")
+        shared = self._inflight.get(key)
+        if shared is not None:
+            return await asyncio.shield(shared)
+        if len(self._inflight) >= self.max_pending:
+            raise ExportBusy()
+
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._get_executor(), render_diagram, content, export_format, width)
+        self._inflight[key] = future
+        try:
+            data = await asyncio.shield(future)
+        finally:
+            self._inflight.pop(key, None)
+        self.renders += 1
+        if self.cache.directory:
+            await asyncio.to_thread(self.cache.set, key, data)
+        else:
+            self.cache.set(key, data)
+        return data
+
+    def stop(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "inflight": len(self._inflight),
+            "renders": self.renders,
+            "formats": [name for name in EXPORT_FORMATS if export_available(name)],
+            "cache": self.cache.stats(),
+        }
+
+
+export_service = ExportService(
+    workers=settings.export_workers,
+    max_pending=settings.export_max_pending,
+    cache=RenderCache(settings.export_cache_max_bytes, settings.export_cache_dir),
+)
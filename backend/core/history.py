@@ -0,0 +1,60 @@
+"""
+Retention for diagram revision history.
+
+RevisionCompactor periodically drops revisions past the retention window
+(keeping at least the last REVISION_KEEP_LAST per diagram), turning the
+oldest kept revision into a snapshot so the delta chain stays valid. How
+revisions are recorded and replayed lives in crud.revision.
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from core.config import settings
+from core.database import AsyncSessionLocal
+import crud
+
+logger = logging.getLogger(__name__)
+
+class RevisionCompactor:
+    """Background job enforcing the revision retention policy."""
+    
+    def __init__(self, interval_seconds: int, retention_days: int, keep_last: int):
+        self.interval_seconds = interval_seconds
+        self.retention_days = retention_days
+        self.keep_last = keep_last
+        self._task = None
+    
+    async def compact(self) -> int:
+        """Compact every diagram with expired revisions; returns the number of rows removed."""
+        older_than = datetime.utcnow() - timedelta(days=self.retention_days)
+        async with AsyncSessionLocal() as db:
+            diagram_ids = await crud.aio.get_diagrams_with_revisions_before(db, older_than=older_than)
+            removed = 0
+            for diagram_id in diagram_ids:
+                removed += await crud.aio.compact_diagram_revisions(
+                    db, diagram_id=diagram_id, older_than=older_than, keep_last=self.keep_last
+                )
+        return removed
+    
+    async def _compact_forever(self):
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            try:
+                await self.compact()
+            except Exception:
+                logger.exception("Diagram revision compaction failed")
+    
+    async def start(self):
+        if self.interval_seconds > 0:
+            self._task = asyncio.create_task(self._compact_forever())
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+revision_compactor = RevisionCompactor(
+    interval_seconds=settings.revision_compaction_interval_seconds,
+    retention_days=settings.revision_retention_days,
+    keep_last=settings.revision_keep_last,
+)
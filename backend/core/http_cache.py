@@ -0,0 +1,82 @@
+"""
+ETag helpers for conditional requests.
+
+ETags are strong validators derived from the row fields that appear in a
+response (the content revision counter, names, timestamps), never from the
+serialized body, so they can be checked before the body is loaded or built.
+A body compressed by core.compression carries the ETag with the encoding
+appended ("<tag>-gzip"); the precondition checks accept either form.
+"""
+import hashlib
+from typing import Iterable
+from fastapi import Request, Response
+
+# Clients may reuse a cached body only after revalidating it with the ETag
+CACHE_CONTROL = "private, no-cache"
+
+def make_etag(*parts) -> str:
+    digest = hashlib.sha1("\x1f".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+    return f'"{digest[:20]}"'
+
+def diagram_etag(db_diagram, *variant) -> str:
+    """ETag of a diagram; ``variant`` distinguishes alternative representations."""
+    return make_etag(
+        "diagram", db_diagram.id, db_diagram.revision, db_diagram.name,
+        db_diagram.project_id, db_diagram.updated_at, *variant,
+    )
+
+def diagram_list_etag(project_id: int, diagrams: Iterable) -> str:
+    return make_etag("diagrams", project_id, *(
+        (diagram.id, diagram.revision, diagram.name, diagram.updated_at, diagram.content_size)
+        for diagram in diagrams
+    ))
+
+def project_etag(db_project) -> str:
+    return make_etag(
+        "project", db_project.id, db_project.name, db_project.description,
+        db_project.owner_id, db_project.updated_at,
+    )
+
+# Content codings core.compression may append to an ETag
+CONTENT_CODINGS = ("zstd", "br", "gzip")
+
+def encoded_etag(etag: str, encoding: str) -> str:
+    """The ETag of the ``encoding``-compressed body: a validator distinct from the identity body's."""
+    if not etag.endswith('"'):
+        return etag
+    return f'{etag[:-1]}-{encoding}"'
+
+def _identity_tag(tag: str) -> str:
+    for encoding in CONTENT_CODINGS:
+        suffix = f'-{encoding}"'
+        if tag.endswith(suffix):
+            return tag[:-len(suffix)] + '"'
+    return tag
+
+def _parse(header: str) -> list[str]:
+    return [_identity_tag(tag.strip()) for tag in header.split(",") if tag.strip()]
+
+def if_none_match(request: Request, etag: str) -> bool:
+    """True if If-None-Match matches, i.e. the client's copy is current (weak comparison)."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = _parse(header)
+    return "*" in tags or etag in (tag[2:] if tag.startswith("W/") else tag for tag in tags)
+
+def if_match_fails(request: Request, *etags: str) -> bool:
+    """True if an If-Match precondition is present and matches none of ``etags`` (strong comparison)."""
+    header = request.headers.get("if-match")
+    if not header:
+        return False
+    tags = _parse(header)
+    if not etags:
+        return True
+    return "*" not in tags and not any(etag in tags for etag in etags)
+
+def set_etag(response: Response, etag: str) -> None:
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
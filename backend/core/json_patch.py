@@ -0,0 +1,222 @@
+"""
+Minimal RFC 6902 (JSON Patch) implementation used for incremental diagram saves
+and for the deltas of the diagram revision history.
+
+Operations are applied in place to an already parsed document, so callers
+should pass a freshly decoded copy and discard it if an operation fails.
+"""
+from typing import Any, Iterable
+
+
+class JsonPatchError(ValueError):
+    """Raised when a patch operation cannot be applied to the document."""
+
+
+def parse_pointer(pointer: str) -> list[str]:
+    if pointer == "":
+        return []
+    if not pointer.startswith("/"):
+        raise JsonPatchError(f"Invalid JSON pointer: {pointer!r}")
+    return [token.replace("~1", "/").replace("~0", "~") for token in pointer[1:].split("/")]
+
+
+def _array_index(container: list, token: str, allow_end: bool) -> int:
+    if allow_end and token == "-":
+        return len(container)
+    if not token.isdigit() or (len(token) > 1 and token.startswith("0")):
+        raise JsonPatchError(f"Invalid array index: {token!r}")
+    index = int(token)
+    upper = len(container) if allow_end else len(container) - 1
+    if index > upper:
+        raise JsonPatchError(f"Array index out of range: {index}")
+    return index
+
+
+def _child(target: Any, token: str) -> Any:
+    if isinstance(target, dict):
+        if token not in target:
+            raise JsonPatchError(f"Path member not found: {token!r}")
+        return target[token]
+    if isinstance(target, list):
+        return target[_array_index(target, token, allow_end=False)]
+    raise JsonPatchError(f"Cannot traverse into a scalar value at {token!r}")
+
+
+def _parent(document: Any, tokens: list[str]) -> Any:
+    target = document
+    for token in tokens[:-1]:
+        target = _child(target, token)
+    return target
+
+
+def _get(document: Any, tokens: list[str]) -> Any:
+    target = document
+    for token in tokens:
+        target = _child(target, token)
+    return target
+
+
+def _add(document: Any, tokens: list[str], value: Any) -> Any:
+    if not tokens:
+        return value
+    parent, key = _parent(document, tokens), tokens[-1]
+    if isinstance(parent, dict):
+        parent[key] = value
+    elif isinstance(parent, list):
+        parent.insert(_array_index(parent, key, allow_end=True), value)
+    else:
+        raise JsonPatchError(f"Cannot add a member to a scalar value at {key!r}")
+    return document
+
+
+def _remove(document: Any, tokens: list[str]) -> Any:
+    if not tokens:
+        raise JsonPatchError("Cannot remove the document root")
+    parent, key = _parent(document, tokens), tokens[-1]
+    if isinstance(parent, dict):
+        if key not in parent:
+            raise JsonPatchError(f"Path member not found: {key!r}")
+        return parent.pop(key)
+    if isinstance(parent, list):
+        return parent.pop(_array_index(parent, key, allow_end=False))
+    raise JsonPatchError(f"Cannot remove a member from a scalar value at {key!r}")
+
+
+def _replace(document: Any, tokens: list[str], value: Any) -> Any:
+    if not tokens:
+        return value
+    parent, key = _parent(document, tokens), tokens[-1]
+    if isinstance(parent, dict):
+        if key not in parent:
+            raise JsonPatchError(f"Path member not found: {key!r}")
+        parent[key] = value
+    elif isinstance(parent, list):
+        parent[_array_index(parent, key, allow_end=False)] = value
+    else:
+        raise JsonPatchError(f"Cannot replace a member of a scalar value at {key!r}")
+    return document
+
+
+def _deep_copy(value: Any) -> Any:
+    # JSON documents only contain dicts, lists and scalars
+    if isinstance(value, dict):
+        return {key: _deep_copy(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_deep_copy(item) for item in value]
+    return value
+
+
+def apply_patch(document: Any, operations: Iterable[dict]) -> Any:
+    """Apply JSON Patch operations to document and return the patched document."""
+    for operation in operations:
+        op = operation.get("op")
+        if "path" not in operation:
+            raise JsonPatchError(f"Operation {op!r} is missing 'path'")
+        tokens = parse_pointer(operation["path"])
+
+        if op in ("add", "replace", "test") and "value" not in operation:
+            raise JsonPatchError(f"Operation {op!r} is missing 'value'")
+        if op in ("move", "copy") and "from" not in operation:
+            raise JsonPatchError(f"Operation {op!r} is missing 'from'")
+
+        if op == "add":
+            document = _add(document, tokens, operation["value"])
+        elif op == "remove":
+            _remove(document, tokens)
+        elif op == "replace":
+            document = _replace(document, tokens, operation["value"])
+        elif op == "move":
+            source = parse_pointer(operation["from"])
+            if tokens[:len(source)] == source and len(tokens) > len(source):
+                raise JsonPatchError("Cannot move a value into one of its own children")
+            if tokens != source:
+                document = _add(document, tokens, _remove(document, source))
+        elif op == "copy":
+            source = _get(document, parse_pointer(operation["from"]))
+            document = _add(document, tokens, _deep_copy(source))
+        elif op == "test":
+            if _get(document, tokens) != operation["value"]:
+                raise JsonPatchError(f"Test failed at {operation['path']!r}")
+        else:
+            raise JsonPatchError(f"Unsupported operation: {op!r}")
+    return document
+
+
+def _escape_token(token) -> str:
+    return str(token).replace("~", "~0").replace("/", "~1")
+
+
+def _element_ids(items: list):
+    ids = [item.get("id") if isinstance(item, dict) else None for item in items]
+    if None in ids or len(set(map(str, ids))) != len(ids):
+        return None
+    return [str(item_id) for item_id in ids]
+
+
+def _diff_by_id(path: str, before: list, after: list):
+    """Diff arrays of objects with unique ids when items were only removed, edited or appended."""
+    before_ids, after_ids = _element_ids(before), _element_ids(after)
+    if before_ids is None or after_ids is None:
+        return None
+    remaining = set(after_ids)
+    kept = [item_id for item_id in before_ids if item_id in remaining]
+    if after_ids[:len(kept)] != kept:
+        return None  # reordered or inserted in the middle
+
+    # Remove from the end so earlier indices stay valid
+    operations = [
+        {"op": "remove", "path": f"{path}/{index}"}
+        for index in range(len(before) - 1, -1, -1)
+        if before_ids[index] not in remaining
+    ]
+    previous = {item_id: item for item_id, item in zip(before_ids, before)}
+    for index, item in enumerate(after[:len(kept)]):
+        if previous[after_ids[index]] != item:
+            operations.append({"op": "replace", "path": f"{path}/{index}", "value": item})
+    for item in after[len(kept):]:
+        operations.append({"op": "add", "path": f"{path}/-", "value": item})
+    return operations
+
+
+def _diff_array(path: str, before: list, after: list) -> list:
+    # Diagram nodes and edges carry ids: deleting one should not shift the rest
+    operations = _diff_by_id(path, before, after)
+    if operations is not None and len(operations) <= max(len(after) / 2, 1):
+        return operations
+
+    operations = []
+    common = min(len(before), len(after))
+    for index in range(common):
+        if before[index] != after[index]:
+            operations.append({"op": "replace", "path": f"{path}/{index}", "value": after[index]})
+    for index in range(common, len(after)):
+        operations.append({"op": "add", "path": f"{path}/-", "value": after[index]})
+    # Remove from the end so earlier indices stay valid
+    for index in range(len(before) - 1, common - 1, -1):
+        operations.append({"op": "remove", "path": f"{path}/{index}"})
+
+    # Shifting an array touches every element; replacing it outright is smaller then
+    if len(operations) > max(len(after) / 2, 1):
+        return [{"op": "replace", "path": path, "value": after}]
+    return operations
+
+
+def create_patch(before: dict, after: dict) -> list:
+    """Build operations that turn document before into after.
+
+    Top-level arrays are compared element by element, so editing one node of
+    a diagram yields one operation instead of a copy of every node.
+    """
+    operations = []
+    for key, value in after.items():
+        path = f"/{_escape_token(key)}"
+        if key not in before:
+            operations.append({"op": "add", "path": path, "value": value})
+        elif isinstance(before[key], list) and isinstance(value, list):
+            operations.extend(_diff_array(path, before[key], value))
+        elif before[key] != value:
+            operations.append({"op": "replace", "path": path, "value": value})
+    for key in before:
+        if key not in after:
+            operations.append({"op": "remove", "path": f"/{_escape_token(key)}"})
+    return operations
@@ -0,0 +1,186 @@
+"""
+Diagram lock service with lease expiry.
+
+A lock is a lease that expires unless the holder renews it with a
+heartbeat, so locks left behind by crashed tabs disappear on their own.
+Leases live in a pluggable store: the in-memory store answers every check
+from a dict (single worker), the database store keeps one row per diagram
+in ``diagram_locks`` so several workers share the same view. A background
+sweeper drops expired leases and announces them on the realtime hub.
+"""
+import asyncio
+import logging
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Optional
+from core.autosave import autosave_buffer
+from core.config import settings
+from core.database import AsyncSessionLocal
+from core.realtime import hub
+import crud
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class LockLease:
+    diagram_id: int
+    user_id: int
+    user: Any
+    locked_at: datetime
+    expires_at: datetime
+    is_active: bool = True
+
+class MemoryLockStore:
+    """Leases in a process-local dict; every operation is O(1)."""
+
+    def __init__(self):
+        self._leases: dict[int, LockLease] = {}
+        self._lock = threading.Lock()
+
+    def _current(self, diagram_id: int, now: datetime) -> Optional[LockLease]:
+        lease = self._leases.get(diagram_id)
+        if lease is not None and lease.expires_at <= now:
+            return None
+        return lease
+
+    async def get(self, diagram_id: int):
+        with self._lock:
+            return self._current(diagram_id, datetime.utcnow())
+
+    async def acquire(self, diagram_id: int, user, ttl_seconds: int):
+        now = datetime.utcnow()
+        with self._lock:
+            holder = self._current(diagram_id, now)
+            if holder is not None and holder.user_id != user.id:
+                return holder, False
+            lease = LockLease(
+                diagram_id=diagram_id, user_id=user.id, user=user,
+                locked_at=now, expires_at=now + timedelta(seconds=ttl_seconds),
+            )
+            self._leases[diagram_id] = lease
+            return lease, True
+
+    async def renew(self, diagram_id: int, user_id: int, ttl_seconds: int):
+        now = datetime.utcnow()
+        with self._lock:
+            lease = self._current(diagram_id, now)
+            if lease is None or lease.user_id != user_id:
+                return None
+            lease.expires_at = now + timedelta(seconds=ttl_seconds)
+            return lease.expires_at
+
+    async def release(self, diagram_id: int, user_id: int):
+        with self._lock:
+            lease = self._leases.get(diagram_id)
+            if lease is None or lease.user_id != user_id:
+                return False
+            del self._leases[diagram_id]
+            return True
+
+    async def release_all(self, user_id: int):
+        with self._lock:
+            for diagram_id in [d for d, lease in self._leases.items() if lease.user_id == user_id]:
+                del self._leases[diagram_id]
+
+    async def sweep(self):
+        now = datetime.utcnow()
+        with self._lock:
+            expired = [lease for lease in self._leases.values() if lease.expires_at <= now]
+            for lease in expired:
+                del self._leases[lease.diagram_id]
+        return [(lease.diagram_id, lease.user_id) for lease in expired]
+
+class DatabaseLockStore:
+    """Leases in the diagram_locks table, shared by every worker."""
+
+    async def get(self, diagram_id: int):
+        async with AsyncSessionLocal() as db:
+            return await crud.aio.get_diagram_lease(db, diagram_id=diagram_id)
+
+    async def acquire(self, diagram_id: int, user, ttl_seconds: int):
+        async with AsyncSessionLocal() as db:
+            return await crud.aio.acquire_diagram_lease(
+                db, diagram_id=diagram_id, user_id=user.id, ttl_seconds=ttl_seconds
+            )
+
+    async def renew(self, diagram_id: int, user_id: int, ttl_seconds: int):
+        async with AsyncSessionLocal() as db:
+            return await crud.aio.renew_diagram_lease(
+                db, diagram_id=diagram_id, user_id=user_id, ttl_seconds=ttl_seconds
+            )
+
+    async def release(self, diagram_id: int, user_id: int):
+        async with AsyncSessionLocal() as db:
+            return await crud.aio.release_diagram_lease(db, diagram_id=diagram_id, user_id=user_id)
+
+    async def release_all(self, user_id: int):
+        async with AsyncSessionLocal() as db:
+            await crud.aio.release_all_user_leases(db, user_id=user_id)
+
+    async def sweep(self):
+        async with AsyncSessionLocal() as db:
+            return await crud.aio.purge_expired_diagram_leases(db)
+
+class LockService:
+    def __init__(self, store, ttl_seconds: int, sweep_interval_seconds: int):
+        self.store = store
+        self.ttl_seconds = ttl_seconds
+        self.sweep_interval_seconds = sweep_interval_seconds
+        self._sweeper: Optional[asyncio.Task] = None
+
+    async def get(self, diagram_id: int):
+        return await self.store.get(diagram_id)
+
+    async def acquire(self, diagram_id: int, user):
+        """Take the lock or renew our own; returns (lease, acquired)."""
+        return await self.store.acquire(diagram_id, user, self.ttl_seconds)
+
+    async def renew(self, diagram_id: int, user_id: int):
+        """Heartbeat: extend our lease; returns the new expiry or None if we lost it."""
+        return await self.store.renew(diagram_id, user_id, self.ttl_seconds)
+
+    async def release(self, diagram_id: int, user_id: int):
+        return await self.store.release(diagram_id, user_id)
+
+    async def release_all(self, user_id: int):
+        await self.store.release_all(user_id)
+
+    async def sweep(self):
+        """Drop expired leases, write what their holders left buffered and tell viewers the diagrams are free."""
+        expired = await self.store.sweep()
+        for diagram_id, user_id in expired:
+            await autosave_buffer.flush(diagram_id)
+            await hub.publish(diagram_id, {"type": "lock.released", "user_id": user_id, "reason": "expired"})
+        return len(expired)
+
+    async def _sweep_forever(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval_seconds)
+            try:
+                await self.sweep()
+            except Exception:
+                logger.exception("Diagram lock sweep failed")
+
+    async def start(self):
+        # Rows written before locks had an expiry would otherwise never go away
+        if isinstance(self.store, DatabaseLockStore):
+            async with AsyncSessionLocal() as db:
+                await crud.aio.purge_expired_diagram_leases(db)
+        self._sweeper = asyncio.create_task(self._sweep_forever())
+
+    async def stop(self):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            self._sweeper = None
+
+def _create_store():
+    if settings.lock_store == "database":
+        return DatabaseLockStore()
+    return MemoryLockStore()
+
+lock_service = LockService(
+    _create_store(),
+    ttl_seconds=settings.lock_ttl_seconds,
+    sweep_interval_seconds=settings.lock_sweep_interval_seconds,
+)
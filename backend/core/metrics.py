@@ -0,0 +1,271 @@
+"""
+Request and database instrumentation exposed in the Prometheus text format.
+
+``MetricsMiddleware`` times every HTTP request per route template (so
+``/diagrams/{diagram_id}`` is one series, not one per id), tracks requests in
+flight and counts request and response bytes. SQLAlchemy cursor events count
+the statements and the database time of the request they run in, found
+through a context variable that follows the request into crud code and
+streaming responses. A request that runs more statements than
+``metrics_query_budget`` or repeats one statement ``metrics_repeated_query_threshold``
+times (the N+1 pattern) is logged as a warning and counted.
+
+The registry is per process; with several workers each one exposes its own.
+"""
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Iterable, Optional
+from sqlalchemy import event
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55)
+UNMATCHED_ROUTE = "<unmatched>"
+INF_LABEL = 'le="+Inf"'
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, labels: tuple = (), amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_labels(self.labels, key)} {value:g}" for key, value in items]
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, labels: tuple = (), amount: float = 1) -> None:
+        self.inc(labels, -amount)
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: tuple = (), buckets: Iterable[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, labels: tuple, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                # Per-bucket counts (not cumulative) plus an overflow slot, sum, count
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = sorted(
+                ((key, ([*counts], total, count)) for key, (counts, total, count) in self._values.items()),
+                key=lambda item: item[0],
+            )
+        lines = self.header()
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket in zip(self.buckets, counts):
+                cumulative += bucket
+                bound_label = f'le="{bound:g}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labels, key, bound_label)} {cumulative}")
+            lines.append(f"{self.name}_bucket{_labels(self.labels, key, INF_LABEL)} {count}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, key)} {total:g}")
+            lines.append(f"{self.name}_count{_labels(self.labels, key)} {count}")
+        return lines
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+registry = MetricsRegistry()
+ROUTE_LABELS = ("method", "route")
+
+http_requests = registry.register(Counter(
+    "idms_http_requests_total", "HTTP requests by route and status code.", ("method", "route", "status")
+))
+http_duration = registry.register(Histogram(
+    "idms_http_request_duration_seconds", "HTTP request latency, until the last body byte is sent.", ROUTE_LABELS
+))
+http_in_progress = registry.register(Gauge(
+    "idms_http_requests_in_progress", "HTTP requests currently being served.", ROUTE_LABELS
+))
+http_request_bytes = registry.register(Counter(
+    "idms_http_request_bytes_total", "Request body bytes received.", ROUTE_LABELS
+))
+http_response_bytes = registry.register(Counter(
+    "idms_http_response_bytes_total", "Response body bytes sent (after compression).", ROUTE_LABELS
+))
+db_queries = registry.register(Counter(
+    "idms_db_queries_total", "SQL statements executed while serving requests.", ROUTE_LABELS
+))
+db_queries_per_request = registry.register(Histogram(
+    "idms_db_queries_per_request", "SQL statements executed by one request.", ROUTE_LABELS, QUERY_COUNT_BUCKETS
+))
+db_time = registry.register(Counter(
+    "idms_db_time_seconds_total", "Time spent executing SQL statements while serving requests.", ROUTE_LABELS
+))
+db_budget_exceeded = registry.register(Counter(
+    "idms_db_query_budget_exceeded_total", "Requests that ran more statements than the query budget.", ROUTE_LABELS
+))
+db_repeated_queries = registry.register(Counter(
+    "idms_db_repeated_queries_total", "Requests that repeated one statement past the threshold (N+1).", ROUTE_LABELS
+))
+db_background_queries = registry.register(Counter(
+    "idms_db_background_queries_total", "SQL statements executed outside any request (background services)."
+))
+
+class RequestQueries:
+    """SQL accounting of one request."""
+    __slots__ = ("count", "seconds", "statements")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = {}
+
+    def record(self, statement: str, seconds: float) -> None:
+        self.count += 1
+        self.seconds += seconds
+        self.statements[statement] = self.statements.get(statement, 0) + 1
+
+    def most_repeated(self) -> tuple:
+        if not self.statements:
+            return None, 0
+        statement = max(self.statements, key=self.statements.get)
+        return statement, self.statements[statement]
+
+_request_queries: ContextVar[Optional[RequestQueries]] = ContextVar("request_queries", default=None)
+
+def current_request_queries() -> Optional[RequestQueries]:
+    return _request_queries.get()
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metrics_query_start", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["metrics_query_start"].pop()
+    queries = _request_queries.get()
+    if queries is None:
+        db_background_queries.inc()
+        return
+    queries.record(statement, time.perf_counter() - started)
+
+def instrument_engines(*engines) -> None:
+    """Attach the query hooks to each (sync) engine once."""
+    for engine in {id(engine): engine for engine in engines}.values():
+        if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+            event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+            event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+def _route_template(scope: Scope) -> str:
+    """Path template of the route serving this request, so ids do not create series."""
+    router = getattr(scope.get("app"), "router", None)
+    partial = None
+    for route in getattr(router, "routes", ()):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "path", UNMATCHED_ROUTE)
+        if match == Match.PARTIAL and partial is None:
+            partial = getattr(route, "path", None)
+    return partial or UNMATCHED_ROUTE
+
+def _check_queries(method: str, route: str, queries: RequestQueries) -> None:
+    labels = (method, route)
+    if settings.metrics_query_budget and queries.count > settings.metrics_query_budget:
+        db_budget_exceeded.inc(labels)
+        logger.warning(
+            "%s %s ran %d SQL statements (budget %d)", method, route, queries.count, settings.metrics_query_budget
+        )
+    statement, repeats = queries.most_repeated()
+    if settings.metrics_repeated_query_threshold and repeats >= settings.metrics_repeated_query_threshold:
+        db_repeated_queries.inc(labels)
+        logger.warning(
+            "%s %s repeated one SQL statement %d times (possible N+1): %s",
+            method, route, repeats, " ".join(statement.split())[:300],
+        )
+
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        method = scope["method"]
+        route = _route_template(scope)
+        labels = (method, route)
+        status = [500]
+        queries = RequestQueries()
+        token = _request_queries.set(queries)
+
+        async def receive_counted() -> Message:
+            message = await receive()
+            if message["type"] == "http.request":
+                http_request_bytes.inc(labels, len(message.get("body", b"")))
+            return message
+
+        async def send_counted(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            elif message["type"] == "http.response.body":
+                http_response_bytes.inc(labels, len(message.get("body", b"")))
+            await send(message)
+
+        http_in_progress.inc(labels)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive_counted, send_counted)
+        finally:
+            http_duration.observe(labels, time.perf_counter() - started)
+            http_in_progress.dec(labels)
+            http_requests.inc((method, route, str(status[0])))
+            _request_queries.reset(token)
+            if queries.count:
+                db_queries.inc(labels, queries.count)
+                db_time.inc(labels, queries.seconds)
+            db_queries_per_request.observe(labels, queries.count)
+            _check_queries(method, route, queries)
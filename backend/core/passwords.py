@@ -0,0 +1,95 @@
+"""Argon2 password hashing off the event loop.
+
+argon2 is deliberately CPU- and memory-hard, so hashing and verification run in a
+small dedicated thread pool (argon2-cffi releases the GIL) and at most
+``password_hash_max_pending`` operations may be queued at once; beyond that callers
+get ``PasswordHasherBusy`` instead of an ever-growing backlog. Verification reports a
+replacement hash when the stored one was made with different parameters, so hashes
+are upgraded transparently on the next successful login.
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+from passlib.context import CryptContext
+from core.config import settings
+
+pwd_context = CryptContext(
+    schemes=["argon2"],
+    deprecated="auto",
+    argon2__type=settings.password_hash_type,
+    argon2__rounds=settings.password_hash_time_cost,
+    argon2__memory_cost=settings.password_hash_memory_cost,
+    argon2__parallelism=settings.password_hash_parallelism,
+)
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when too many hash/verify operations are already queued."""
+
+
+class PasswordHasher:
+    """Runs pwd_context in a size-capped pool with a bound on queued operations."""
+
+    def __init__(self, context: CryptContext, workers: int, max_pending: int):
+        self.context = context
+        self.workers = max(1, workers)
+        self.max_pending = max(1, max_pending)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending = 0
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="password-hash"
+                )
+            return self._executor
+
+    async def _run(self, func, *args):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                raise PasswordHasherBusy()
+            self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), func, *args)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.context.hash, str(password))
+
+    async def verify(self, password: str, hashed_password: Optional[str]) -> Tuple[bool, Optional[str]]:
+        """Return (valid, new_hash); new_hash is set when the stored hash needs upgrading."""
+        if not hashed_password:
+            # Unknown user: spend the same time as a real check so usernames can't be probed
+            await self._run(self.context.dummy_verify)
+            return False, None
+        return await self._run(self.context.verify_and_update, str(password), hashed_password)
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "pending": self._pending,
+                "max_pending": self.max_pending,
+                "rejected": self.rejected,
+            }
+
+
+password_hasher = PasswordHasher(
+    pwd_context,
+    workers=settings.password_hash_workers,
+    max_pending=settings.password_hash_max_pending,
+)
@@ -0,0 +1,92 @@
+"""
+Reusable FastAPI dependencies for project/diagram access checks.
+
+Each dependency resolves the target row and the caller's membership with a
+single query and memoizes the result on the request, so handlers and other
+dependencies asking the same question do not go back to the database. The
+``require_saved_*`` variants then write buffered autosaves (core.autosave),
+for handlers that read stored content, history or listings.
+``require_profiling_token`` guards operator endpoints (profiles, internal
+counters) with the PROFILING_TOKEN secret instead of a user login.
+"""
+from typing import Optional
+from fastapi import Depends, Header, HTTPException, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from core.auth import get_current_user
+from core.autosave import autosave_buffer
+from core.config import settings
+from core.database import get_async_db
+from core.profiling import token_matches
+from schemas.user import User
+import crud
+
+def _access_memo(request: Request) -> dict:
+    memo = getattr(request.state, "access_memo", None)
+    if memo is None:
+        memo = request.state.access_memo = {}
+    return memo
+
+def _check_access(row, is_member: bool, not_found: str):
+    if row is None:
+        raise HTTPException(status_code=404, detail=not_found)
+    if not is_member:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    return row
+
+async def require_project_access(
+    project_id: int,
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Return the project if the current user owns or is a member of it."""
+    memo = _access_memo(request)
+    key = ("project", project_id, current_user.id)
+    if key not in memo:
+        memo[key] = await crud.aio.get_project_with_access(db, project_id=project_id, user_id=current_user.id)
+    return _check_access(*memo[key], not_found="Project not found")
+
+async def require_diagram_access(
+    diagram_id: int,
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Return the diagram if the current user has access to its project."""
+    memo = _access_memo(request)
+    key = ("diagram", diagram_id, current_user.id)
+    if key not in memo:
+        memo[key] = await crud.aio.get_diagram_with_access(db, diagram_id=diagram_id, user_id=current_user.id)
+    return _check_access(*memo[key], not_found="Diagram not found")
+
+async def require_saved_project_access(
+    project_id: int,
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """require_project_access, then write pending autosaves of the project's diagrams."""
+    project = await require_project_access(project_id, request, current_user, db)
+    await autosave_buffer.flush_project(project_id)
+    return project
+
+async def require_saved_diagram_access(
+    diagram_id: int,
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """require_diagram_access, then write the diagram's pending autosave."""
+    diagram = await require_diagram_access(diagram_id, request, current_user, db)
+    if autosave_buffer.pending(diagram_id) is not None:
+        await autosave_buffer.flush(diagram_id)
+        # The flush committed in its own session; this row was loaded before it
+        await db.refresh(diagram)
+    return diagram
+
+def require_profiling_token(x_profile_token: Optional[str] = Header(default=None)):
+    """Operator endpoints expose internals; only holders of the operator token may read them."""
+    if not settings.profiling_token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not token_matches(x_profile_token):
+        raise HTTPException(status_code=403, detail="Invalid profiling token")
@@ -0,0 +1,211 @@
+"""
+On-demand profiling of single requests.
+
+A request is profiled when it carries ``X-Profile-Token`` equal to the
+operator secret ``profiling_token``, or at random with probability
+``profiling_sample_rate``; sampled profiles are kept only for requests that
+took at least ``profiling_min_duration_ms``. With pyinstrument installed the
+profile is statistical and follows the request's task across awaits, saved as
+HTML. Without it cProfile records the event-loop thread, saved as a ``.prof``
+file for pstats or snakeviz, and then also includes any other request that
+ran meanwhile.
+
+One request per process is profiled at a time. A requested profile is saved
+before the last body byte is sent, so the ``X-Profile-Id`` response header can
+be used right away with ``GET /profiles/{id}``.
+"""
+import asyncio
+import cProfile
+import hmac
+import logging
+import marshal
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Optional
+import orjson
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from core.config import settings
+
+try:
+    import pyinstrument
+except ImportError:
+    pyinstrument = None
+
+logger = logging.getLogger(__name__)
+
+PROFILE_TOKEN_HEADER = "x-profile-token"
+PROFILE_ID_PATTERN = re.compile(r"[0-9a-f]{32}")
+PROFILES_PATH = "/profiles"
+
+def token_matches(value: Optional[str]) -> bool:
+    token = settings.profiling_token
+    return bool(token and value) and hmac.compare_digest(value.encode(), token.encode())
+
+class _PyinstrumentProfile:
+    extension = "html"
+    media_type = "text/html"
+
+    def __init__(self, interval: float):
+        self._profiler = pyinstrument.Profiler(interval=interval, async_mode="enabled")
+        self._profiler.start()
+
+    def stop(self):
+        self._profiler.stop()
+
+    def render(self) -> bytes:
+        return self._profiler.output_html().encode()
+
+class _CProfile:
+    extension = "prof"
+    media_type = "application/octet-stream"
+
+    def __init__(self, interval: float):
+        self._profiler = cProfile.Profile()
+        self._profiler.enable()
+
+    def stop(self):
+        self._profiler.disable()
+
+    def render(self) -> bytes:
+        # Same bytes as Profile.dump_stats(), without a temporary file
+        self._profiler.create_stats()
+        return marshal.dumps(self._profiler.stats)
+
+class ProfileStore:
+    """Profiles as files in one directory, each with a JSON metadata file; the newest N are kept."""
+
+    def __init__(self, directory: Optional[str], max_profiles: int):
+        self.directory = directory or os.path.join(tempfile.gettempdir(), "idms-profiles")
+        self.max_profiles = max_profiles
+
+    def _path(self, profile_id: str, extension: str) -> str:
+        return os.path.join(self.directory, f"{profile_id}.{extension}")
+
+    def save(self, profile_id: str, data: bytes, meta: dict) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self._path(profile_id, meta["format"]), "wb") as profile_file:
+            profile_file.write(data)
+        with open(self._path(profile_id, "json"), "wb") as meta_file:
+            meta_file.write(orjson.dumps(meta))
+        self._prune()
+
+    def _prune(self):
+        metas = sorted(
+            (entry for entry in os.scandir(self.directory) if entry.name.endswith(".json")),
+            key=lambda entry: entry.stat().st_mtime, reverse=True,
+        )
+        for entry in metas[self.max_profiles:]:
+            profile_id = entry.name[:-len(".json")]
+            for name in os.listdir(self.directory):
+                if name.startswith(profile_id + "."):
+                    try:
+                        os.remove(os.path.join(self.directory, name))
+                    except FileNotFoundError:
+                        pass
+
+    def list(self) -> list[dict]:
+        if not os.path.isdir(self.directory):
+            return []
+        metas = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".json"):
+                try:
+                    with open(entry.path, "rb") as meta_file:
+                        metas.append(orjson.loads(meta_file.read()))
+                except (OSError, orjson.JSONDecodeError):
+                    continue
+        return sorted(metas, key=lambda meta: meta["created_at"], reverse=True)
+
+    def get(self, profile_id: str) -> Optional[tuple]:
+        """(path, metadata) of a stored profile, or None."""
+        if not PROFILE_ID_PATTERN.fullmatch(profile_id):
+            return None
+        try:
+            with open(self._path(profile_id, "json"), "rb") as meta_file:
+                meta = orjson.loads(meta_file.read())
+        except (OSError, orjson.JSONDecodeError):
+            return None
+        path = self._path(profile_id, meta["format"])
+        return (path, meta) if os.path.exists(path) else None
+
+class ProfilingMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        self.store = profile_store
+        self._slot = threading.Lock()
+
+    def _wanted(self, scope: Scope) -> Optional[str]:
+        """"requested", "sampled" or None for a request."""
+        if scope["path"].startswith(PROFILES_PATH):
+            return None
+        if settings.profiling_token and token_matches(Headers(scope=scope).get(PROFILE_TOKEN_HEADER)):
+            return "requested"
+        if settings.profiling_sample_rate > 0 and random.random() < settings.profiling_sample_rate:
+            return "sampled"
+        return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        trigger = self._wanted(scope) if scope["type"] == "http" else None
+        if trigger is None or not self._slot.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+        try:
+            await self._profiled(scope, receive, send, trigger)
+        finally:
+            self._slot.release()
+
+    async def _profiled(self, scope: Scope, receive: Receive, send: Send, trigger: str) -> None:
+        profile_id = uuid.uuid4().hex
+        factory = _PyinstrumentProfile if pyinstrument is not None else _CProfile
+        profile = factory(settings.profiling_interval_ms / 1000)
+        started = time.perf_counter()
+        state = {"status": 500, "finished": False}
+
+        async def finish():
+            if state["finished"]:
+                return
+            state["finished"] = True
+            profile.stop()
+            duration_ms = (time.perf_counter() - started) * 1000
+            if trigger == "sampled" and duration_ms < settings.profiling_min_duration_ms:
+                return
+            meta = {
+                "id": profile_id,
+                "method": scope["method"],
+                "path": scope["path"],
+                "query_string": scope.get("query_string", b"").decode("latin-1"),
+                "status": state["status"],
+                "duration_ms": round(duration_ms, 2),
+                "trigger": trigger,
+                "profiler": "pyinstrument" if factory is _PyinstrumentProfile else "cprofile",
+                "format": factory.extension,
+                "created_at": datetime.utcnow().isoformat() + "Z",
+            }
+            try:
+                data = await asyncio.to_thread(profile.render)
+                await asyncio.to_thread(self.store.save, profile_id, data, meta)
+            except Exception:
+                logger.exception("Could not save the profile of %s %s", scope["method"], scope["path"])
+
+        async def send_profiled(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+                if trigger == "requested":
+                    MutableHeaders(scope=message)["X-Profile-Id"] = profile_id
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                await finish()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_profiled)
+        finally:
+            await finish()
+
+profile_store = ProfileStore(settings.profiling_dir, settings.profiling_max_profiles)
@@ -0,0 +1,85 @@
+"""
+Project archives: one NDJSON record per line, streamed in both directions.
+
+    {"type": "header", "format": "idms-project", "version": 1, "exported_at": ...}
+    {"type": "project", "name": ..., "description": ..., "owner": ...}
+    {"type": "member", "username": ..., "email": ...}          (any number)
+    {"type": "diagram", "name": ..., "diagram_type": ..., "content": ...}  (any number)
+    {"type": "end", "members": <count>, "diagrams": <count>}
+
+Diagram ``content`` is the stored JSON text. The closing ``end`` record lets an
+import tell a complete archive from a truncated one. Archives may be sent
+gzip-compressed (``Content-Encoding: gzip``).
+"""
+import zlib
+from typing import AsyncIterator, Optional
+import orjson
+
+ARCHIVE_FORMAT = "idms-project"
+ARCHIVE_VERSION = 1
+ARCHIVE_MEDIA_TYPE = "application/x-ndjson"
+DECOMPRESS_STEP = 1024 * 1024
+
+class ArchiveError(ValueError):
+    """The uploaded archive is malformed; ``line`` is 1-based when known."""
+
+    def __init__(self, message: str, line: Optional[int] = None):
+        super().__init__(f"Line {line}: {message}" if line else message)
+        self.line = line
+
+def dump_record(record_type: str, **fields) -> bytes:
+    return orjson.dumps({"type": record_type, **fields}) + b"\n"
+
+async def _decoded(chunks: AsyncIterator[bytes], content_encoding: Optional[str]) -> AsyncIterator[bytes]:
+    encoding = (content_encoding or "identity").strip().lower()
+    if encoding in ("identity", ""):
+        async for chunk in chunks:
+            yield chunk
+        return
+    if encoding not in ("gzip", "x-gzip"):
+        raise ArchiveError(f"Unsupported Content-Encoding: {content_encoding}")
+    decompressor = zlib.decompressobj(31)
+    try:
+        async for chunk in chunks:
+            # Bounded output per step, so a small compressed chunk cannot expand all at once
+            data = decompressor.decompress(chunk, DECOMPRESS_STEP)
+            while data:
+                yield data
+                data = decompressor.decompress(decompressor.unconsumed_tail, DECOMPRESS_STEP)
+        tail = decompressor.flush()
+    except zlib.error as exc:
+        raise ArchiveError(f"Invalid gzip data: {exc}")
+    if tail:
+        yield tail
+
+async def read_records(
+    chunks: AsyncIterator[bytes], content_encoding: Optional[str], max_line_bytes: int
+) -> AsyncIterator[tuple[int, dict]]:
+    """Parse an archive stream into (line number, record) pairs, one line in memory at a time."""
+    buffer = bytearray()
+    line_number = 0
+    async for data in _decoded(chunks, content_encoding):
+        start = len(buffer)
+        buffer.extend(data)
+        newline = buffer.find(b"\n", start)
+        while newline >= 0:
+            line = bytes(buffer[:newline])
+            del buffer[:newline + 1]
+            line_number += 1
+            if line.strip():
+                yield line_number, _parse(line, line_number)
+            newline = buffer.find(b"\n")
+        if len(buffer) > max_line_bytes:
+            raise ArchiveError("Record exceeds the maximum line size", line_number + 1)
+    if bytes(buffer).strip():
+        line_number += 1
+        yield line_number, _parse(bytes(buffer), line_number)
+
+def _parse(line: bytes, line_number: int) -> dict:
+    try:
+        record = orjson.loads(line)
+    except orjson.JSONDecodeError:
+        raise ArchiveError("Invalid JSON", line_number)
+    if not isinstance(record, dict) or not isinstance(record.get("type"), str):
+        raise ArchiveError("Record must be an object with a type", line_number)
+    return record
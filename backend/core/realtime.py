@@ -0,0 +1,202 @@
+"""
+In-process pub/sub hub for real-time diagram collaboration.
+
+WebSocket connections register with the hub per diagram. Events are
+published through a pluggable backend: the in-memory backend delivers
+straight to this process, the Redis backend fans out to every worker so
+multi-process deployments see each other's events and presence.
+"""
+import asyncio
+import json
+import logging
+import uuid
+from typing import Any, Optional
+from fastapi import WebSocket
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+class Subscriber:
+    """A WebSocket connection with a bounded outbound queue drained by its own task."""
+
+    def __init__(self, websocket: WebSocket, user_id: int, username: str):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.username = username
+        self.connection_id = uuid.uuid4().hex
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=settings.realtime_queue_size)
+        self.sender: Optional[asyncio.Task] = None
+
+    def presence(self) -> dict:
+        return {"connection_id": self.connection_id, "user_id": self.user_id, "username": self.username}
+
+    def offer(self, message: str) -> bool:
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    async def run_sender(self):
+        while True:
+            message = await self.queue.get()
+            if message is None:
+                return
+            await self.websocket.send_text(message)
+
+class MemoryBackend:
+    """Single-process backend: publish delivers directly to the local hub."""
+
+    def __init__(self):
+        self._presence: dict[int, dict[str, dict]] = {}
+        self._deliver = None
+
+    async def start(self, deliver):
+        self._deliver = deliver
+
+    async def stop(self):
+        self._deliver = None
+
+    async def publish(self, diagram_id: int, message: str):
+        if self._deliver is not None:
+            await self._deliver(diagram_id, message)
+
+    async def add_presence(self, diagram_id: int, presence: dict):
+        self._presence.setdefault(diagram_id, {})[presence["connection_id"]] = presence
+
+    async def remove_presence(self, diagram_id: int, connection_id: str):
+        viewers = self._presence.get(diagram_id, {})
+        viewers.pop(connection_id, None)
+        if not viewers:
+            self._presence.pop(diagram_id, None)
+
+    async def list_presence(self, diagram_id: int) -> list[dict]:
+        return list(self._presence.get(diagram_id, {}).values())
+
+class RedisBackend:
+    """Multi-worker backend using Redis pub/sub for events and hashes for presence."""
+
+    channel_prefix = "idms:diagram:"
+
+    def __init__(self, url: str):
+        try:
+            import redis.asyncio as redis
+        except ImportError as exc:
+            raise RuntimeError("The redis package is required for REALTIME_BACKEND=redis") from exc
+        self._redis = redis.from_url(url, decode_responses=True)
+        self._pubsub = None
+        self._listener: Optional[asyncio.Task] = None
+
+    async def start(self, deliver):
+        self._pubsub = self._redis.pubsub()
+        await self._pubsub.psubscribe(f"{self.channel_prefix}*")
+        self._listener = asyncio.create_task(self._listen(deliver))
+
+    async def _listen(self, deliver):
+        async for item in self._pubsub.listen():
+            if item.get("type") != "pmessage":
+                continue
+            diagram_id = int(item["channel"][len(self.channel_prefix):])
+            await deliver(diagram_id, item["data"])
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+        if self._pubsub is not None:
+            await self._pubsub.close()
+        await self._redis.close()
+
+    async def publish(self, diagram_id: int, message: str):
+        await self._redis.publish(f"{self.channel_prefix}{diagram_id}", message)
+
+    async def add_presence(self, diagram_id: int, presence: dict):
+        await self._redis.hset(f"{self.channel_prefix}{diagram_id}:presence", presence["connection_id"], json.dumps(presence))
+
+    async def remove_presence(self, diagram_id: int, connection_id: str):
+        await self._redis.hdel(f"{self.channel_prefix}{diagram_id}:presence", connection_id)
+
+    async def list_presence(self, diagram_id: int) -> list[dict]:
+        viewers = await self._redis.hgetall(f"{self.channel_prefix}{diagram_id}:presence")
+        return [json.loads(value) for value in viewers.values()]
+
+class DiagramHub:
+    """Tracks local subscribers per diagram and fans published events out to them."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._subscribers: dict[int, set[Subscriber]] = {}
+
+    async def start(self):
+        await self.backend.start(self._deliver)
+
+    async def stop(self):
+        await self.backend.stop()
+
+    async def connect(self, diagram_id: int, subscriber: Subscriber, snapshot: dict[str, Any]):
+        await subscriber.websocket.accept()
+        subscriber.sender = asyncio.create_task(subscriber.run_sender())
+        subscriber.sender.add_done_callback(lambda task: self._sender_done(diagram_id, subscriber, task))
+        self._subscribers.setdefault(diagram_id, set()).add(subscriber)
+        await self.backend.add_presence(diagram_id, subscriber.presence())
+        viewers = await self.backend.list_presence(diagram_id)
+        subscriber.offer(json.dumps({"type": "snapshot", "diagram_id": diagram_id, "viewers": viewers, **snapshot}, default=str))
+        await self.publish(diagram_id, {"type": "presence.join", **subscriber.presence()})
+
+    async def disconnect(self, diagram_id: int, subscriber: Subscriber):
+        subscribers = self._subscribers.get(diagram_id)
+        if subscribers is not None:
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self._subscribers[diagram_id]
+        if subscriber.sender is not None:
+            subscriber.sender.cancel()
+        await self.backend.remove_presence(diagram_id, subscriber.connection_id)
+        await self.publish(diagram_id, {"type": "presence.leave", **subscriber.presence()})
+
+    async def publish(self, diagram_id: int, event: dict):
+        """Broadcast an event to everyone viewing the diagram, on every worker."""
+        message = json.dumps({"diagram_id": diagram_id, **event}, default=str)
+        try:
+            await self.backend.publish(diagram_id, message)
+        except Exception:
+            # Collaboration events are best effort; never fail the HTTP request
+            logger.exception("Failed to publish realtime event for diagram %s", diagram_id)
+
+    async def _deliver(self, diagram_id: int, message: str):
+        for subscriber in list(self._subscribers.get(diagram_id, ())):
+            if not subscriber.offer(message):
+                # A client that cannot keep up is dropped rather than slowing everyone down
+                logger.warning("Dropping slow realtime subscriber %s", subscriber.connection_id)
+                await self._close_slow(diagram_id, subscriber)
+
+    async def _close_slow(self, diagram_id: int, subscriber: Subscriber):
+        await self._close(diagram_id, subscriber, code=1013)
+
+    async def _close(self, diagram_id: int, subscriber: Subscriber, code: int):
+        self._subscribers.get(diagram_id, set()).discard(subscriber)
+        if subscriber.sender is not None:
+            subscriber.sender.cancel()
+        try:
+            await subscriber.websocket.close(code=code)
+        except Exception:
+            pass
+
+    def _sender_done(self, diagram_id: int, subscriber: Subscriber, task: asyncio.Task):
+        if task.cancelled() or task.exception() is None:
+            return
+        # Nothing else awaits the sender: log its error and close the socket,
+        # which ends the connection's receive loop and so its disconnect
+        logger.error(
+            "Realtime sender of %s failed", subscriber.connection_id, exc_info=task.exception()
+        )
+        asyncio.get_running_loop().create_task(self._close(diagram_id, subscriber, code=1011))
+
+    def viewer_count(self, diagram_id: int) -> int:
+        return len(self._subscribers.get(diagram_id, ()))
+
+def _create_backend():
+    if settings.realtime_backend == "redis":
+        return RedisBackend(settings.redis_url)
+    return MemoryBackend()
+
+hub = DiagramHub(_create_backend())
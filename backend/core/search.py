@@ -0,0 +1,74 @@
+"""
+Full-text search over diagram elements.
+
+Each DiagramElement row carries ``search_text`` (labels, headers, ERD
+attributes, edge labels; see core.diagram_elements.element_text), written by
+the same incremental sync that maintains the rows on every save. On SQLite an
+FTS5 table mirrors that column as an external-content index kept current by
+triggers, so a save re-indexes exactly the elements it inserted, changed or
+deleted. Other databases, or SQLite builds without FTS5, fall back to
+substring matching on the column.
+"""
+import re
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+
+FTS_TABLE = "diagram_elements_fts"
+
+_FTS_STATEMENTS = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "search_text, content='diagram_elements', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON diagram_elements BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, search_text) VALUES (new.id, new.search_text); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON diagram_elements BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, search_text) VALUES ('delete', old.id, old.search_text); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF search_text ON diagram_elements BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, search_text) VALUES ('delete', old.id, old.search_text); "
+    f"INSERT INTO {FTS_TABLE}(rowid, search_text) VALUES (new.id, new.search_text); END",
+)
+
+_fts_available = {}
+
+def install_search_index(engine: Engine) -> bool:
+    """Create the FTS5 index and its triggers if the database supports them.
+
+    Returns whether full-text search is available. Databases created before
+    ``search_text`` existed need ``migrate_content.py`` first.
+    """
+    if engine.dialect.name != "sqlite":
+        _fts_available[engine.url.database] = False
+        return False
+    columns = {column["name"] for column in inspect(engine).get_columns("diagram_elements")}
+    if "search_text" not in columns:
+        _fts_available[engine.url.database] = False
+        return False
+    try:
+        with engine.begin() as connection:
+            for statement in _FTS_STATEMENTS:
+                connection.execute(text(statement))
+    except Exception:
+        # SQLite compiled without FTS5
+        _fts_available[engine.url.database] = False
+        return False
+    _fts_available[engine.url.database] = True
+    return True
+
+def fts_enabled(bind) -> bool:
+    return _fts_available.get(bind.engine.url.database, False) if bind.dialect.name == "sqlite" else False
+
+def rebuild_search_index(engine: Engine) -> bool:
+    """Re-read every row into the FTS index (after a bulk backfill of search_text)."""
+    if not install_search_index(engine):
+        return False
+    with engine.begin() as connection:
+        connection.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+    return True
+
+def query_terms(query: str) -> list[str]:
+    """Words of a search query, lowercased; punctuation only separates them."""
+    return [term for term in re.findall(r"\w+", query.lower()) if term]
+
+def fts_match(terms: list[str]) -> str:
+    """FTS5 MATCH expression: every term must occur, each as a prefix."""
+    return " ".join(f'"{term}"*' for term in terms)
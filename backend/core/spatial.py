@@ -0,0 +1,114 @@
+"""
+In-process spatial index over diagram nodes for viewport queries.
+
+Node bounding boxes are bucketed into a uniform grid of square cells, and
+edges are indexed by the nodes they connect. An index is built from the
+diagram's DiagramElement rows for one revision and cached per diagram; a save
+bumps the revision, so the next query rebuilds it. Every worker keeps its own
+cache, which stays correct because lookups always compare the revision read
+from the database.
+"""
+import json
+from collections import OrderedDict, defaultdict
+from itertools import chain
+from typing import Iterable, Optional
+from core.config import settings
+from core.diagram_elements import edge_endpoints, node_size
+
+# Sizes come from user content: a node spanning more cells than this is kept
+# in one list that every query scans, instead of in each cell it covers
+MAX_CELLS_PER_NODE = 256
+
+class SpatialIndex:
+    def __init__(self, revision: int, cell_size: int):
+        self.revision = revision
+        self.cell_size = cell_size
+        self.boxes = {}  # node key -> (x1, y1, x2, y2)
+        self.cells = defaultdict(list)  # (cx, cy) -> node keys
+        self.large = []  # keys of nodes over MAX_CELLS_PER_NODE cells
+        self.edges_by_node = defaultdict(set)  # node key -> edge keys
+    
+    @classmethod
+    def build(cls, revision: int, rows: Iterable, cell_size: Optional[int] = None) -> "SpatialIndex":
+        """Index rows of (element_type, element_key, position_x, position_y, element_data)."""
+        index = cls(revision, cell_size or settings.spatial_index_cell_size)
+        for element_type, key, x, y, data in rows:
+            element = json.loads(data)
+            if element_type == "node":
+                if x is None or y is None:
+                    continue
+                width, height = node_size(element)
+                index._add_node(key, (x, y, x + width, y + height))
+            elif element_type == "edge":
+                for end in edge_endpoints(element):
+                    if end is not None:
+                        index.edges_by_node[end].add(key)
+        return index
+    
+    def _cell_range(self, x1: int, y1: int, x2: int, y2: int):
+        size = self.cell_size
+        return range(x1 // size, x2 // size + 1), range(y1 // size, y2 // size + 1)
+    
+    def _cell_count(self, x1: int, y1: int, x2: int, y2: int) -> int:
+        size = self.cell_size
+        return (x2 // size - x1 // size + 1) * (y2 // size - y1 // size + 1)
+    
+    def _add_node(self, key: str, box: tuple):
+        self.boxes[key] = box
+        if self._cell_count(*box) > MAX_CELLS_PER_NODE:
+            self.large.append(key)
+            return
+        columns, rows = self._cell_range(*box)
+        for cx in columns:
+            for cy in rows:
+                self.cells[(cx, cy)].append(key)
+    
+    def query(self, x1: int, y1: int, x2: int, y2: int) -> tuple[list, list]:
+        """Keys of the nodes intersecting the box and of the edges incident to them."""
+        if self._cell_count(x1, y1, x2, y2) > len(self.cells):
+            # Zoomed far out: scanning the occupied cells is cheaper
+            candidates = (key for keys in self.cells.values() for key in keys)
+        else:
+            columns, rows = self._cell_range(x1, y1, x2, y2)
+            candidates = (key for cx in columns for cy in rows for key in self.cells.get((cx, cy), ()))
+        candidates = chain(self.large, candidates)
+        
+        nodes = []
+        seen = set()
+        for key in candidates:
+            if key in seen:
+                continue
+            seen.add(key)
+            bx1, by1, bx2, by2 = self.boxes[key]
+            if bx1 <= x2 and bx2 >= x1 and by1 <= y2 and by2 >= y1:
+                nodes.append(key)
+        
+        edges = set()
+        for key in nodes:
+            edges.update(self.edges_by_node.get(key, ()))
+        return nodes, sorted(edges)
+
+class SpatialIndexCache:
+    """LRU of spatial indexes keyed by diagram id, valid for one revision each."""
+    
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: "OrderedDict[int, SpatialIndex]" = OrderedDict()
+    
+    def get(self, diagram_id: int, revision: int) -> Optional[SpatialIndex]:
+        index = self._entries.get(diagram_id)
+        if index is None or index.revision != revision:
+            return None
+        self._entries.move_to_end(diagram_id)
+        return index
+    
+    def put(self, diagram_id: int, index: SpatialIndex) -> None:
+        self._entries[diagram_id] = index
+        self._entries.move_to_end(diagram_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+    
+    def invalidate(self, diagram_id: int) -> None:
+        self._entries.pop(diagram_id, None)
+
+spatial_indexes = SpatialIndexCache(settings.spatial_index_cache_size)
@@ -0,0 +1,113 @@
+"""Sliding-window login throttling per username and per client address."""
+from collections import OrderedDict, deque
+from typing import Deque, Optional
+import math
+import threading
+import time
+from core.config import settings
+
+
+class SlidingWindowLimiter:
+    """Counts events per key over the last ``window_seconds``; bounded LRU of keys."""
+
+    def __init__(self, limit: int, window_seconds: float, max_keys: int):
+        self.limit = limit
+        self.window_seconds = window_seconds
+        self.max_keys = max_keys
+        self._events: "OrderedDict[str, Deque[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _prune(self, key: str, now: float) -> Optional[Deque[float]]:
+        events = self._events.get(key)
+        if events is None:
+            return None
+        cutoff = now - self.window_seconds
+        while events and events[0] <= cutoff:
+            events.popleft()
+        if not events:
+            del self._events[key]
+            return None
+        return events
+
+    def retry_after(self, key: str) -> float:
+        """Seconds until the key is below its limit again; 0 if it is not limited."""
+        if self.limit <= 0:
+            return 0.0
+        now = time.monotonic()
+        with self._lock:
+            events = self._prune(key, now)
+            if events is None or len(events) < self.limit:
+                return 0.0
+            return events[len(events) - self.limit] + self.window_seconds - now
+
+    def hit(self, key: str):
+        if self.limit <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            events = self._prune(key, now)
+            if events is None:
+                events = self._events[key] = deque()
+            events.append(now)
+            # Never keep more timestamps than needed to decide the limit
+            while len(events) > self.limit:
+                events.popleft()
+            self._events.move_to_end(key)
+            while len(self._events) > self.max_keys:
+                self._events.popitem(last=False)
+
+    def reset(self, key: str):
+        with self._lock:
+            self._events.pop(key, None)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._events)
+
+
+class LoginThrottle:
+    """Failed logins are limited per username, all login attempts per client address."""
+
+    def __init__(self, user_failures: int, address_attempts: int, window_seconds: float, max_keys: int):
+        self.users = SlidingWindowLimiter(user_failures, window_seconds, max_keys)
+        self.addresses = SlidingWindowLimiter(address_attempts, window_seconds, max_keys)
+        self.throttled = 0
+
+    @staticmethod
+    def _user_key(username: str) -> str:
+        return username.strip().lower()
+
+    def check(self, username: str, address: Optional[str]) -> int:
+        """Return the Retry-After in whole seconds if the attempt must be refused, else 0."""
+        wait = self.users.retry_after(self._user_key(username))
+        if address:
+            wait = max(wait, self.addresses.retry_after(address))
+        if wait > 0:
+            self.throttled += 1
+            return max(1, math.ceil(wait))
+        return 0
+
+    def attempt(self, address: Optional[str]):
+        if address:
+            self.addresses.hit(address)
+
+    def failure(self, username: str):
+        self.users.hit(self._user_key(username))
+
+    def success(self, username: str):
+        self.users.reset(self._user_key(username))
+
+    def stats(self) -> dict:
+        return {
+            "tracked_users": len(self.users),
+            "tracked_addresses": len(self.addresses),
+            "throttled": self.throttled,
+        }
+
+
+login_throttle = LoginThrottle(
+    user_failures=settings.login_max_failures_per_user,
+    address_attempts=settings.login_max_attempts_per_address,
+    window_seconds=settings.login_throttle_window_seconds,
+    max_keys=settings.login_throttle_max_keys,
+)
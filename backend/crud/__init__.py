@@ -1,27 +1,58 @@
 from crud.user import (
     get_user, get_user_by_username, get_user_by_email, create_user
 )
+from crud.token import (
+    create_refresh_token, get_refresh_token, rotate_refresh_token, revoke_refresh_token,
+    revoke_refresh_token_family, revoke_user_tokens
+)
 from crud.project import (
     get_project, get_user_projects, create_project, update_project, delete_project,
     is_project_member, add_project_member, remove_project_member,
-    get_user_accessible_projects
+    get_user_accessible_projects, get_user_accessible_projects_page, get_project_with_access
 )
 from crud.diagram import (
-    get_diagram, get_project_diagrams, create_diagram, update_diagram, delete_diagram,
-    get_diagram_elements, create_diagram_element, update_diagram_element, delete_diagram_element,
-    get_active_diagram_lock, create_or_update_diagram_lock, unlock_diagram, unlock_all_user_locks
+    get_diagram, get_diagram_with_access, load_diagram_content, get_project_diagrams,
+    get_project_diagram_summaries, create_diagram, update_diagram, delete_diagram, patch_diagram_content,
+    apply_diagram_element_batch, rebuild_diagram_elements,
+    get_diagram_elements, get_diagram_elements_by_keys, build_diagram_spatial_index,
+    create_diagram_element, update_diagram_element, delete_diagram_element,
+    get_diagram_lease, acquire_diagram_lease, renew_diagram_lease, release_diagram_lease,
+    release_all_user_leases, purge_expired_diagram_leases
+)
+from crud.revision import (
+    record_diagram_revision, list_diagram_revisions, get_diagram_revision_content,
+    get_diagrams_with_revisions_before, compact_diagram_revisions
+)
+from crud.search import search_project_elements
+from crud.archive import (
+    get_project_archive_members, get_project_archive_diagrams,
+    create_imported_project, add_imported_members, import_diagram_batch
 )
 from crud.invite import (
     create_project_invite, get_invite_by_token, get_active_project_invites, deactivate_invite
 )
+from crud import aio
 
 __all__ = [
     "get_user", "get_user_by_username", "get_user_by_email", "create_user",
+    "create_refresh_token", "get_refresh_token", "rotate_refresh_token", "revoke_refresh_token",
+    "revoke_refresh_token_family", "revoke_user_tokens",
     "get_project", "get_user_projects", "create_project", "update_project", "delete_project",
     "is_project_member", "add_project_member", "remove_project_member", "get_user_accessible_projects",
-    "get_diagram", "get_project_diagrams", "create_diagram", "update_diagram", "delete_diagram",
-    "get_diagram_elements", "create_diagram_element", "update_diagram_element", "delete_diagram_element",
-    "get_active_diagram_lock", "create_or_update_diagram_lock", "unlock_diagram", "unlock_all_user_locks",
+    "get_user_accessible_projects_page", "get_project_with_access",
+    "get_diagram", "get_diagram_with_access", "load_diagram_content", "get_project_diagrams",
+    "get_project_diagram_summaries", "create_diagram", "update_diagram", "delete_diagram", "patch_diagram_content",
+    "apply_diagram_element_batch", "rebuild_diagram_elements",
+    "get_diagram_elements", "get_diagram_elements_by_keys", "build_diagram_spatial_index",
+    "create_diagram_element", "update_diagram_element", "delete_diagram_element",
+    "get_diagram_lease", "acquire_diagram_lease", "renew_diagram_lease", "release_diagram_lease",
+    "release_all_user_leases", "purge_expired_diagram_leases",
+    "record_diagram_revision", "list_diagram_revisions", "get_diagram_revision_content",
+    "get_diagrams_with_revisions_before", "compact_diagram_revisions",
+    "search_project_elements",
+    "get_project_archive_members", "get_project_archive_diagrams",
+    "create_imported_project", "add_imported_members", "import_diagram_batch",
     "create_project_invite", "get_invite_by_token", "get_active_project_invites", "deactivate_invite",
+    "aio",
 ]
 
@@ -0,0 +1,92 @@
+"""
+Async facade over the crud package for use with AsyncSession.
+
+Every function takes an AsyncSession and runs the matching synchronous crud
+function through AsyncSession.run_sync, so queries go through the async
+driver without blocking the event loop while the query code itself stays in
+one place and remains usable with a plain Session from scripts.
+"""
+from functools import wraps
+from sqlalchemy.ext.asyncio import AsyncSession
+from crud import user, token, project, diagram, revision, search, archive, invite
+
+def _run_sync(fn):
+    @wraps(fn)
+    async def wrapper(db: AsyncSession, *args, **kwargs):
+        return await db.run_sync(lambda session: fn(session, *args, **kwargs))
+    return wrapper
+
+# User
+get_user = _run_sync(user.get_user)
+get_user_by_username = _run_sync(user.get_user_by_username)
+get_user_by_email = _run_sync(user.get_user_by_email)
+create_user = _run_sync(user.create_user)
+
+# Refresh tokens
+create_refresh_token = _run_sync(token.create_refresh_token)
+get_refresh_token = _run_sync(token.get_refresh_token)
+rotate_refresh_token = _run_sync(token.rotate_refresh_token)
+revoke_refresh_token = _run_sync(token.revoke_refresh_token)
+revoke_refresh_token_family = _run_sync(token.revoke_refresh_token_family)
+revoke_user_tokens = _run_sync(token.revoke_user_tokens)
+
+# Project
+get_project = _run_sync(project.get_project)
+get_user_projects = _run_sync(project.get_user_projects)
+create_project = _run_sync(project.create_project)
+update_project = _run_sync(project.update_project)
+delete_project = _run_sync(project.delete_project)
+is_project_member = _run_sync(project.is_project_member)
+add_project_member = _run_sync(project.add_project_member)
+remove_project_member = _run_sync(project.remove_project_member)
+get_user_accessible_projects = _run_sync(project.get_user_accessible_projects)
+get_user_accessible_projects_page = _run_sync(project.get_user_accessible_projects_page)
+get_project_with_access = _run_sync(project.get_project_with_access)
+
+# Diagram
+get_diagram = _run_sync(diagram.get_diagram)
+get_diagram_with_access = _run_sync(diagram.get_diagram_with_access)
+load_diagram_content = _run_sync(diagram.load_diagram_content)
+get_project_diagrams = _run_sync(diagram.get_project_diagrams)
+get_project_diagram_summaries = _run_sync(diagram.get_project_diagram_summaries)
+create_diagram = _run_sync(diagram.create_diagram)
+update_diagram = _run_sync(diagram.update_diagram)
+delete_diagram = _run_sync(diagram.delete_diagram)
+patch_diagram_content = _run_sync(diagram.patch_diagram_content)
+apply_diagram_element_batch = _run_sync(diagram.apply_diagram_element_batch)
+rebuild_diagram_elements = _run_sync(diagram.rebuild_diagram_elements)
+get_diagram_elements = _run_sync(diagram.get_diagram_elements)
+get_diagram_elements_by_keys = _run_sync(diagram.get_diagram_elements_by_keys)
+build_diagram_spatial_index = _run_sync(diagram.build_diagram_spatial_index)
+create_diagram_element = _run_sync(diagram.create_diagram_element)
+update_diagram_element = _run_sync(diagram.update_diagram_element)
+delete_diagram_element = _run_sync(diagram.delete_diagram_element)
+get_diagram_lease = _run_sync(diagram.get_diagram_lease)
+acquire_diagram_lease = _run_sync(diagram.acquire_diagram_lease)
+renew_diagram_lease = _run_sync(diagram.renew_diagram_lease)
+release_diagram_lease = _run_sync(diagram.release_diagram_lease)
+release_all_user_leases = _run_sync(diagram.release_all_user_leases)
+purge_expired_diagram_leases = _run_sync(diagram.purge_expired_diagram_leases)
+
+# Revision history
+record_diagram_revision = _run_sync(revision.record_diagram_revision)
+list_diagram_revisions = _run_sync(revision.list_diagram_revisions)
+get_diagram_revision_content = _run_sync(revision.get_diagram_revision_content)
+get_diagrams_with_revisions_before = _run_sync(revision.get_diagrams_with_revisions_before)
+compact_diagram_revisions = _run_sync(revision.compact_diagram_revisions)
+
+# Search
+search_project_elements = _run_sync(search.search_project_elements)
+
+# Project archives
+get_project_archive_members = _run_sync(archive.get_project_archive_members)
+get_project_archive_diagrams = _run_sync(archive.get_project_archive_diagrams)
+create_imported_project = _run_sync(archive.create_imported_project)
+add_imported_members = _run_sync(archive.add_imported_members)
+import_diagram_batch = _run_sync(archive.import_diagram_batch)
+
+# Invite
+create_project_invite = _run_sync(invite.create_project_invite)
+get_invite_by_token = _run_sync(invite.get_invite_by_token)
+get_active_project_invites = _run_sync(invite.get_active_project_invites)
+deactivate_invite = _run_sync(invite.deactivate_invite)
@@ -0,0 +1,95 @@
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from typing import Optional
+from models.diagram import Diagram, DiagramElement
+from models.project import Project, project_members
+from models.user import User
+from core.content_store import encode_content, read_content
+from core.diagram_elements import element_rows
+from crud.diagram import _load_document
+from crud.revision import record_diagram_revision
+
+# Project archive export: members and diagrams read in id order, batch by batch
+def get_project_archive_members(db: Session, project_id: int):
+    return db.query(User.username, User.email).join(
+        project_members, project_members.c.user_id == User.id
+    ).filter(project_members.c.project_id == project_id).order_by(User.id).all()
+
+def get_project_archive_diagrams(db: Session, project_id: int, after_id: int = 0, limit: int = 100):
+    """Next batch of a project's diagrams as archive records, content decompressed."""
+    diagrams = db.query(Diagram).filter(
+        Diagram.project_id == project_id, Diagram.id > after_id
+    ).order_by(Diagram.id).limit(limit).all()
+    records = [
+        {
+            "id": diagram.id,
+            "name": diagram.name,
+            "diagram_type": diagram.diagram_type.value,
+            "revision": diagram.revision,
+            "content": read_content(diagram),
+            "created_at": diagram.created_at.isoformat() if diagram.created_at else None,
+            "updated_at": diagram.updated_at.isoformat() if diagram.updated_at else None,
+        }
+        for diagram in diagrams
+    ]
+    # Batches are independent; keep the session from accumulating every row
+    db.expunge_all()
+    return records
+
+# Project archive import: everything is flushed, never committed, so the
+# caller commits the whole import at once or rolls it back
+def create_imported_project(db: Session, owner_id: int, name: str, description: Optional[str] = None):
+    db_project = Project(name=name, description=description, owner_id=owner_id)
+    db.add(db_project)
+    db.flush()
+    return db_project.id
+
+def add_imported_members(db: Session, project_id: int, owner_id: int, usernames: list[str]):
+    """Add the listed users that exist here as members; returns the usernames added."""
+    if not usernames:
+        return []
+    users = db.query(User.id, User.username).filter(
+        User.username.in_(set(usernames)), User.id != owner_id
+    ).all()
+    if users:
+        db.execute(insert(project_members), [
+            {"project_id": project_id, "user_id": user.id} for user in users
+        ])
+    return [user.username for user in users]
+
+def import_diagram_batch(db: Session, project_id: int, diagrams: list[dict], user_id: Optional[int] = None):
+    """Insert a batch of archive diagrams with their element rows and an initial snapshot.
+
+    Diagrams, elements and revisions each go in as one multi-row insert.
+    """
+    db_diagrams, documents = [], []
+    for diagram in diagrams:
+        content = diagram.get("content")
+        # The import endpoint hands over the document it already validated
+        document = diagram.get("document")
+        if document is None:
+            document = _load_document(content)
+        db_diagrams.append(Diagram(
+            name=diagram["name"],
+            diagram_type=diagram["diagram_type"],
+            project_id=project_id,
+            revision=1 if content is not None else 0,
+            **encode_content(content, document=document),
+        ))
+        documents.append((content, document))
+    db.add_all(db_diagrams)
+    db.flush()
+
+    elements = []
+    for db_diagram, (content, document) in zip(db_diagrams, documents):
+        elements.extend(
+            {"diagram_id": db_diagram.id, **row} for row in element_rows(document).values()
+        )
+        if content is not None:
+            record_diagram_revision(db, db_diagram.id, 1, content, user_id=user_id)
+    if elements:
+        db.execute(insert(DiagramElement), elements)
+    db.flush()
+    count = len(db_diagrams)
+    db.expunge_all()
+    return count
@@ -1,15 +1,63 @@
-from sqlalchemy.orm import Session
-from models.diagram import Diagram, DiagramElement, DiagramLock
+from sqlalchemy import insert, inspect, or_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, defer, load_only
+from models.diagram import Diagram, DiagramElement, DiagramLock, DiagramRevision
+from models.project import Project
+from crud.project import membership_clause
 from schemas.diagram import DiagramCreate
-from datetime import datetime
+from schemas.document import validate_diagram_document
+from core.json_patch import apply_patch, create_patch
+from core.content_store import read_content, store_content
+from core.diagram_elements import apply_element_batch, element_key, element_rows, touched_elements
+from core.spatial import SpatialIndex
+from crud.revision import record_diagram_revision
+from datetime import datetime, timedelta
+import json
 
 # Diagram CRUD operations
 def get_diagram(db: Session, diagram_id: int):
     return db.query(Diagram).filter(Diagram.id == diagram_id).first()
 
+# Content columns are only read when a diagram is actually opened or saved
+CONTENT_COLUMNS = (Diagram.content, Diagram.content_blob)
+
+def get_diagram_with_access(db: Session, diagram_id: int, user_id: int):
+    """Get a diagram and whether the user may access its project, in one query.
+
+    The content is deferred: access checks and ETag revalidation only need
+    the small metadata columns. Use load_diagram_content() before reading it.
+    """
+    row = db.query(Diagram, membership_clause(user_id)).options(
+        *(defer(column) for column in CONTENT_COLUMNS)
+    ).join(
+        Project, Project.id == Diagram.project_id
+    ).filter(Diagram.id == diagram_id).first()
+    if row is None:
+        return None, False
+    return row[0], bool(row[1])
+
+def load_diagram_content(db: Session, db_diagram: Diagram):
+    """Load deferred content columns of a diagram fetched without them."""
+    unloaded = [column.key for column in CONTENT_COLUMNS if column.key in inspect(db_diagram).unloaded]
+    if unloaded:
+        db.refresh(db_diagram, attribute_names=unloaded)
+    return db_diagram
+
 def get_project_diagrams(db: Session, project_id: int):
     return db.query(Diagram).filter(Diagram.project_id == project_id).all()
 
+# Columns needed to list diagrams; content stays deferred
+DIAGRAM_SUMMARY_COLUMNS = (
+    Diagram.id, Diagram.name, Diagram.diagram_type, Diagram.project_id, Diagram.revision,
+    Diagram.content_size, Diagram.element_count, Diagram.created_at, Diagram.updated_at,
+)
+
+def get_project_diagram_summaries(db: Session, project_id: int):
+    """List a project's diagrams without loading their content."""
+    return db.query(Diagram).options(load_only(*DIAGRAM_SUMMARY_COLUMNS)).filter(
+        Diagram.project_id == project_id
+    ).all()
+
 def create_diagram(db: Session, diagram: DiagramCreate):
     db_diagram = Diagram(
         name=diagram.name,
@@ -21,25 +69,226 @@ def create_diagram(db: Session, diagram: DiagramCreate):
     db.refresh(db_diagram)
     return db_diagram
 
-def update_diagram(db: Session, diagram_id: int, diagram_update: dict):
-    db_diagram = db.query(Diagram).filter(Diagram.id == diagram_id).first()
+def _load_document(content):
+    """Parse stored content; anything that is not a JSON object counts as empty."""
+    try:
+        document = json.loads(content) if content else {}
+    except ValueError:
+        return {}
+    return document if isinstance(document, dict) else {}
+
+def _dump_document(document) -> str:
+    return json.dumps(document, ensure_ascii=False, separators=(",", ":"))
+
+def _compare_and_set_content(db: Session, diagram_id: int, revision: int, columns: dict) -> bool:
+    """Store new content only if the diagram is still at ``revision``, bumping it."""
+    updated = db.query(Diagram).filter(
+        Diagram.id == diagram_id,
+        Diagram.revision == revision
+    ).update(
+        {**columns, "revision": Diagram.revision + 1},
+        synchronize_session=False
+    )
+    return bool(updated)
+
+def _sync_elements(db: Session, diagram_id: int, document, keys=None, deleted=()):
+    """Bring the diagram's DiagramElement rows in line with its document.
+
+    With ``keys`` unset the whole projection is rebuilt; otherwise only the
+    given (element_type, element_key) elements are upserted and the
+    ``deleted`` ones removed. Runs as a few executemany statements in the
+    caller's transaction.
+    """
+    desired = element_rows(document, keys)
+    query = db.query(
+        DiagramElement.id, DiagramElement.element_type, DiagramElement.element_key,
+        DiagramElement.element_data, DiagramElement.search_text
+    ).filter(DiagramElement.diagram_id == diagram_id)
+    if keys is not None:
+        lookup = set(desired) | set(deleted)
+        if not lookup:
+            return
+        query = query.filter(DiagramElement.element_key.in_({key for _, key in lookup}))
+    existing = {(row.element_type, row.element_key): row for row in query}
+    
+    inserts, updates = [], []
+    for ref, row in desired.items():
+        current = existing.get(ref)
+        if current is None:
+            inserts.append({"diagram_id": diagram_id, **row})
+        elif current.element_data != row["element_data"] or current.search_text != row["search_text"]:
+            updates.append({"id": current.id, **row, "updated_at": datetime.utcnow()})
+    removed = [
+        row.id for ref, row in existing.items()
+        if ref not in desired and (keys is None or ref in deleted)
+    ]
+    if inserts:
+        db.execute(insert(DiagramElement), inserts)
+    if updates:
+        db.execute(update(DiagramElement), updates)
+    if removed:
+        db.query(DiagramElement).filter(DiagramElement.id.in_(removed)).delete(synchronize_session=False)
+
+def _parse_object(content):
+    """Parse content that is a JSON object, None for anything else."""
+    try:
+        document = json.loads(content) if content else None
+    except ValueError:
+        return None
+    return document if isinstance(document, dict) else None
+
+def update_diagram(db: Session, diagram_id: int, diagram_update: dict, user_id: int = None, document=None):
+    """Save a new name and/or content.
+
+    ``document`` is the content already parsed by the caller (the API validates
+    it against the diagram type), so it is not decoded again here.
+    """
+    db_diagram = db.get(Diagram, diagram_id)
     if db_diagram:
+        diagram_update = dict(diagram_update)
+        unknown = diagram_update.keys() - {"name", "content"}
+        if unknown:
+            raise ValueError(f"Diagram fields cannot be updated: {', '.join(sorted(unknown))}")
+        synced = None
+        if "content" in diagram_update:
+            content = diagram_update.pop("content")
+            if document is None:
+                document = _parse_object(content)
+            # Identical content (same hash) is skipped and keeps the revision
+            columns, changed = store_content(db_diagram, content, document)
+            if changed:
+                previous = _parse_object(read_content(db_diagram))
+                operations = (
+                    create_patch(previous, document)
+                    if previous is not None and document is not None else None
+                )
+                db_diagram.revision = (db_diagram.revision or 0) + 1
+                record_diagram_revision(db, diagram_id, db_diagram.revision, content, operations, user_id)
+                synced = document if document is not None else {}
+            diagram_update.update(columns)
         for key, value in diagram_update.items():
             setattr(db_diagram, key, value)
+        if synced is not None:
+            db.flush()
+            _sync_elements(db, diagram_id, synced)
+        if db.dirty or synced is not None:
+            db.commit()
+            db.refresh(db_diagram)
+    return db_diagram
+
+def patch_diagram_content(
+    db: Session, diagram_id: int, base_revision: int, operations: list[dict], user_id: int = None
+):
+    """Apply JSON Patch operations to the stored content of a diagram.
+
+    Returns None when the diagram is missing or no longer at base_revision.
+    Raises core.json_patch.JsonPatchError if an operation cannot be applied
+    and DiagramDocumentError if the patched content is not a valid document.
+    """
+    db_diagram = db.get(Diagram, diagram_id)
+    if db_diagram is None or db_diagram.revision != base_revision:
+        return None
+    
+    stored = read_content(db_diagram)
+    document = json.loads(stored) if stored else {}
+    document = validate_diagram_document(apply_patch(document, operations), db_diagram.diagram_type)
+    content = _dump_document(document)
+    
+    columns, changed = store_content(db_diagram, content, document)
+    if not changed:
+        return db_diagram
+    
+    # Compare-and-set on the revision so concurrent patches cannot interleave
+    if not _compare_and_set_content(db, diagram_id, base_revision, columns):
+        db.rollback()
+        return None
+    # Edits inside existing elements only touch their rows
+    _sync_elements(db, diagram_id, document, keys=touched_elements(document, operations))
+    # The patch itself is the delta, unless there was no content to patch
+    record_diagram_revision(
+        db, diagram_id, base_revision + 1, content, operations if stored else None, user_id
+    )
+    db.commit()
+    db.refresh(db_diagram)
+    return db_diagram
+
+def apply_diagram_element_batch(
+    db: Session, diagram_id: int, base_revision, upserts: list[tuple], deletes: list[tuple],
+    user_id: int = None
+):
+    """Upsert and delete diagram elements, and their copies in the content, in one transaction.
+
+    ``upserts`` are (element_type, element) pairs and ``deletes`` are
+    (element_type, element_key) pairs. With base_revision unset the batch
+    applies to whatever revision is current. Returns None when the diagram is
+    missing or no longer at base_revision.
+    """
+    db_diagram = db.get(Diagram, diagram_id)
+    if db_diagram is None or (base_revision is not None and db_diagram.revision != base_revision):
+        return None
+    revision = db_diagram.revision
+    
+    stored = read_content(db_diagram)
+    previous = json.loads(stored) if stored else None
+    document = json.loads(stored) if stored else {}
+    document = apply_element_batch(document, upserts, deletes)
+    # Elements were checked one by one; this catches edges left pointing at removed nodes
+    validate_diagram_document(document, db_diagram.diagram_type)
+    content = _dump_document(document)
+    
+    columns, changed = store_content(db_diagram, content, document)
+    if not changed:
+        return db_diagram
+    if not _compare_and_set_content(db, diagram_id, revision, columns):
+        db.rollback()
+        return None
+    keys = {(element_type, element_key(element)) for element_type, element in upserts}
+    _sync_elements(db, diagram_id, document, keys=keys, deleted=set(deletes))
+    operations = create_patch(previous, document) if previous is not None else None
+    record_diagram_revision(db, diagram_id, revision + 1, content, operations, user_id)
+    db.commit()
+    db.refresh(db_diagram)
+    return db_diagram
+
+def rebuild_diagram_elements(db: Session, diagram_id: int):
+    """Rebuild a diagram's DiagramElement rows from its content (backfills, repairs)."""
+    db_diagram = db.get(Diagram, diagram_id)
+    if db_diagram:
+        _sync_elements(db, diagram_id, _load_document(read_content(db_diagram)))
         db.commit()
-        db.refresh(db_diagram)
     return db_diagram
 
 def delete_diagram(db: Session, diagram_id: int):
-    db_diagram = db.query(Diagram).filter(Diagram.id == diagram_id).first()
+    db_diagram = db.get(Diagram, diagram_id)
     if db_diagram:
+        # One statement per table instead of loading every row for the ORM cascade
+        db.query(DiagramElement).filter(DiagramElement.diagram_id == diagram_id).delete(synchronize_session=False)
+        db.query(DiagramRevision).filter(DiagramRevision.diagram_id == diagram_id).delete(synchronize_session=False)
         db.delete(db_diagram)
         db.commit()
     return db_diagram
 
 # Diagram Element CRUD operations
-def get_diagram_elements(db: Session, diagram_id: int):
-    return db.query(DiagramElement).filter(DiagramElement.diagram_id == diagram_id).all()
+def get_diagram_elements(db: Session, diagram_id: int, element_type: str = None):
+    query = db.query(DiagramElement).filter(DiagramElement.diagram_id == diagram_id)
+    if element_type is not None:
+        query = query.filter(DiagramElement.element_type == element_type)
+    return query.all()
+
+def get_diagram_elements_by_keys(db: Session, diagram_id: int, element_type: str, keys: list[str]):
+    return db.query(DiagramElement).filter(
+        DiagramElement.diagram_id == diagram_id,
+        DiagramElement.element_type == element_type,
+        DiagramElement.element_key.in_(keys)
+    ).all()
+
+def build_diagram_spatial_index(db: Session, diagram_id: int, revision: int):
+    """Build the viewport index of a diagram from its element rows."""
+    rows = db.query(
+        DiagramElement.element_type, DiagramElement.element_key,
+        DiagramElement.position_x, DiagramElement.position_y, DiagramElement.element_data
+    ).filter(DiagramElement.diagram_id == diagram_id)
+    return SpatialIndex.build(revision, rows)
 
 def create_diagram_element(db: Session, element_data: dict):
     db_element = DiagramElement(**element_data)
@@ -64,51 +313,101 @@ def delete_diagram_element(db: Session, element_id: int):
         db.commit()
     return db_element
 
-# Diagram Lock CRUD operations
-def get_active_diagram_lock(db: Session, diagram_id: int):
+# Diagram lock leases: at most one row per diagram, taken over in place
+# once it expires and deleted on release, so the table stays small
+def _lease_available(user_id: int, now: datetime):
+    return or_(
+        DiagramLock.user_id == user_id,
+        DiagramLock.is_active == False,
+        DiagramLock.expires_at.is_(None),  # rows from before leases existed
+        DiagramLock.expires_at <= now
+    )
+
+def _lease_row(db: Session, diagram_id: int):
+    return db.query(DiagramLock).filter(DiagramLock.diagram_id == diagram_id).first()
+
+def get_diagram_lease(db: Session, diagram_id: int):
+    """Get the unexpired lock lease of a diagram, if any."""
     return db.query(DiagramLock).filter(
         DiagramLock.diagram_id == diagram_id,
-        DiagramLock.is_active == True
+        DiagramLock.is_active == True,
+        DiagramLock.expires_at > datetime.utcnow()
     ).first()
 
-def create_or_update_diagram_lock(db: Session, diagram_id: int, user_id: int):
-    # Check if there's already an active lock by this user
-    existing_lock = db.query(DiagramLock).filter(
+def acquire_diagram_lease(db: Session, diagram_id: int, user_id: int, ttl_seconds: int):
+    """Atomically take the lease if it is free, expired or already held by the user.
+
+    Returns (lease, acquired); when another user holds the lease, their lease
+    is returned with acquired=False.
+    """
+    now = datetime.utcnow()
+    values = {
+        "user_id": user_id,
+        "locked_at": now,
+        "expires_at": now + timedelta(seconds=ttl_seconds),
+        "is_active": True,
+    }
+    updated = db.query(DiagramLock).filter(
         DiagramLock.diagram_id == diagram_id,
-        DiagramLock.user_id == user_id,
-        DiagramLock.is_active == True
-    ).first()
-    
-    if existing_lock:
-        # Update the existing lock timestamp
-        existing_lock.locked_at = datetime.utcnow()
+        _lease_available(user_id, now)
+    ).update(values, synchronize_session=False)
+    if updated:
         db.commit()
-        db.refresh(existing_lock)
-        return existing_lock
-    else:
-        # Create new lock
-        db_lock = DiagramLock(
-            diagram_id=diagram_id,
-            user_id=user_id,
-            is_active=True
-        )
-        db.add(db_lock)
+        return _lease_row(db, diagram_id), True
+    
+    holder = get_diagram_lease(db, diagram_id)
+    if holder is not None:
+        return holder, False
+    
+    db.add(DiagramLock(diagram_id=diagram_id, **values))
+    try:
         db.commit()
-        db.refresh(db_lock)
-        return db_lock
+    except IntegrityError:
+        # Another request inserted the lease first
+        db.rollback()
+        return get_diagram_lease(db, diagram_id), False
+    return _lease_row(db, diagram_id), True
 
-def unlock_diagram(db: Session, diagram_id: int, user_id: int):
-    db.query(DiagramLock).filter(
+def renew_diagram_lease(db: Session, diagram_id: int, user_id: int, ttl_seconds: int):
+    """Extend a lease held by the user; returns the new expiry or None if not held."""
+    now = datetime.utcnow()
+    expires_at = now + timedelta(seconds=ttl_seconds)
+    updated = db.query(DiagramLock).filter(
         DiagramLock.diagram_id == diagram_id,
         DiagramLock.user_id == user_id,
-        DiagramLock.is_active == True
-    ).update({"is_active": False})
+        DiagramLock.is_active == True,
+        DiagramLock.expires_at > now
+    ).update({"expires_at": expires_at}, synchronize_session=False)
     db.commit()
+    return expires_at if updated else None
 
-def unlock_all_user_locks(db: Session, user_id: int):
-    db.query(DiagramLock).filter(
-        DiagramLock.user_id == user_id,
-        DiagramLock.is_active == True
-    ).update({"is_active": False})
+def release_diagram_lease(db: Session, diagram_id: int, user_id: int):
+    """Release a lease held by the user; returns True if one was released."""
+    deleted = db.query(DiagramLock).filter(
+        DiagramLock.diagram_id == diagram_id,
+        DiagramLock.user_id == user_id
+    ).delete(synchronize_session=False)
+    db.commit()
+    return bool(deleted)
+
+def release_all_user_leases(db: Session, user_id: int):
+    db.query(DiagramLock).filter(DiagramLock.user_id == user_id).delete(synchronize_session=False)
     db.commit()
 
+def purge_expired_diagram_leases(db: Session):
+    """Delete expired and released lock rows.
+
+    Returns (diagram_id, user_id) pairs of the leases that had been active.
+    """
+    now = datetime.utcnow()
+    stale = or_(
+        DiagramLock.is_active == False,
+        DiagramLock.expires_at.is_(None),
+        DiagramLock.expires_at <= now
+    )
+    expired = db.query(DiagramLock.diagram_id, DiagramLock.user_id).filter(
+        stale, DiagramLock.is_active == True
+    ).all()
+    db.query(DiagramLock).filter(stale).delete(synchronize_session=False)
+    db.commit()
+    return [(diagram_id, user_id) for diagram_id, user_id in expired]
@@ -1,5 +1,9 @@
+from datetime import datetime
+from typing import Optional, Tuple
+from sqlalchemy import DateTime, and_, exists, func, literal, or_, select
 from sqlalchemy.orm import Session
-from models.project import Project
+from models.diagram import Diagram, DiagramElement, DiagramLock, DiagramRevision
+from models.project import Project, project_members
 from models.user import User
 from schemas.project import ProjectCreate
 
@@ -31,23 +35,41 @@ def update_project(db: Session, project_id: int, project_update: dict):
     return db_project
 
 def delete_project(db: Session, project_id: int):
-    db_project = db.query(Project).filter(Project.id == project_id).first()
+    db_project = db.get(Project, project_id)
     if db_project:
+        # One statement per table, as in delete_diagram; the ORM cascade does
+        # not reach revisions, and diagram ids can be reused once freed
+        diagram_ids = select(Diagram.id).where(Diagram.project_id == project_id)
+        for model in (DiagramElement, DiagramRevision, DiagramLock):
+            db.query(model).filter(model.diagram_id.in_(diagram_ids)).delete(synchronize_session=False)
+        db.query(Diagram).filter(Diagram.project_id == project_id).delete(synchronize_session=False)
         db.delete(db_project)
         db.commit()
     return db_project
 
+def membership_clause(user_id: int):
+    """SQL expression that is true when the user owns or is a member of Project."""
+    # EXISTS probes the (user_id, project_id) primary key, independent of member count
+    return or_(
+        Project.owner_id == user_id,
+        exists().where(
+            project_members.c.project_id == Project.id,
+            project_members.c.user_id == user_id
+        )
+    )
+
 def is_project_member(db: Session, project_id: int, user_id: int):
     """Check if a user is a member of a project."""
-    project = db.query(Project).filter(Project.id == project_id).first()
-    if not project:
-        return False
-    # Owner is always a member
-    if project.owner_id == user_id:
-        return True
-    # Check if user is in members list
-    user = db.query(User).filter(User.id == user_id).first()
-    return user in project.members if user else False
+    return bool(db.query(
+        exists().where(Project.id == project_id, membership_clause(user_id))
+    ).scalar())
+
+def get_project_with_access(db: Session, project_id: int, user_id: int):
+    """Get a project and whether the user may access it, in one query."""
+    row = db.query(Project, membership_clause(user_id)).filter(Project.id == project_id).first()
+    if row is None:
+        return None, False
+    return row[0], bool(row[1])
 
 def add_project_member(db: Session, project_id: int, user_id: int):
     """Add a user as a member of a project."""
@@ -70,18 +92,53 @@ def remove_project_member(db: Session, project_id: int, user_id: int):
             db.commit()
     return project
 
+# SQLite keeps timestamps as text: CURRENT_TIMESTAMP writes no fraction, Python
+# values are written with microseconds. Both sides of a comparison go through
+# strftime so the two formats order and compare as one (ties within a
+# millisecond fall to the id).
+SQLITE_ACTIVITY_FORMAT = "%Y-%m-%d %H:%M:%f"
+
+def _is_sqlite(db: Session) -> bool:
+    return db.get_bind().dialect.name == "sqlite"
+
+def _activity_key(db: Session):
+    # Rows created before updated_at had a server default may still hold NULL
+    key = func.coalesce(Project.updated_at, Project.created_at)
+    return func.strftime(SQLITE_ACTIVITY_FORMAT, key) if _is_sqlite(db) else key
+
+def _activity_value(db: Session, activity: datetime):
+    if _is_sqlite(db):
+        return func.strftime(SQLITE_ACTIVITY_FORMAT, literal(activity.isoformat(sep=" ")))
+    return literal(activity, DateTime(timezone=True))
+
+def _accessible_projects_query(db: Session, user_id: int):
+    # UNION of owned and shared project ids; both branches are index lookups
+    accessible_ids = select(Project.id).where(Project.owner_id == user_id).union(
+        select(project_members.c.project_id).where(project_members.c.user_id == user_id)
+    )
+    return db.query(Project).filter(Project.id.in_(accessible_ids)).order_by(
+        _activity_key(db).desc(), Project.id.desc()
+    )
+
 def get_user_accessible_projects(db: Session, user_id: int, skip: int = 0, limit: int = 100):
-    """Get all projects accessible by a user (owned or member of)."""
-    # Get owned projects
-    owned_projects = db.query(Project).filter(Project.owner_id == user_id).all()
-    
-    # Get projects where user is a member
-    user = db.query(User).filter(User.id == user_id).first()
-    if user:
-        member_projects = user.shared_projects
-        # Combine and remove duplicates
-        all_projects = list(set(owned_projects + member_projects))
-        return all_projects[skip:skip+limit]
-    
-    return owned_projects[skip:skip+limit]
+    """Get all projects accessible by a user (owned or member of), most recently updated first."""
+    return _accessible_projects_query(db, user_id).offset(skip).limit(limit).all()
+
+def get_user_accessible_projects_page(
+    db: Session, user_id: int, after: Optional[Tuple[datetime, int]] = None, limit: int = 100
+):
+    """Keyset page of accessible projects ordered by (activity, id) descending.
 
+    ``after`` is the (activity timestamp, id) of the last project of the
+    previous page, taken from the cursor: the page continues from those
+    values even if that project has since changed or been deleted.
+    """
+    query = _accessible_projects_query(db, user_id)
+    if after is not None:
+        after_activity, after_id = after
+        activity, anchor = _activity_key(db), _activity_value(db, after_activity)
+        query = query.filter(or_(
+            activity < anchor,
+            and_(activity == anchor, Project.id < after_id)
+        ))
+    return query.limit(limit).all()
@@ -0,0 +1,128 @@
+from sqlalchemy.orm import Session, load_only
+from models.diagram import DiagramRevision
+from core.config import settings
+from core.content_store import compress_text, decompress_text
+from core.json_patch import apply_patch
+from datetime import datetime
+from typing import Optional
+import json
+
+SNAPSHOT = "snapshot"
+DELTA = "delta"
+
+# Diagram revision history: every content save is stored either as a full
+# snapshot or as a JSON Patch delta from the previous revision. A snapshot
+# every REVISION_SNAPSHOT_INTERVAL revisions bounds how many deltas have to
+# be replayed to rebuild one.
+def _has_revision(db: Session, diagram_id: int, revision: int) -> bool:
+    return db.query(DiagramRevision.id).filter(
+        DiagramRevision.diagram_id == diagram_id,
+        DiagramRevision.revision == revision
+    ).first() is not None
+
+def record_diagram_revision(
+    db: Session, diagram_id: int, revision: int, content: Optional[str],
+    operations: Optional[list] = None, user_id: Optional[int] = None
+):
+    """Add the history row for a save; does not commit.
+
+    ``operations`` is the JSON Patch from the previous revision's content to
+    ``content``. Without it, at snapshot intervals, or when the previous
+    revision is not in the history, a snapshot is stored instead.
+    """
+    content = content or ""
+    kind = SNAPSHOT
+    payload = content
+    if (
+        operations is not None
+        and revision % settings.revision_snapshot_interval != 0
+        and _has_revision(db, diagram_id, revision - 1)
+    ):
+        delta = json.dumps(operations, ensure_ascii=False, separators=(",", ":"))
+        # A rewrite of most of the document is cheaper to store whole
+        if len(delta) < len(content):
+            kind, payload = DELTA, delta
+    
+    data, encoding = compress_text(payload)
+    db_revision = DiagramRevision(
+        diagram_id=diagram_id, revision=revision, kind=kind, data=data, encoding=encoding,
+        content_size=len(content.encode("utf-8")), user_id=user_id
+    )
+    db.add(db_revision)
+    return db_revision
+
+def list_diagram_revisions(db: Session, diagram_id: int, before: Optional[int] = None, limit: int = 50):
+    """Revisions of a diagram, newest first, without their data."""
+    query = db.query(DiagramRevision).options(load_only(
+        DiagramRevision.id, DiagramRevision.diagram_id, DiagramRevision.revision, DiagramRevision.kind,
+        DiagramRevision.content_size, DiagramRevision.user_id, DiagramRevision.created_at
+    )).filter(DiagramRevision.diagram_id == diagram_id)
+    if before is not None:
+        query = query.filter(DiagramRevision.revision < before)
+    return query.order_by(DiagramRevision.revision.desc()).limit(limit).all()
+
+def _replay(rows: list) -> str:
+    """Content at the last of ``rows``: a snapshot followed by consecutive deltas."""
+    content = decompress_text(rows[0].data, rows[0].encoding)
+    if len(rows) == 1:
+        return content
+    document = json.loads(content)
+    for row in rows[1:]:
+        document = apply_patch(document, json.loads(decompress_text(row.data, row.encoding)))
+    return json.dumps(document, ensure_ascii=False, separators=(",", ":"))
+
+def get_diagram_revision_content(db: Session, diagram_id: int, revision: int):
+    """Rebuild the content of one revision; returns (row, content) or None if it is not kept."""
+    base = db.query(DiagramRevision.revision).filter(
+        DiagramRevision.diagram_id == diagram_id,
+        DiagramRevision.revision <= revision,
+        DiagramRevision.kind == SNAPSHOT
+    ).order_by(DiagramRevision.revision.desc()).limit(1).scalar()
+    if base is None:
+        return None
+    rows = db.query(DiagramRevision).filter(
+        DiagramRevision.diagram_id == diagram_id,
+        DiagramRevision.revision >= base,
+        DiagramRevision.revision <= revision
+    ).order_by(DiagramRevision.revision).all()
+    if rows[-1].revision != revision or len(rows) != revision - base + 1:
+        return None
+    return rows[-1], _replay(rows) or None
+
+def get_diagrams_with_revisions_before(db: Session, older_than: datetime):
+    rows = db.query(DiagramRevision.diagram_id).filter(
+        DiagramRevision.created_at < older_than
+    ).distinct().all()
+    return [row.diagram_id for row in rows]
+
+def compact_diagram_revisions(db: Session, diagram_id: int, older_than: datetime, keep_last: int) -> int:
+    """Drop revisions created before ``older_than``, keeping at least the newest ``keep_last``.
+
+    The oldest remaining revision is rewritten as a snapshot if it is a
+    delta, so every kept revision can still be rebuilt. Returns the number of
+    rows removed.
+    """
+    revisions = DiagramRevision.revision
+    newest = db.query(revisions).filter(DiagramRevision.diagram_id == diagram_id).order_by(
+        revisions.desc()
+    ).offset(max(keep_last - 1, 0)).limit(1).scalar()
+    if newest is None:
+        return 0
+    recent = db.query(revisions).filter(
+        DiagramRevision.diagram_id == diagram_id,
+        DiagramRevision.created_at >= older_than
+    ).order_by(revisions).limit(1).scalar()
+    cutoff = newest if recent is None else min(newest, recent)
+    
+    rebuilt = get_diagram_revision_content(db, diagram_id, cutoff)
+    if rebuilt is not None:
+        row, content = rebuilt
+        if row.kind == DELTA:
+            row.kind = SNAPSHOT
+            row.data, row.encoding = compress_text(content or "")
+    removed = db.query(DiagramRevision).filter(
+        DiagramRevision.diagram_id == diagram_id,
+        revisions < cutoff
+    ).delete(synchronize_session=False)
+    db.commit()
+    return removed
@@ -0,0 +1,73 @@
+from sqlalchemy import column, func, literal_column, select, table
+from sqlalchemy.orm import Session
+from typing import Optional
+from models.diagram import Diagram, DiagramElement
+from core.search import FTS_TABLE, fts_enabled, fts_match, query_terms
+
+# Project search: element hits ranked by relevance
+def _hit(row, score: float) -> dict:
+    return {
+        "diagram_id": row.diagram_id,
+        "diagram_name": row.diagram_name,
+        "diagram_type": row.diagram_type,
+        "element_type": row.element_type,
+        "element_key": row.element_key,
+        "text": row.search_text,
+        "score": round(score, 4),
+    }
+
+def _substring_score(search_text: str, terms: list[str]) -> float:
+    """Fallback ranking: whole-word and prefix matches count more, long texts less."""
+    words = search_text.lower().split()
+    score = 0.0
+    for term in terms:
+        if term in words:
+            score += 3
+        elif any(word.startswith(term) for word in words):
+            score += 2
+        else:
+            score += 1
+    return score / (1 + len(words) / 20)
+
+def search_project_elements(
+    db: Session,
+    project_id: int,
+    query: str,
+    limit: int = 50,
+    element_type: Optional[str] = None,
+    diagram_type: Optional[str] = None,
+):
+    """Elements of a project's diagrams whose text matches every term of ``query``."""
+    terms = query_terms(query)
+    if not terms:
+        return []
+    columns = (
+        DiagramElement.diagram_id, Diagram.name.label("diagram_name"), Diagram.diagram_type,
+        DiagramElement.element_type, DiagramElement.element_key, DiagramElement.search_text,
+    )
+    statement = select(*columns).join(Diagram, Diagram.id == DiagramElement.diagram_id).where(
+        Diagram.project_id == project_id,
+        DiagramElement.search_text.isnot(None),
+    )
+    if element_type is not None:
+        statement = statement.where(DiagramElement.element_type == element_type)
+    if diagram_type is not None:
+        statement = statement.where(Diagram.diagram_type == diagram_type)
+
+    if fts_enabled(db.get_bind(clause=statement)):
+        # bm25() is lower for better matches
+        fts = table(FTS_TABLE, column("rowid"))
+        rank = literal_column(f"bm25({FTS_TABLE})")
+        statement = statement.add_columns(rank.label("rank")).join(
+            fts, fts.c.rowid == DiagramElement.id
+        ).where(
+            literal_column(FTS_TABLE).op("MATCH")(fts_match(terms))
+        ).order_by(rank).limit(limit)
+        return [_hit(row, -row.rank) for row in db.execute(statement)]
+
+    statement = statement.where(*(
+        func.lower(DiagramElement.search_text).contains(term, autoescape=True) for term in terms
+    )).limit(max(limit * 5, 200))
+    hits = [_hit(row, _substring_score(row.search_text, terms)) for row in db.execute(statement)]
+    hits.sort(key=lambda hit: -hit["score"])
+    return hits[:limit]
@@ -0,0 +1,95 @@
+from sqlalchemy.orm import Session
+from models.user import User, RefreshToken
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from core.config import settings
+import hashlib
+import secrets
+
+def _hash_token(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+def _expired(expires_at: datetime) -> bool:
+    # SQLite hands the column back naive (UTC), PostgreSQL timezone-aware
+    if expires_at.tzinfo is None:
+        expires_at = expires_at.replace(tzinfo=timezone.utc)
+    return expires_at <= datetime.now(timezone.utc)
+
+# Refresh token CRUD operations
+def create_refresh_token(db: Session, user_id: int, family_id: Optional[str] = None, commit: bool = True):
+    """Issue a refresh token; returns the raw token, which is only ever stored hashed."""
+    token = secrets.token_urlsafe(32)
+    if family_id is None:
+        # A new login: clear this user's expired tokens instead of running a sweeper
+        db.query(RefreshToken).filter(
+            RefreshToken.user_id == user_id,
+            RefreshToken.expires_at <= datetime.utcnow()
+        ).delete(synchronize_session=False)
+    db.add(RefreshToken(
+        user_id=user_id,
+        family_id=family_id or secrets.token_hex(16),
+        token_hash=_hash_token(token),
+        expires_at=datetime.utcnow() + timedelta(days=settings.refresh_token_expire_days),
+    ))
+    if commit:
+        db.commit()
+    return token
+
+def get_refresh_token(db: Session, token: str):
+    return db.query(RefreshToken).filter(RefreshToken.token_hash == _hash_token(token)).first()
+
+def revoke_refresh_token_family(db: Session, family_id: str, commit: bool = True):
+    db.query(RefreshToken).filter(
+        RefreshToken.family_id == family_id,
+        RefreshToken.revoked_at.is_(None)
+    ).update({"revoked_at": datetime.utcnow()}, synchronize_session=False)
+    if commit:
+        db.commit()
+
+def rotate_refresh_token(db: Session, token: str):
+    """Exchange a refresh token for a new one in the same family.
+
+    Returns (user, new_token), or None if the token is unknown, expired or revoked.
+    Presenting an already rotated token means it leaked, so the whole family is revoked.
+    """
+    db_token = get_refresh_token(db, token)
+    if db_token is None:
+        return None
+    if db_token.revoked_at is not None:
+        revoke_refresh_token_family(db, db_token.family_id)
+        return None
+    if _expired(db_token.expires_at):
+        return None
+
+    # Conditional update so two concurrent refreshes cannot both succeed
+    rotated = db.query(RefreshToken).filter(
+        RefreshToken.id == db_token.id,
+        RefreshToken.revoked_at.is_(None)
+    ).update({"revoked_at": datetime.utcnow()}, synchronize_session=False)
+    if not rotated:
+        db.rollback()
+        return None
+    new_token = create_refresh_token(db, db_token.user_id, family_id=db_token.family_id, commit=False)
+    db.commit()
+    user = db.query(User).filter(User.id == db_token.user_id).first()
+    return user, new_token
+
+def revoke_refresh_token(db: Session, token: str):
+    """Log out one session: revoke the family the token belongs to."""
+    db_token = get_refresh_token(db, token)
+    if db_token is None:
+        return None
+    revoke_refresh_token_family(db, db_token.family_id)
+    return db_token
+
+def revoke_user_tokens(db: Session, user_id: int):
+    """Log out everywhere: revoke all refresh tokens and bump the access token version."""
+    db.query(RefreshToken).filter(
+        RefreshToken.user_id == user_id,
+        RefreshToken.revoked_at.is_(None)
+    ).update({"revoked_at": datetime.utcnow()}, synchronize_session=False)
+    db.query(User).filter(User.id == user_id).update(
+        {"token_version": User.token_version + 1}, synchronize_session=False
+    )
+    db.commit()
+    return db.query(User.token_version).filter(User.id == user_id).scalar()
@@ -1,13 +1,29 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from core.database import engine
+from fastapi.responses import ORJSONResponse, PlainTextResponse
+from core.config import settings
+from core.compression import CompressionMiddleware
+from core.metrics import MetricsMiddleware, instrument_engines, registry
+from core.profiling import ProfilingMiddleware
+from core.database import engine, async_engine, async_read_engine, get_pool_status
 from models import Base
-from api import auth, projects, diagrams, invites
+from api import auth, projects, diagrams, revisions, exports, search, invites, realtime, profiles
+from core.realtime import hub
+from core.locks import lock_service
+from core.autosave import autosave_buffer
+from core.history import revision_compactor
+from core.passwords import password_hasher
+from core.export import export_service
+from core.search import install_search_index
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
+install_search_index(engine)
 
-app = FastAPI(title="IDMS API", version="1.0.0")
+app = FastAPI(title="IDMS API", version="1.0.0", default_response_class=ORJSONResponse)
+
+if settings.response_compression:
+    app.add_middleware(CompressionMiddleware, minimum_size=settings.compression_minimum_size)
 
 # CORS middleware
 app.add_middleware(
@@ -16,13 +32,57 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Profile-Id"],
 )
 
+if settings.profiling_token or settings.profiling_sample_rate > 0:
+    app.add_middleware(ProfilingMiddleware)
+
+# Outermost, so timings cover every other middleware and byte counts are what goes on the wire
+if settings.metrics_enabled:
+    instrument_engines(engine, async_engine.sync_engine, async_read_engine.sync_engine)
+    app.add_middleware(MetricsMiddleware)
+
 # Include routers
 app.include_router(auth.router)
 app.include_router(projects.router)
 app.include_router(diagrams.router)
+app.include_router(revisions.router)
+app.include_router(exports.router)
+app.include_router(search.router)
 app.include_router(invites.router)
+app.include_router(realtime.router)
+app.include_router(profiles.router)
+
+@app.on_event("startup")
+async def start_background_services():
+    await hub.start()
+    await lock_service.start()
+    await revision_compactor.start()
+    await autosave_buffer.start()
+
+@app.on_event("shutdown")
+async def close_connections():
+    # uvicorn runs this on SIGTERM too: buffered autosaves are written before the engines close
+    await autosave_buffer.stop()
+    await revision_compactor.stop()
+    await lock_service.stop()
+    await hub.stop()
+    password_hasher.shutdown()
+    export_service.stop()
+    # aiosqlite keeps a worker thread per pooled connection alive until disposed
+    await async_engine.dispose()
+    if async_read_engine is not async_engine:
+        await async_read_engine.dispose()
+
+@app.get("/health", tags=["health"])
+async def health():
+    return {"status": "ok", "database": get_pool_status()}
+
+if settings.metrics_enabled:
+    @app.get("/metrics", tags=["health"], include_in_schema=False)
+    async def metrics():
+        return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Миграция содержимого диаграмм в сжатое хранилище.
+
+Добавляет в таблицу diagrams колонки content_blob, content_encoding,
+content_hash, content_size, element_count и revision, в diagram_elements — колонки
+element_key и search_text, в diagram_locks — expires_at (оставляя по одной
+блокировке на диаграмму), в users — token_version (если их ещё нет),
+удаляет строки элементов, блокировок и ревизий, оставшиеся от удалённых
+диаграмм, перекодирует существующие строки в формат, заданный CONTENT_COMPRESSION,
+заполняя метаданные, пересобирает строки diagram_elements по содержимому
+диаграмм и полнотекстовый индекс поиска. Повторный запуск безопасен:
+строки, уже сохранённые в нужном формате, пропускаются.
+
+    python migrate_content.py [--batch-size 200] [--vacuum]
+"""
+
+import argparse
+from sqlalchemy import inspect, or_, text
+from core.config import settings
+from core.content_store import encode_content, read_content
+from core.database import SessionLocal, engine
+from core.search import install_search_index, rebuild_search_index
+from models.diagram import Diagram, DiagramElement, DiagramLock, DiagramRevision
+from models.project import Project
+from models.user import User
+import crud
+
+NEW_COLUMNS = {
+    Diagram.__tablename__: {
+        "content_blob": "BLOB" if engine.dialect.name == "sqlite" else "BYTEA",
+        "content_encoding": "VARCHAR(16)",
+        "content_hash": "VARCHAR(64)",
+        "content_size": "INTEGER",
+        "element_count": "INTEGER",
+        "revision": "INTEGER NOT NULL DEFAULT 0",
+    },
+    DiagramElement.__tablename__: {
+        "element_key": "VARCHAR",
+        "search_text": "TEXT",
+    },
+    DiagramLock.__tablename__: {
+        "expires_at": "DATETIME" if engine.dialect.name == "sqlite" else "TIMESTAMP WITH TIME ZONE",
+    },
+    User.__tablename__: {
+        "token_version": "INTEGER NOT NULL DEFAULT 0",
+    },
+}
+
+# Before locks became leases a diagram could have several lock rows; keep the newest
+COLLAPSE_DUPLICATE_LOCKS = (
+    f"DELETE FROM {DiagramLock.__tablename__} WHERE id NOT IN "
+    f"(SELECT MAX(id) FROM {DiagramLock.__tablename__} GROUP BY diagram_id)"
+)
+
+# Удаление проекта оставляло строки его диаграмм, в том числе ревизии
+ORPHANED_ROW_TABLES = [DiagramElement.__tablename__, DiagramLock.__tablename__, DiagramRevision.__tablename__]
+
+NEW_INDEXES = [
+    f"CREATE INDEX IF NOT EXISTS ix_diagrams_content_hash ON {Diagram.__tablename__} (content_hash)",
+    f"CREATE UNIQUE INDEX IF NOT EXISTS ux_diagram_elements_diagram_key "
+    f"ON {DiagramElement.__tablename__} (diagram_id, element_type, element_key)",
+    f"CREATE INDEX IF NOT EXISTS ix_diagram_locks_expires_at ON {DiagramLock.__tablename__} (expires_at)",
+    f"CREATE UNIQUE INDEX IF NOT EXISTS ux_diagram_locks_diagram_id ON {DiagramLock.__tablename__} (diagram_id)",
+    f"CREATE INDEX IF NOT EXISTS ix_projects_owner_id_updated_at_id ON {Project.__tablename__} (owner_id, updated_at, id)",
+]
+
+def add_missing_columns():
+    with engine.begin() as connection:
+        # Reflect through the same connection: the SQLite writer pool holds only one
+        inspector = inspect(connection)
+        for table, columns in NEW_COLUMNS.items():
+            existing = {column["name"] for column in inspector.get_columns(table)}
+            for name, column_type in columns.items():
+                if name not in existing:
+                    connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {column_type}"))
+                    print(f"Добавлена колонка {table}.{name}")
+        removed = connection.execute(text(COLLAPSE_DUPLICATE_LOCKS)).rowcount
+        if removed:
+            print(f"Удалено повторяющихся блокировок: {removed}")
+        for table in ORPHANED_ROW_TABLES:
+            if not inspector.has_table(table):
+                continue
+            removed = connection.execute(text(
+                f"DELETE FROM {table} WHERE diagram_id NOT IN (SELECT id FROM {Diagram.__tablename__})"
+            )).rowcount
+            if removed:
+                print(f"Удалено строк {table} удалённых диаграмм: {removed}")
+        cascade_revision_deletes(connection, inspector)
+        for statement in NEW_INDEXES:
+            connection.execute(text(statement))
+
+def cascade_revision_deletes(connection, inspector):
+    """Пересоздаёт внешний ключ diagram_revisions.diagram_id с ON DELETE CASCADE.
+
+    SQLite не проверяет внешние ключи (PRAGMA foreign_keys выключен), там
+    ревизии удаляет crud, и таблицу не пересоздаём.
+    """
+    table = DiagramRevision.__tablename__
+    if connection.dialect.name == "sqlite" or not inspector.has_table(table):
+        return
+    for foreign_key in inspector.get_foreign_keys(table):
+        if foreign_key["referred_table"] != Diagram.__tablename__:
+            continue
+        if (foreign_key.get("options") or {}).get("ondelete", "").upper() == "CASCADE":
+            continue
+        name = foreign_key["name"]
+        drop = "DROP FOREIGN KEY" if connection.dialect.name == "mysql" else "DROP CONSTRAINT"
+        connection.execute(text(f"ALTER TABLE {table} {drop} {name}"))
+        connection.execute(text(
+            f"ALTER TABLE {table} ADD CONSTRAINT {name} FOREIGN KEY (diagram_id) "
+            f"REFERENCES {Diagram.__tablename__} (id) ON DELETE CASCADE"
+        ))
+        print(f"Внешний ключ {table}.diagram_id теперь ON DELETE CASCADE")
+
+def pending_filter():
+    """Строки, которые ещё не записаны в текущем формате или без метаданных."""
+    has_content = or_(Diagram.content.isnot(None), Diagram.content_blob.isnot(None))
+    missing_metadata = has_content & (Diagram.content_hash.is_(None) | Diagram.content_size.is_(None))
+    if settings.content_compression == "none":
+        return or_(Diagram.content_blob.isnot(None), missing_metadata)
+    return or_(
+        Diagram.content.isnot(None),
+        Diagram.content_encoding != settings.content_compression,
+        missing_metadata,
+    )
+
+def backfill(batch_size: int) -> int:
+    converted = 0
+    last_id = 0
+    while True:
+        with SessionLocal() as db:
+            rows = db.query(Diagram).filter(Diagram.id > last_id, pending_filter()).order_by(Diagram.id).limit(batch_size).all()
+            if not rows:
+                return converted
+            for row in rows:
+                # Без изменения revision и updated_at: содержимое остаётся тем же
+                db.query(Diagram).filter(Diagram.id == row.id).update(
+                    {**encode_content(read_content(row)), "updated_at": row.updated_at},
+                    synchronize_session=False
+                )
+            db.commit()
+            converted += len(rows)
+            last_id = rows[-1].id
+            print(f"Перекодировано диаграмм: {converted}")
+
+def rebuild_elements(batch_size: int) -> int:
+    """Пересобирает строки diagram_elements по содержимому диаграмм."""
+    rebuilt = 0
+    last_id = 0
+    while True:
+        with SessionLocal() as db:
+            ids = [row.id for row in db.query(Diagram.id).filter(Diagram.id > last_id).order_by(Diagram.id).limit(batch_size)]
+        if not ids:
+            return rebuilt
+        for diagram_id in ids:
+            with SessionLocal() as db:
+                crud.rebuild_diagram_elements(db, diagram_id=diagram_id)
+        rebuilt += len(ids)
+        last_id = ids[-1]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--vacuum", action="store_true", help="сжать файл SQLite после миграции")
+    args = parser.parse_args()
+    
+    add_missing_columns()
+    install_search_index(engine)
+    converted = backfill(args.batch_size)
+    print(f"Готово: {converted} диаграмм в формате {settings.content_compression}")
+    rebuilt = rebuild_elements(args.batch_size)
+    print(f"Элементы синхронизированы с содержимым: {rebuilt} диаграмм")
+    if rebuild_search_index(engine):
+        print("Полнотекстовый индекс поиска перестроен")
+    else:
+        print("FTS5 недоступен: поиск работает по подстроке")
+    
+    if args.vacuum and engine.dialect.name == "sqlite":
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            connection.execute(text("VACUUM"))
+        print("VACUUM выполнен")
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,19 @@
 from core.database import Base
-from models.user import User
+from models.user import User, RefreshToken
 from models.project import Project, project_members
-from models.diagram import Diagram, DiagramElement, DiagramLock, DiagramType
+from models.diagram import Diagram, DiagramElement, DiagramLock, DiagramRevision, DiagramType
 from models.invite import ProjectInvite
 
 __all__ = [
     "Base",
     "User",
+    "RefreshToken",
     "Project",
     "project_members",
     "Diagram",
     "DiagramElement",
     "DiagramLock",
+    "DiagramRevision",
     "DiagramType",
     "ProjectInvite",
 ]
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Boolean, Enum
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Boolean, Enum, Index, LargeBinary
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from core.database import Base
@@ -16,13 +16,20 @@ class Diagram(Base):
     name = Column(String, nullable=False)
     diagram_type = Column(Enum(DiagramType), nullable=False)
     project_id = Column(Integer, ForeignKey("projects.id"), nullable=False)
-    content = Column(Text)  # JSON content of the diagram
+    content = Column(Text)  # JSON content of the diagram, uncompressed (legacy rows, CONTENT_COMPRESSION=none)
+    content_blob = Column(LargeBinary)  # compressed JSON content, see core.content_store
+    content_encoding = Column(String(16))  # codec of content_blob: zlib or zstd
+    content_hash = Column(String(64), index=True)  # SHA-256 of the uncompressed content
+    content_size = Column(Integer)  # uncompressed content size in bytes
+    element_count = Column(Integer)  # nodes + edges in the content
+    revision = Column(Integer, nullable=False, default=0, server_default="0")  # bumped on every content save
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
     project = relationship("Project", back_populates="diagrams")
     elements = relationship("DiagramElement", back_populates="diagram", cascade="all, delete-orphan")
     locks = relationship("DiagramLock", back_populates="diagram", cascade="all, delete-orphan")
+    revisions = relationship("DiagramRevision", back_populates="diagram", cascade="all, delete-orphan", passive_deletes=True)
 
 class DiagramElement(Base):
     __tablename__ = "diagram_elements"
@@ -30,12 +37,19 @@ class DiagramElement(Base):
     id = Column(Integer, primary_key=True, index=True)
     diagram_id = Column(Integer, ForeignKey("diagrams.id"), nullable=False)
     element_type = Column(String, nullable=False)  # node, edge, etc.
+    element_key = Column(String)  # id of the element inside Diagram.content
     element_data = Column(Text, nullable=False)  # JSON data of the element
+    search_text = Column(Text)  # labels and attributes, indexed by core.search
     position_x = Column(Integer)
     position_y = Column(Integer)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
+    __table_args__ = (
+        # Rows mirror the elements of Diagram.content, addressed by their id
+        Index("ux_diagram_elements_diagram_key", "diagram_id", "element_type", "element_key", unique=True),
+    )
+    
     diagram = relationship("Diagram", back_populates="elements")
 
 class DiagramLock(Base):
@@ -45,8 +59,35 @@ class DiagramLock(Base):
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     diagram_id = Column(Integer, ForeignKey("diagrams.id"), nullable=False)
     locked_at = Column(DateTime(timezone=True), server_default=func.now())
+    expires_at = Column(DateTime(timezone=True), index=True)  # lease expiry, renewed by heartbeats
     is_active = Column(Boolean, default=True)
     
-    user = relationship("User", back_populates="locks")
+    __table_args__ = (
+        # One lease row per diagram; acquisition is a compare-and-set on it
+        Index("ux_diagram_locks_diagram_id", "diagram_id", unique=True),
+    )
+    
+    # Always serialized together with the lock, so load it in the same query
+    user = relationship("User", back_populates="locks", lazy="joined")
     diagram = relationship("Diagram", back_populates="locks")
 
+
+class DiagramRevision(Base):
+    __tablename__ = "diagram_revisions"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    # Deleted with the diagram by the database (Diagram.revisions is passive) and by crud
+    diagram_id = Column(Integer, ForeignKey("diagrams.id", ondelete="CASCADE"), nullable=False)
+    revision = Column(Integer, nullable=False)  # Diagram.revision this row reproduces
+    kind = Column(String(16), nullable=False)  # "snapshot" (full content) or "delta" (JSON Patch from revision - 1)
+    data = Column(LargeBinary, nullable=False)  # compressed content or patch, see core.content_store
+    encoding = Column(String(16), nullable=False)
+    content_size = Column(Integer)  # uncompressed size of the content at this revision
+    user_id = Column(Integer, ForeignKey("users.id"))
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+    
+    __table_args__ = (
+        Index("ux_diagram_revisions_diagram_revision", "diagram_id", "revision", unique=True),
+    )
+    
+    diagram = relationship("Diagram", back_populates="revisions")
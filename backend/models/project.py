@@ -1,9 +1,11 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Table
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Table, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from core.database import Base
 
-# Association table for project members
+# Association table for project members.
+# The composite primary key (user_id, project_id) doubles as the index for
+# "projects shared with a user" lookups.
 project_members = Table(
     'project_members',
     Base.metadata,
@@ -20,7 +22,13 @@ class Project(Base):
     description = Column(Text)
     owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    
+    __table_args__ = (
+        # Serves the owner_id side of the accessible-projects lookup; lists are ordered by
+        # coalesce(updated_at, created_at), which no index serves, so that is a sort of the user's projects
+        Index("ix_projects_owner_id_updated_at_id", "owner_id", "updated_at", "id"),
+    )
     
     owner = relationship("User", back_populates="projects")
     members = relationship("User", secondary=project_members, back_populates="shared_projects")
@@ -1,18 +1,29 @@
-from schemas.user import UserBase, UserCreate, User, Token, TokenData
-from schemas.project import ProjectBase, ProjectCreate, Project, ProjectWithDiagrams
+from schemas.user import UserBase, UserCreate, User, Token, TokenRefresh, TokenData
+from schemas.project import ProjectBase, ProjectCreate, Project, ProjectPage, ProjectImportResult, ProjectWithDiagrams
 from schemas.diagram import (
-    DiagramBase, DiagramCreate, DiagramUpdate, Diagram,
+    DiagramBase, DiagramCreate, DiagramUpdate, Diagram, DiagramSummary,
+    JsonPatchOperation, DiagramContentPatch, DiagramContentPatchResult,
     DiagramElementBase, DiagramElementCreate, DiagramElement,
-    DiagramLock
+    DiagramElementRef, DiagramElementUpsert, DiagramElementBatch, DiagramElementBatchResult,
+    DiagramRevisionInfo, DiagramRevisionContent, DiagramSearchHit,
+    DiagramLock, DiagramLockRenewal
+)
+from schemas.document import (
+    DiagramDocument, DiagramDocumentError, parse_diagram_document, validate_diagram_document, validate_diagram_element
 )
 from schemas.invite import ProjectInviteCreate, ProjectInvite, ProjectInviteInfo
 
 __all__ = [
-    "UserBase", "UserCreate", "User", "Token", "TokenData",
-    "ProjectBase", "ProjectCreate", "Project", "ProjectWithDiagrams",
-    "DiagramBase", "DiagramCreate", "DiagramUpdate", "Diagram",
+    "UserBase", "UserCreate", "User", "Token", "TokenRefresh", "TokenData",
+    "ProjectBase", "ProjectCreate", "Project", "ProjectPage", "ProjectImportResult", "ProjectWithDiagrams",
+    "DiagramBase", "DiagramCreate", "DiagramUpdate", "Diagram", "DiagramSummary",
+    "JsonPatchOperation", "DiagramContentPatch", "DiagramContentPatchResult",
     "DiagramElementBase", "DiagramElementCreate", "DiagramElement",
-    "DiagramLock",
+    "DiagramElementRef", "DiagramElementUpsert", "DiagramElementBatch", "DiagramElementBatchResult",
+    "DiagramRevisionInfo", "DiagramRevisionContent", "DiagramSearchHit",
+    "DiagramLock", "DiagramLockRenewal",
+    "DiagramDocument", "DiagramDocumentError", "parse_diagram_document", "validate_diagram_document",
+    "validate_diagram_element",
     "ProjectInviteCreate", "ProjectInvite", "ProjectInviteInfo",
 ]
 
@@ -1,8 +1,9 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field, field_validator, model_validator
+from typing import Any, List, Literal, Optional
 from datetime import datetime
 from models.diagram import DiagramType
 from schemas.user import User
+from core.content_store import read_content
 
 # Diagram schemas
 class DiagramBase(BaseModel):
@@ -13,19 +14,76 @@ class DiagramCreate(DiagramBase):
     project_id: Optional[int] = None
 
 class DiagramUpdate(BaseModel):
+    """Fields a full save may change; content is checked against the diagram type's document schema."""
     name: Optional[str] = None
     content: Optional[str] = None
+    
+    @field_validator("name")
+    @classmethod
+    def name_not_null(cls, value):
+        if value is None:
+            raise ValueError("Diagram name cannot be null")
+        return value
+    
+    class Config:
+        extra = "forbid"
 
 class Diagram(DiagramBase):
     id: int
     project_id: int
     content: Optional[str] = None
+    revision: int = 0
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+    
+    @model_validator(mode="before")
+    @classmethod
+    def decompress_content(cls, data: Any) -> Any:
+        # ORM rows keep content compressed; decompress only when serializing one
+        if hasattr(data, "content_blob"):
+            values = {name: getattr(data, name) for name in cls.model_fields if name != "content"}
+            values["content"] = read_content(data)
+            return values
+        return data
+    
+    class Config:
+        from_attributes = True
+
+class DiagramSummary(DiagramBase):
+    """Diagram listing entry: metadata only, without the content."""
+    id: int
+    project_id: int
+    revision: int = 0
+    content_size: Optional[int] = None
+    element_count: Optional[int] = None
     created_at: datetime
     updated_at: Optional[datetime] = None
     
     class Config:
         from_attributes = True
 
+# Incremental content save schemas (RFC 6902 JSON Patch)
+class JsonPatchOperation(BaseModel):
+    op: Literal["add", "remove", "replace", "move", "copy", "test"]
+    path: str
+    value: Optional[Any] = None
+    from_: Optional[str] = Field(default=None, alias="from")
+    
+    class Config:
+        populate_by_name = True
+
+class DiagramContentPatch(BaseModel):
+    base_revision: int
+    operations: List[JsonPatchOperation]
+
+class DiagramContentPatchResult(BaseModel):
+    id: int
+    revision: int
+    updated_at: Optional[datetime] = None
+    
+    class Config:
+        from_attributes = True
+
 # Diagram element schemas
 class DiagramElementBase(BaseModel):
     element_type: str
@@ -39,23 +97,75 @@ class DiagramElementCreate(DiagramElementBase):
 class DiagramElement(DiagramElementBase):
     id: int
     diagram_id: int
+    element_key: Optional[str] = None
     created_at: datetime
     updated_at: Optional[datetime] = None
     
     class Config:
         from_attributes = True
 
+# Bulk element changes, mirrored into the diagram content
+class DiagramElementRef(BaseModel):
+    element_type: Literal["node", "edge"]
+    key: str
+
+class DiagramElementUpsert(BaseModel):
+    element_type: Literal["node", "edge"]
+    data: dict  # the node/edge object as stored in the content; must carry an "id"
+    
+    @model_validator(mode="after")
+    def check_id(self):
+        if self.data.get("id") is None:
+            raise ValueError("Element data must have an id")
+        return self
+
+class DiagramElementBatch(BaseModel):
+    base_revision: Optional[int] = None
+    upsert: List[DiagramElementUpsert] = []
+    delete: List[DiagramElementRef] = []
+
+class DiagramElementBatchResult(DiagramContentPatchResult):
+    upserted: int
+    deleted: int
+
+# Revision history schemas
+class DiagramRevisionInfo(BaseModel):
+    revision: int
+    kind: Literal["snapshot", "delta"]
+    content_size: Optional[int] = None
+    user_id: Optional[int] = None
+    created_at: datetime
+    
+    class Config:
+        from_attributes = True
+
+class DiagramRevisionContent(DiagramRevisionInfo):
+    content: Optional[str] = None
+
+# Search schemas
+class DiagramSearchHit(BaseModel):
+    diagram_id: int
+    diagram_name: str
+    diagram_type: DiagramType
+    element_type: str
+    element_key: Optional[str] = None
+    text: Optional[str] = None
+    score: float
+
 # Lock schemas
 class DiagramLockBase(BaseModel):
     diagram_id: int
 
 class DiagramLock(DiagramLockBase):
-    id: int
     user_id: int
     locked_at: datetime
+    expires_at: datetime
     is_active: bool
     user: User
     
     class Config:
         from_attributes = True
 
+class DiagramLockRenewal(DiagramLockBase):
+    expires_at: datetime
+
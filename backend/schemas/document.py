@@ -0,0 +1,169 @@
+"""
+Typed schema of diagram content: the React Flow document the editor saves.
+
+Content arrives as a JSON string. ``parse_diagram_document`` decodes it once
+with orjson and validates the resulting dict in pydantic-core's strict mode
+against the schema of the diagram's type; the caller keeps the dict, so
+hashing, element sync, search indexing and diffing all reuse it instead of
+parsing the content again. Only the fields the server reads are typed;
+everything else the editor stores on nodes and edges (styling, handles,
+React Flow state) passes through untouched.
+
+The schemas are TypedDicts rather than models: validation only checks the
+document and builds no objects that would be thrown away.
+"""
+from typing import Any, Iterable, List, Literal, Optional, Union
+from typing_extensions import NotRequired, TypedDict
+import orjson
+from pydantic import TypeAdapter, ValidationError
+from models.diagram import DiagramType
+
+class Position(TypedDict):
+    x: float
+    y: float
+
+class Attribute(TypedDict, total=False):
+    name: str
+    label: str
+    type: Optional[str]
+    primary: bool
+    isPrimaryKey: bool
+
+class NodeData(TypedDict, total=False):
+    label: str
+    header: str
+    description: str
+    shape: str
+    width: Optional[float]
+    height: Optional[float]
+    fontSize: Optional[float]
+    borderWidth: Optional[float]
+    attributes: List[Union[str, Attribute]]
+
+class Node(TypedDict):
+    id: str
+    position: Position
+    type: NotRequired[str]
+    width: NotRequired[Optional[float]]
+    height: NotRequired[Optional[float]]
+    data: NotRequired[NodeData]
+
+class EdgeData(TypedDict, total=False):
+    label: str
+    sourceCardinality: str
+    targetCardinality: str
+    sourceOptional: bool
+    targetOptional: bool
+
+class Edge(TypedDict):
+    id: str
+    source: str
+    target: str
+    type: NotRequired[str]
+    label: NotRequired[Optional[str]]
+    sourceHandle: NotRequired[Optional[str]]
+    targetHandle: NotRequired[Optional[str]]
+    data: NotRequired[EdgeData]
+
+class Viewport(TypedDict):
+    x: float
+    y: float
+    zoom: float
+
+# Missing collections are empty, as everywhere else documents are read
+class DiagramDocument(TypedDict):
+    nodes: NotRequired[List[Node]]
+    edges: NotRequired[List[Edge]]
+    viewport: NotRequired[Viewport]
+
+# ERD connections carry the cardinality of each end
+class ErdEdgeData(EdgeData, total=False):
+    sourceCardinality: Literal["one", "many"]
+    targetCardinality: Literal["one", "many"]
+
+class ErdEdge(Edge):
+    data: NotRequired[ErdEdgeData]
+
+class ErdDocument(DiagramDocument):
+    edges: NotRequired[List[ErdEdge]]
+
+DOCUMENT_SCHEMAS = {
+    DiagramType.BPMN: (DiagramDocument, Node, Edge),
+    DiagramType.ERD: (ErdDocument, Node, ErdEdge),
+    DiagramType.DFD: (DiagramDocument, Node, Edge),
+}
+
+_ADAPTERS = {
+    diagram_type: tuple(TypeAdapter(schema) for schema in schemas)
+    for diagram_type, schemas in DOCUMENT_SCHEMAS.items()
+}
+
+class DiagramDocumentError(ValueError):
+    """Content that is not a valid document; ``errors`` are pydantic-style dicts with loc/msg/type."""
+
+    def __init__(self, errors: list[dict]):
+        self.errors = errors
+        first = errors[0]
+        location = ".".join(str(part) for part in first["loc"]) or "content"
+        more = f" (and {len(errors) - 1} more)" if len(errors) > 1 else ""
+        super().__init__(f"{location}: {first['msg']}{more}")
+
+    def located(self, prefix: Iterable) -> list[dict]:
+        """The errors with their locations under ``prefix``, e.g. ("body", "content")."""
+        return [{**error, "loc": (*prefix, *error["loc"])} for error in self.errors]
+
+def _errors(exc: ValidationError, prefix: tuple = ()) -> list[dict]:
+    return [
+        {"loc": (*prefix, *error["loc"]), "msg": error["msg"], "type": error["type"]}
+        for error in exc.errors(include_url=False)
+    ]
+
+def _reference_errors(document: dict) -> list[dict]:
+    """Duplicate ids and edges pointing at nodes that are not in the document."""
+    errors = []
+    node_ids = set()
+    for index, node in enumerate(document.get("nodes", ())):
+        if node["id"] in node_ids:
+            errors.append({"loc": ("nodes", index, "id"), "msg": f"Duplicate node id {node['id']!r}", "type": "duplicate_id"})
+        node_ids.add(node["id"])
+    edge_ids = set()
+    for index, edge in enumerate(document.get("edges", ())):
+        if edge["id"] in edge_ids:
+            errors.append({"loc": ("edges", index, "id"), "msg": f"Duplicate edge id {edge['id']!r}", "type": "duplicate_id"})
+        edge_ids.add(edge["id"])
+        for end in ("source", "target"):
+            if edge[end] not in node_ids:
+                errors.append({
+                    "loc": ("edges", index, end),
+                    "msg": f"Edge {end} {edge[end]!r} is not a node of the diagram",
+                    "type": "unknown_node",
+                })
+    return errors
+
+def validate_diagram_document(document: Any, diagram_type: DiagramType) -> dict:
+    """Check an already decoded document against its type's schema; returns it unchanged."""
+    try:
+        _ADAPTERS[DiagramType(diagram_type)][0].validate_python(document, strict=True)
+    except ValidationError as exc:
+        raise DiagramDocumentError(_errors(exc))
+    errors = _reference_errors(document)
+    if errors:
+        raise DiagramDocumentError(errors)
+    return document
+
+def parse_diagram_document(content: str, diagram_type: DiagramType) -> dict:
+    """Decode and validate diagram content in one pass over the text."""
+    try:
+        document = orjson.loads(content)
+    except orjson.JSONDecodeError as exc:
+        raise DiagramDocumentError([{"loc": (), "msg": f"Invalid JSON: {exc}", "type": "json_invalid"}])
+    return validate_diagram_document(document, diagram_type)
+
+def validate_diagram_element(element_type: str, element: Any, diagram_type: DiagramType) -> dict:
+    """Check one node or edge (element batches); references are checked against the stored document."""
+    adapter = _ADAPTERS[DiagramType(diagram_type)][1 if element_type == "node" else 2]
+    try:
+        adapter.validate_python(element, strict=True)
+    except ValidationError as exc:
+        raise DiagramDocumentError(_errors(exc))
+    return element
@@ -19,6 +19,16 @@ class Project(ProjectBase):
     class Config:
         from_attributes = True
 
+class ProjectPage(BaseModel):
+    items: List[Project]
+    next_cursor: Optional[str] = None
+
+class ProjectImportResult(BaseModel):
+    project: Project
+    diagrams: int
+    members: List[str] = []  # usernames added as members
+    skipped_members: List[str] = []  # usernames with no account here
+
 class ProjectWithDiagrams(Project):
     diagrams: List["Diagram"] = []
     
@@ -0,0 +1,53 @@
+import itertools
+import os
+import sys
+import tempfile
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# Settings are read at import: point the app at a throwaway database first
+_database_dir = tempfile.mkdtemp(prefix="idms-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_database_dir, 'idms.db')}"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+
+_user_numbers = itertools.count(1)
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+    from main import app
+    with TestClient(app) as test_client:
+        yield test_client
+
+@pytest.fixture
+def make_user(client):
+    """Register a new user; returns its bearer headers."""
+    def make():
+        username = f"user{next(_user_numbers)}"
+        password = "password123"
+        response = client.post("/auth/register", json={
+            "username": username, "email": f"{username}@example.com", "password": password,
+        })
+        assert response.status_code == 200, response.text
+        response = client.post("/auth/token", data={"username": username, "password": password})
+        assert response.status_code == 200, response.text
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+    return make
+
+@pytest.fixture
+def auth_headers(make_user):
+    return make_user()
+
+@pytest.fixture
+def diagram(client, auth_headers):
+    """An empty BPMN diagram in a new project of the ``auth_headers`` user."""
+    response = client.post("/projects/", json={"name": "Project"}, headers=auth_headers)
+    assert response.status_code == 200, response.text
+    project_id = response.json()["id"]
+    response = client.post(
+        f"/projects/{project_id}/diagrams/", json={"name": "Process", "diagram_type": "bpmn"}, headers=auth_headers,
+    )
+    assert response.status_code == 200, response.text
+    return response.json()
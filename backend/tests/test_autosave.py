@@ -0,0 +1,39 @@
+"""Write-behind autosaves (core/autosave.py) seen through the API."""
+import orjson
+import pytest
+from core.autosave import autosave_buffer
+
+def _content(label):
+    return orjson.dumps({"nodes": [{"id": "a", "position": {"x": 0, "y": 0}, "data": {"label": label}}]}).decode()
+
+@pytest.fixture
+def buffered(monkeypatch):
+    # The flush loop is not running: saves stay pending until something flushes them
+    monkeypatch.setattr(autosave_buffer, "interval_seconds", 60)
+    return autosave_buffer
+
+def test_saves_are_buffered_until_read_from_storage(client, auth_headers, diagram, buffered):
+    diagram_id = diagram["id"]
+    for label in ("one", "two", "three"):
+        response = client.put(f"/diagrams/{diagram_id}", json={"content": _content(label)}, headers=auth_headers)
+        assert response.status_code == 200, response.text
+    assert buffered.pending(diagram_id).saves == 3
+
+    response = client.get(f"/diagrams/{diagram_id}/elements", headers=auth_headers)
+    assert response.status_code == 200, response.text
+    assert len(response.json()) == 1
+    assert buffered.pending(diagram_id) is None
+    # Nothing is pending for the diagram any more, so neither is its lock kept
+    assert diagram_id not in buffered._locks
+
+def test_no_flush_without_access(client, auth_headers, make_user, diagram, buffered):
+    diagram_id = diagram["id"]
+    response = client.put(f"/diagrams/{diagram_id}", json={"content": _content("draft")}, headers=auth_headers)
+    assert response.status_code == 200, response.text
+
+    response = client.get(f"/diagrams/{diagram_id}/elements", headers=make_user())
+    assert response.status_code == 403
+    assert buffered.pending(diagram_id) is not None
+
+    assert client.get(f"/diagrams/{diagram_id}/elements", headers=auth_headers).status_code == 200
+    assert buffered.pending(diagram_id) is None
@@ -0,0 +1,40 @@
+"""Response compression and the HTTP cache validators that go with it."""
+import orjson
+import pytest
+
+@pytest.fixture
+def large_diagram(client, auth_headers, diagram):
+    """A diagram whose JSON is well over compression_minimum_size."""
+    nodes = [{"id": f"n{number}", "position": {"x": number, "y": 0}} for number in range(100)]
+    content = orjson.dumps({"nodes": nodes}).decode()
+    response = client.put(f"/diagrams/{diagram['id']}", json={"content": content}, headers=auth_headers)
+    assert response.status_code == 200, response.text
+    return diagram["id"]
+
+def _get(client, headers, path, encoding, **extra):
+    return client.get(path, headers={**headers, "Accept-Encoding": encoding, **extra})
+
+def test_vary_and_etag_per_encoding(client, auth_headers, large_diagram):
+    path = f"/diagrams/{large_diagram}"
+    identity = _get(client, auth_headers, path, "identity")
+    gzipped = _get(client, auth_headers, path, "gzip")
+    assert "content-encoding" not in identity.headers
+    assert gzipped.headers["content-encoding"] == "gzip"
+    for response in (identity, gzipped):
+        assert "Accept-Encoding" in response.headers["vary"]
+    assert gzipped.headers["etag"] != identity.headers["etag"]
+    assert gzipped.headers["etag"] == identity.headers["etag"][:-1] + '-gzip"'
+
+def test_small_bodies_vary_too(client, auth_headers):
+    response = _get(client, auth_headers, "/auth/me", "gzip")
+    assert "content-encoding" not in response.headers
+    assert "Accept-Encoding" in response.headers["vary"]
+
+def test_encoded_etag_revalidates(client, auth_headers, large_diagram):
+    path = f"/diagrams/{large_diagram}"
+    etag = _get(client, auth_headers, path, "gzip").headers["etag"]
+    assert _get(client, auth_headers, path, "gzip", **{"If-None-Match": etag}).status_code == 304
+    assert _get(client, auth_headers, path, "identity", **{"If-None-Match": etag}).status_code == 304
+    # And it is a valid precondition for a save
+    response = client.put(path, json={"name": "Renamed"}, headers={**auth_headers, "If-Match": etag})
+    assert response.status_code == 200, response.text
@@ -0,0 +1,43 @@
+"""Viewport queries of GET /diagrams/{id}/elements?bbox=..."""
+import time
+import orjson
+import pytest
+
+def _node(key, x, y, **size):
+    return {"id": key, "position": {"x": x, "y": y}, **size}
+
+def _save(client, headers, diagram_id, *nodes):
+    content = orjson.dumps({"nodes": list(nodes)}).decode()
+    response = client.put(f"/diagrams/{diagram_id}", json={"content": content}, headers=headers)
+    assert response.status_code == 200, response.text
+
+def _keys(client, headers, diagram_id, bbox):
+    response = client.get(f"/diagrams/{diagram_id}/elements", params={"bbox": bbox}, headers=headers)
+    assert response.status_code == 200, response.text
+    return sorted(orjson.loads(line)["element_key"] for line in response.text.splitlines())
+
+def test_viewport(client, auth_headers, diagram):
+    diagram_id = diagram["id"]
+    _save(client, auth_headers, diagram_id, _node("a", 0, 0, width=100, height=50), _node("b", 5000, 5000))
+    assert _keys(client, auth_headers, diagram_id, "0,0,200,200") == ["a"]
+    # Corners may come in any order
+    assert _keys(client, auth_headers, diagram_id, "200,200,0,0") == ["a"]
+    assert _keys(client, auth_headers, diagram_id, "-1e9,-1e9,1e9,1e9") == ["a", "b"]
+
+def test_huge_node_is_cheap(client, auth_headers, diagram):
+    diagram_id = diagram["id"]
+    _save(client, auth_headers, diagram_id, _node("huge", 0, 0, width=5e6, height=5e6), _node("small", 10, 10))
+    started = time.monotonic()
+    assert _keys(client, auth_headers, diagram_id, "0,0,200,200") == ["huge", "small"]
+    assert _keys(client, auth_headers, diagram_id, "4999000,4999000,4999100,4999100") == ["huge"]
+    assert time.monotonic() - started < 5
+
+@pytest.mark.parametrize("bbox", ["0,0,inf,inf", "nan,0,1,1", "-inf,0,0,0"])
+def test_non_finite_bbox(client, auth_headers, diagram, bbox):
+    response = client.get(f"/diagrams/{diagram['id']}/elements", params={"bbox": bbox}, headers=auth_headers)
+    assert response.status_code == 422
+
+@pytest.mark.parametrize("bbox", ["1,2,3", "a,b,c,d", ""])
+def test_malformed_bbox(client, auth_headers, diagram, bbox):
+    response = client.get(f"/diagrams/{diagram['id']}/elements", params={"bbox": bbox}, headers=auth_headers)
+    assert response.status_code == 400
@@ -0,0 +1,141 @@
+"""migrate_content.py against a database created by the first release of the schema."""
+import os
+import sqlite3
+import subprocess
+import sys
+import textwrap
+import orjson
+import pytest
+from conftest import BACKEND_DIR
+
+BASELINE_SCHEMA = """
+CREATE TABLE users (
+    id INTEGER NOT NULL, username VARCHAR NOT NULL, email VARCHAR NOT NULL,
+    hashed_password VARCHAR NOT NULL, created_at DATETIME DEFAULT (CURRENT_TIMESTAMP),
+    PRIMARY KEY (id)
+);
+CREATE UNIQUE INDEX ix_users_username ON users (username);
+CREATE UNIQUE INDEX ix_users_email ON users (email);
+CREATE INDEX ix_users_id ON users (id);
+CREATE TABLE projects (
+    id INTEGER NOT NULL, name VARCHAR NOT NULL, description TEXT, owner_id INTEGER NOT NULL,
+    created_at DATETIME DEFAULT (CURRENT_TIMESTAMP), updated_at DATETIME,
+    PRIMARY KEY (id), FOREIGN KEY(owner_id) REFERENCES users (id)
+);
+CREATE INDEX ix_projects_id ON projects (id);
+CREATE TABLE project_members (
+    user_id INTEGER NOT NULL, project_id INTEGER NOT NULL,
+    joined_at DATETIME DEFAULT (CURRENT_TIMESTAMP),
+    PRIMARY KEY (user_id, project_id),
+    FOREIGN KEY(user_id) REFERENCES users (id), FOREIGN KEY(project_id) REFERENCES projects (id)
+);
+CREATE TABLE diagrams (
+    id INTEGER NOT NULL, name VARCHAR NOT NULL, diagram_type VARCHAR(4) NOT NULL,
+    project_id INTEGER NOT NULL, content TEXT,
+    created_at DATETIME DEFAULT (CURRENT_TIMESTAMP), updated_at DATETIME,
+    PRIMARY KEY (id), FOREIGN KEY(project_id) REFERENCES projects (id)
+);
+CREATE INDEX ix_diagrams_id ON diagrams (id);
+CREATE TABLE project_invites (
+    id INTEGER NOT NULL, token VARCHAR NOT NULL, project_id INTEGER NOT NULL,
+    created_by INTEGER NOT NULL, expires_at DATETIME NOT NULL,
+    created_at DATETIME DEFAULT (CURRENT_TIMESTAMP), is_active BOOLEAN,
+    PRIMARY KEY (id),
+    FOREIGN KEY(project_id) REFERENCES projects (id), FOREIGN KEY(created_by) REFERENCES users (id)
+);
+CREATE INDEX ix_project_invites_id ON project_invites (id);
+CREATE UNIQUE INDEX ix_project_invites_token ON project_invites (token);
+CREATE TABLE diagram_elements (
+    id INTEGER NOT NULL, diagram_id INTEGER NOT NULL, element_type VARCHAR NOT NULL,
+    element_data TEXT NOT NULL, position_x INTEGER, position_y INTEGER,
+    created_at DATETIME DEFAULT (CURRENT_TIMESTAMP), updated_at DATETIME,
+    PRIMARY KEY (id), FOREIGN KEY(diagram_id) REFERENCES diagrams (id)
+);
+CREATE INDEX ix_diagram_elements_id ON diagram_elements (id);
+CREATE TABLE diagram_locks (
+    id INTEGER NOT NULL, user_id INTEGER NOT NULL, diagram_id INTEGER NOT NULL,
+    locked_at DATETIME DEFAULT (CURRENT_TIMESTAMP), is_active BOOLEAN,
+    PRIMARY KEY (id),
+    FOREIGN KEY(user_id) REFERENCES users (id), FOREIGN KEY(diagram_id) REFERENCES diagrams (id)
+);
+CREATE INDEX ix_diagram_locks_id ON diagram_locks (id);
+"""
+
+CONTENT = orjson.dumps({
+    "nodes": [
+        {"id": "a", "position": {"x": 0, "y": 0}, "data": {"label": "Start"}},
+        {"id": "b", "position": {"x": 100, "y": 0}, "data": {"label": "End"}},
+    ],
+    "edges": [{"id": "a-b", "source": "a", "target": "b"}],
+}).decode()
+
+def _baseline_database(path):
+    connection = sqlite3.connect(path)
+    connection.executescript(BASELINE_SCHEMA)
+    connection.execute("INSERT INTO users (id, username, email, hashed_password) VALUES (1, 'alice', 'alice@example.com', 'x')")
+    connection.execute("INSERT INTO projects (id, name, owner_id) VALUES (1, 'Project', 1)")
+    connection.execute(
+        "INSERT INTO diagrams (id, name, diagram_type, project_id, content) VALUES (1, 'Process', 'BPMN', 1, ?)",
+        (CONTENT,),
+    )
+    # Locks used to be released by flipping is_active, leaving several rows per diagram
+    connection.execute("INSERT INTO diagram_locks (id, user_id, diagram_id, is_active) VALUES (1, 1, 1, 0)")
+    connection.execute("INSERT INTO diagram_locks (id, user_id, diagram_id, is_active) VALUES (2, 1, 1, 1)")
+    # Left behind by a deleted diagram
+    connection.execute(
+        "INSERT INTO diagram_elements (id, diagram_id, element_type, element_data) VALUES (1, 99, 'node', '{}')"
+    )
+    connection.commit()
+    connection.close()
+
+def _run(args, database_url, **extra_env):
+    env = {**os.environ, "DATABASE_URL": database_url, **extra_env}
+    env.pop("ASYNC_DATABASE_URL", None)
+    return subprocess.run(
+        [sys.executable, *args], cwd=BACKEND_DIR, env=env, capture_output=True, text=True, timeout=120,
+    )
+
+def _columns(connection, table):
+    return {row[1] for row in connection.execute(f"PRAGMA table_info({table})")}
+
+def _indexes(connection, table):
+    return {row[1] for row in connection.execute(f"PRAGMA index_list({table})")}
+
+def test_upgrades_baseline_database(tmp_path):
+    path = tmp_path / "old.db"
+    _baseline_database(path)
+    database_url = f"sqlite:///{path}"
+
+    result = _run(["migrate_content.py"], database_url)
+    assert result.returncode == 0, result.stdout + result.stderr
+
+    connection = sqlite3.connect(path)
+    assert {"content_hash", "element_count", "revision"} <= _columns(connection, "diagrams")
+    assert "expires_at" in _columns(connection, "diagram_locks")
+    assert "token_version" in _columns(connection, "users")
+    assert "ux_diagram_locks_diagram_id" in _indexes(connection, "diagram_locks")
+    assert "ix_projects_owner_id_updated_at_id" in _indexes(connection, "projects")
+    assert connection.execute("SELECT id FROM diagram_locks").fetchall() == [(2,)]
+    assert connection.execute("SELECT revision FROM diagrams").fetchone() == (0,)
+    assert connection.execute("SELECT COUNT(*) FROM diagram_elements WHERE diagram_id = 99").fetchone() == (0,)
+    connection.close()
+
+    # Running it again is a no-op
+    result = _run(["migrate_content.py"], database_url)
+    assert result.returncode == 0, result.stdout + result.stderr
+
+@pytest.mark.parametrize("lock_store", ["memory", "database"])
+def test_app_starts_on_upgraded_database(tmp_path, lock_store):
+    path = tmp_path / "old.db"
+    _baseline_database(path)
+    database_url = f"sqlite:///{path}"
+    assert _run(["migrate_content.py"], database_url).returncode == 0
+
+    script = textwrap.dedent("""
+        from fastapi.testclient import TestClient
+        from main import app
+        with TestClient(app) as client:
+            assert client.get("/health").status_code == 200
+    """)
+    result = _run(["-c", script], database_url, LOCK_STORE=lock_store)
+    assert result.returncode == 0, result.stdout + result.stderr
@@ -0,0 +1,24 @@
+"""Internal counters are for operators holding PROFILING_TOKEN, not for every user."""
+import pytest
+from core.config import settings
+
+TOKEN = "operator-secret"
+
+OPERATOR_ENDPOINTS = [
+    "/auth/cache/stats",
+    "/auth/login/stats",
+    "/exports/stats",
+    "/profiles/",
+]
+
+@pytest.mark.parametrize("path", OPERATOR_ENDPOINTS)
+def test_hidden_without_profiling_token(client, auth_headers, monkeypatch, path):
+    monkeypatch.setattr(settings, "profiling_token", None)
+    assert client.get(path, headers=auth_headers).status_code == 404
+
+@pytest.mark.parametrize("path", OPERATOR_ENDPOINTS)
+def test_requires_profiling_token(client, auth_headers, monkeypatch, path):
+    monkeypatch.setattr(settings, "profiling_token", TOKEN)
+    assert client.get(path, headers=auth_headers).status_code == 403
+    assert client.get(path, headers={"X-Profile-Token": "wrong"}).status_code == 403
+    assert client.get(path, headers={"X-Profile-Token": TOKEN}).status_code == 200
@@ -0,0 +1,65 @@
+"""Keyset pagination of GET /projects/page."""
+from datetime import datetime, timedelta
+import pytest
+from core.database import SessionLocal
+from models.project import Project
+
+PAGE = 3
+
+@pytest.fixture
+def project_ids(client, auth_headers):
+    """Seven projects, most recently active first; one never had updated_at set."""
+    ids = []
+    for number in range(7):
+        response = client.post("/projects/", json={"name": f"Project {number}"}, headers=auth_headers)
+        assert response.status_code == 200, response.text
+        ids.append(response.json()["id"])
+    base = datetime(2024, 1, 1, 12, 0, 0)
+    with SessionLocal() as db:
+        for offset, project_id in enumerate(ids):
+            project = db.get(Project, project_id)
+            project.created_at = base + timedelta(minutes=offset)
+            project.updated_at = None if offset == 3 else base + timedelta(minutes=offset, seconds=30)
+        db.commit()
+    return ids[::-1]
+
+def _page(client, headers, cursor=None):
+    params = {"limit": PAGE}
+    if cursor:
+        params["cursor"] = cursor
+    response = client.get("/projects/page", params=params, headers=headers)
+    assert response.status_code == 200, response.text
+    body = response.json()
+    return [project["id"] for project in body["items"]], body["next_cursor"]
+
+def _walk(client, headers, between_pages=None):
+    seen, cursor = [], None
+    while True:
+        ids, cursor = _page(client, headers, cursor)
+        seen.extend(ids)
+        if cursor is None:
+            return seen
+        if between_pages is not None:
+            between_pages(ids)
+
+def test_pages_cover_every_project_once(client, auth_headers, project_ids):
+    assert _walk(client, auth_headers) == project_ids
+
+def test_anchor_deleted_between_pages(client, auth_headers, project_ids):
+    first, cursor = _page(client, auth_headers)
+    response = client.delete(f"/projects/{first[-1]}", headers=auth_headers)
+    assert response.status_code == 200, response.text
+    second, _ = _page(client, auth_headers, cursor)
+    assert second == project_ids[PAGE:2 * PAGE]
+
+def test_anchor_touched_between_pages(client, auth_headers, project_ids):
+    first, cursor = _page(client, auth_headers)
+    with SessionLocal() as db:
+        db.get(Project, first[-1]).updated_at = datetime(2030, 1, 1)
+        db.commit()
+    second, _ = _page(client, auth_headers, cursor)
+    assert second == project_ids[PAGE:2 * PAGE]
+
+def test_invalid_cursor(client, auth_headers):
+    response = client.get("/projects/page", params={"cursor": "not-a-cursor"}, headers=auth_headers)
+    assert response.status_code == 400
@@ -0,0 +1,26 @@
+"""Project lifecycle."""
+import orjson
+
+def _content(label):
+    return orjson.dumps({"nodes": [{"id": label, "position": {"x": 0, "y": 0}}]}).decode()
+
+def test_deleted_project_leaves_no_history(client, auth_headers, diagram):
+    diagram_id = diagram["id"]
+    response = client.put(f"/diagrams/{diagram_id}", json={"content": _content("old")}, headers=auth_headers)
+    assert response.status_code == 200, response.text
+    assert client.delete(f"/projects/{diagram['project_id']}", headers=auth_headers).status_code == 200
+
+    project_id = client.post("/projects/", json={"name": "Next"}, headers=auth_headers).json()["id"]
+    response = client.post(
+        f"/projects/{project_id}/diagrams/", json={"name": "Fresh", "diagram_type": "bpmn"}, headers=auth_headers,
+    )
+    assert response.status_code == 200, response.text
+    # SQLite hands the freed id out again
+    fresh_id = response.json()["id"]
+    assert fresh_id == diagram_id
+    response = client.put(f"/diagrams/{fresh_id}", json={"content": _content("new")}, headers=auth_headers)
+    assert response.status_code == 200, response.text
+
+    revisions = client.get(f"/diagrams/{fresh_id}/revisions", headers=auth_headers).json()
+    assert [revision["revision"] for revision in revisions] == [1]
+    assert client.get(f"/diagrams/{fresh_id}/elements", headers=auth_headers).json()[0]["element_key"] == "new"
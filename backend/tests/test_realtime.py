@@ -0,0 +1,35 @@
+"""Diagram hub (core/realtime.py) with stand-in sockets."""
+import asyncio
+from core.realtime import DiagramHub, MemoryBackend, Subscriber
+
+class BrokenSocket:
+    """Accepts the connection, then fails every send."""
+
+    def __init__(self):
+        self.closed_with = None
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, message):
+        raise RuntimeError("connection reset")
+
+    async def close(self, code):
+        self.closed_with = code
+
+def test_failed_send_closes_the_socket(caplog):
+    async def scenario():
+        hub = DiagramHub(MemoryBackend())
+        await hub.start()
+        socket = BrokenSocket()
+        subscriber = Subscriber(socket, user_id=1, username="alice")
+        await hub.connect(1, subscriber, {"revision": 0, "lock": None})
+        for _ in range(10):
+            await asyncio.sleep(0)
+        await hub.stop()
+        return socket, subscriber, hub
+
+    socket, subscriber, hub = asyncio.run(scenario())
+    assert socket.closed_with == 1011
+    assert hub.viewer_count(1) == 0
+    assert "Realtime sender of" in caplog.text
@@ -0,0 +1,35 @@
+"""Refresh token rotation (POST /auth/refresh)."""
+from datetime import datetime, timedelta, timezone
+import pytest
+from core.database import SessionLocal
+from crud.token import _expired, _hash_token
+from models.user import RefreshToken
+
+@pytest.fixture
+def refresh_token(client):
+    user = {"username": "refresher", "email": "refresher@example.com", "password": "password123"}
+    assert client.post("/auth/register", json=user).status_code == 200
+    response = client.post("/auth/token", data={"username": user["username"], "password": user["password"]})
+    return response.json()["refresh_token"]
+
+def test_rotation_and_expiry(client, refresh_token):
+    response = client.post("/auth/refresh", json={"refresh_token": refresh_token})
+    assert response.status_code == 200, response.text
+    assert response.json()["refresh_token"] != refresh_token
+    # The rotated-out token is spent
+    assert client.post("/auth/refresh", json={"refresh_token": refresh_token}).status_code == 401
+
+    response = client.post("/auth/token", data={"username": "refresher", "password": "password123"})
+    fresh = response.json()["refresh_token"]
+    with SessionLocal() as db:
+        db.query(RefreshToken).filter(RefreshToken.token_hash == _hash_token(fresh)).update(
+            {"expires_at": datetime.utcnow() - timedelta(minutes=1)}
+        )
+        db.commit()
+    assert client.post("/auth/refresh", json={"refresh_token": fresh}).status_code == 401
+
+@pytest.mark.parametrize("tzinfo", [None, timezone.utc], ids=["sqlite-naive", "postgres-aware"])
+def test_expiry_check_accepts_naive_and_aware_values(tzinfo):
+    now = datetime.now(timezone.utc).replace(tzinfo=tzinfo)
+    assert _expired(now - timedelta(seconds=1))
+    assert not _expired(now + timedelta(minutes=5))
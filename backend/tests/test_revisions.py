@@ -0,0 +1,33 @@
+"""Restoring diagram revisions."""
+import orjson
+from core.database import SessionLocal
+import crud
+
+def _content(*labels):
+    return orjson.dumps({"nodes": [
+        {"id": label, "position": {"x": 0, "y": 0}, "data": {"label": label}} for label in labels
+    ]}).decode()
+
+def test_restore_revision(client, auth_headers, diagram):
+    diagram_id = diagram["id"]
+    for content in (_content("a"), _content("a", "b")):
+        response = client.put(f"/diagrams/{diagram_id}", json={"content": content}, headers=auth_headers)
+        assert response.status_code == 200, response.text
+    first = response.json()["revision"] - 1
+
+    response = client.post(f"/diagrams/{diagram_id}/revisions/{first}/restore", headers=auth_headers)
+    assert response.status_code == 200, response.text
+    assert orjson.loads(response.json()["content"]) == orjson.loads(_content("a"))
+    elements = client.get(f"/diagrams/{diagram_id}/elements", headers=auth_headers).json()
+    assert [element["element_type"] for element in elements] == ["node"]
+
+def test_restore_rejects_invalid_revision(client, auth_headers, diagram):
+    diagram_id = diagram["id"]
+    # History written before content was validated: a node without a position
+    with SessionLocal() as db:
+        crud.record_diagram_revision(db, diagram_id=diagram_id, revision=50, content='{"nodes": [{"id": "a"}]}')
+        db.commit()
+
+    response = client.post(f"/diagrams/{diagram_id}/revisions/50/restore", headers=auth_headers)
+    assert response.status_code == 422
+    assert client.get(f"/diagrams/{diagram_id}", headers=auth_headers).json()["content"] != '{"nodes": [{"id": "a"}]}'
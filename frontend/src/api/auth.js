@@ -19,6 +19,10 @@ export const authAPI = {
     return response.data
   },
 
+  logout: async (refreshToken) => {
+    await apiClient.post('/auth/logout', { refresh_token: refreshToken })
+  },
+
   getCurrentUser: async () => {
     const response = await apiClient.get('/auth/me')
     return response.data
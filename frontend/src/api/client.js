@@ -23,13 +23,45 @@ apiClient.interceptors.request.use(
   }
 )
 
+let refreshPromise = null
+
+const refreshAccessToken = async () => {
+  const refreshToken = localStorage.getItem('refresh_token')
+  if (!refreshToken) {
+    throw new Error('No refresh token')
+  }
+  // Plain axios: the refresh call must not go through this interceptor again
+  const response = await axios.post(`${API_BASE_URL}/auth/refresh`, { refresh_token: refreshToken })
+  localStorage.setItem('access_token', response.data.access_token)
+  localStorage.setItem('refresh_token', response.data.refresh_token)
+  return response.data.access_token
+}
+
+// Single in-flight refresh shared by every request that got a 401 and by
+// realtime channels whose token was rejected
+export const refreshSession = () => {
+  refreshPromise = refreshPromise || refreshAccessToken().finally(() => {
+    refreshPromise = null
+  })
+  return refreshPromise
+}
+
 // Response interceptor to handle auth errors
 apiClient.interceptors.response.use(
   (response) => response,
-  (error) => {
-    if (error.response?.status === 401) {
-      localStorage.removeItem('access_token')
-      window.location.href = '/login'
+  async (error) => {
+    const request = error.config
+    if (error.response?.status === 401 && request && !request._retried) {
+      request._retried = true
+      try {
+        const token = await refreshSession()
+        request.headers.Authorization = `Bearer ${token}`
+        return apiClient(request)
+      } catch (refreshError) {
+        localStorage.removeItem('access_token')
+        localStorage.removeItem('refresh_token')
+        window.location.href = '/login'
+      }
     }
     return Promise.reject(error)
   }
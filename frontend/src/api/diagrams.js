@@ -7,7 +7,10 @@ export const diagramsAPI = {
   },
 
   getDiagram: async (diagramId) => {
-    const response = await apiClient.get(`/diagrams/${diagramId}`)
+    // Content arrives as a JSON value instead of a string that needs a second parse
+    const response = await apiClient.get(`/diagrams/${diagramId}`, {
+      params: { content_format: 'json' },
+    })
     return response.data
   },
 
@@ -21,6 +24,39 @@ export const diagramsAPI = {
     return response.data
   },
 
+  patchDiagramContent: async (diagramId, baseRevision, operations) => {
+    const response = await apiClient.patch(`/diagrams/${diagramId}/content`, {
+      base_revision: baseRevision,
+      operations,
+    })
+    return response.data
+  },
+
+  applyElementBatch: async (diagramId, baseRevision, batch) => {
+    const response = await apiClient.post(`/diagrams/${diagramId}/elements/batch`, {
+      base_revision: baseRevision,
+      ...batch,
+    })
+    return response.data
+  },
+
+  // Images need the auth header, so they are fetched as blobs and shown via object URLs
+  getDiagramThumbnail: async (diagramId, width) => {
+    const response = await apiClient.get(`/diagrams/${diagramId}/thumbnail`, {
+      params: width ? { width } : undefined,
+      responseType: 'blob',
+    })
+    return response.data
+  },
+
+  exportDiagram: async (diagramId, format = 'svg') => {
+    const response = await apiClient.get(`/diagrams/${diagramId}/export`, {
+      params: { format, download: true },
+      responseType: 'blob',
+    })
+    return response.data
+  },
+
   deleteDiagram: async (diagramId) => {
     const response = await apiClient.delete(`/diagrams/${diagramId}`)
     return response.data
@@ -31,6 +67,11 @@ export const diagramsAPI = {
     return response.data
   },
 
+  heartbeatDiagramLock: async (diagramId) => {
+    const response = await apiClient.post(`/diagrams/${diagramId}/lock/heartbeat`)
+    return response.data
+  },
+
   unlockDiagram: async (diagramId) => {
     const response = await apiClient.delete(`/diagrams/${diagramId}/lock`)
     return response.data
@@ -26,6 +26,28 @@ export const projectsAPI = {
     return response.data
   },
 
+  searchProject: async (projectId, query, params = {}) => {
+    const response = await apiClient.get(`/projects/${projectId}/search`, {
+      params: { q: query, ...params },
+    })
+    return response.data
+  },
+
+  exportProject: async (projectId) => {
+    const response = await apiClient.get(`/projects/${projectId}/export`, {
+      responseType: 'blob',
+    })
+    return response.data
+  },
+
+  importProject: async (archive, name) => {
+    const response = await apiClient.post('/projects/import', archive, {
+      params: name ? { name } : {},
+      headers: { 'Content-Type': 'application/x-ndjson' },
+    })
+    return response.data
+  },
+
   // Invite methods
   createInvite: async (projectId, expiresInHours = 24) => {
     const response = await apiClient.post(`/projects/${projectId}/invite`, {
@@ -1,4 +1,4 @@
-import React, { useCallback, useEffect, useMemo, useState } from 'react'
+import React, { useCallback, useEffect, useMemo, useRef, useState } from 'react'
 import ReactFlow, {
   MiniMap,
   Controls,
@@ -18,6 +18,8 @@ import toast from 'react-hot-toast'
 import ShapeNode from './nodes/ShapeNode'
 import ERDEdge from './edges/ERDEdge'
 import AttributeModal from './AttributeModal'
+import { createPatch } from '../utils/jsonPatch'
+import { createElementBatch } from '../utils/elementBatch'
 
 const CONTAINER_SHAPES = new Set(['lane', 'pool'])
 
@@ -204,11 +206,43 @@ const DiagramEditor = ({ diagram, diagramType, isLocked, lockUser, connectionTyp
     [getEdgeConfig]
   )
 
+  // Last content acknowledged by the server, used to send incremental patches
+  const savedContentRef = useRef({ revision: null, content: null })
+
+  const saveDiagramContent = useCallback(
+    async (content) => {
+      const { revision, content: savedContent } = savedContentRef.current
+      if (savedContent && revision !== null) {
+        const batch = createElementBatch(savedContent, content)
+        if (batch && batch.upsert.length === 0 && batch.delete.length === 0) {
+          return { revision }
+        }
+        try {
+          // Only the touched nodes/edges are sent and stored
+          if (batch) {
+            return await diagramsAPI.applyElementBatch(diagram.id, revision, batch)
+          }
+          const operations = createPatch(savedContent, content)
+          if (operations.length === 0) {
+            return { revision }
+          }
+          return await diagramsAPI.patchDiagramContent(diagram.id, revision, operations)
+        } catch (error) {
+          // Revision conflict or a change that no longer applies: send the full document
+          if (![409, 422].includes(error.response?.status)) throw error
+        }
+      }
+      return diagramsAPI.updateDiagram(diagram.id, { content: JSON.stringify(content) })
+    },
+    [diagram?.id]
+  )
+
   // Update diagram mutation
   const updateDiagramMutation = useMutation(
-    (data) => diagramsAPI.updateDiagram(diagram.id, data),
+    saveDiagramContent,
     {
-      onSuccess: () => {
+      onSuccess: (result, content) => {
+        savedContentRef.current = { revision: result.revision, content }
         toast.success('Diagram saved successfully!')
         setIsSaving(false)
       },
@@ -225,9 +259,12 @@ const DiagramEditor = ({ diagram, diagramType, isLocked, lockUser, connectionTyp
     
     // Small delay to show loading state
     const timer = setTimeout(() => {
+      savedContentRef.current = { revision: diagram?.revision ?? null, content: null }
       if (diagram?.content) {
         try {
-          const content = JSON.parse(diagram.content)
+          const content =
+            typeof diagram.content === 'string' ? JSON.parse(diagram.content) : diagram.content
+          savedContentRef.current.content = content
           const normalisedNodes = (content.nodes || []).map((node) =>
             isContainerShape(node?.data?.shape)
               ? {
@@ -488,8 +525,9 @@ const DiagramEditor = ({ diagram, diagramType, isLocked, lockUser, connectionTyp
     if (!diagram || isLocked) return
 
     setIsSaving(true)
-    const content = JSON.stringify({ nodes, edges })
-    updateDiagramMutation.mutate({ content })
+    // Round-trip through JSON so the snapshot matches what the server stores
+    const content = JSON.parse(JSON.stringify({ nodes, edges }))
+    updateDiagramMutation.mutate(content)
   }, [diagram, nodes, edges, isLocked, updateDiagramMutation])
 
   const handleExport = (format) => {
@@ -85,6 +85,7 @@ const DiagramTree = ({ diagrams, selectedDiagram, onSelectDiagram }) => {
               </div>
               <p className="text-xs text-gray-500">
                 {new Date(diagram.updated_at || diagram.created_at).toLocaleDateString()}
+                {diagram.element_count != null && ` · ${diagram.element_count} elements`}
               </p>
             </div>
           </div>
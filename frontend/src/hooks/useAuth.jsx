@@ -24,6 +24,7 @@ export const AuthProvider = ({ children }) => {
           setUser(userData)
         } catch (error) {
           localStorage.removeItem('access_token')
+          localStorage.removeItem('refresh_token')
         }
       }
       setIsLoading(false)
@@ -51,6 +52,7 @@ export const AuthProvider = ({ children }) => {
     try {
       const response = await authAPI.login(username, password)
       localStorage.setItem('access_token', response.access_token)
+      localStorage.setItem('refresh_token', response.refresh_token)
       const userData = await authAPI.getCurrentUser()
       setUser(userData)
       return { success: true }
@@ -75,7 +77,13 @@ export const AuthProvider = ({ children }) => {
   }
 
   const logout = () => {
+    const refreshToken = localStorage.getItem('refresh_token')
+    if (refreshToken) {
+      // Best effort: the tokens are dropped locally either way
+      authAPI.logout(refreshToken).catch(() => {})
+    }
     localStorage.removeItem('access_token')
+    localStorage.removeItem('refresh_token')
     setUser(null)
   }
 
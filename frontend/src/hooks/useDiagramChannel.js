@@ -0,0 +1,68 @@
+import { useEffect, useRef } from 'react'
+import { refreshSession } from '../api/client'
+
+const RECONNECT_DELAY_MS = 3000
+const POLICY_VIOLATION = 1008
+
+const buildChannelUrl = (diagramId, token) => {
+  const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:'
+  return `${protocol}//${window.location.host}/api/ws/diagrams/${diagramId}?token=${encodeURIComponent(token)}`
+}
+
+// Subscribes to the server push stream of a diagram (content, lock and
+// presence events) and reconnects if the connection drops.
+export const useDiagramChannel = (diagramId, onEvent) => {
+  const handlerRef = useRef(onEvent)
+
+  useEffect(() => {
+    handlerRef.current = onEvent
+  }, [onEvent])
+
+  useEffect(() => {
+    if (!diagramId || !localStorage.getItem('access_token')) return undefined
+
+    let socket = null
+    let closed = false
+    let retryTimer = null
+    let refreshed = false
+
+    const connect = () => {
+      // Read on every attempt: refreshes rotate the token while the diagram is open
+      const token = localStorage.getItem('access_token')
+      if (closed || !token) return
+      socket = new WebSocket(buildChannelUrl(diagramId, token))
+
+      socket.onopen = () => {
+        refreshed = false
+      }
+
+      socket.onmessage = (message) => {
+        try {
+          handlerRef.current?.(JSON.parse(message.data))
+        } catch (error) {
+          console.error('Failed to handle diagram event', error)
+        }
+      }
+
+      socket.onclose = (event) => {
+        if (closed) return
+        if (event.code !== POLICY_VIOLATION) {
+          retryTimer = setTimeout(connect, RECONNECT_DELAY_MS)
+        } else if (!refreshed) {
+          // 1008: the token expired or there is no access; a fresh token
+          // settles which, and a second rejection ends the channel
+          refreshed = true
+          refreshSession().then(connect).catch(() => {})
+        }
+      }
+    }
+
+    connect()
+
+    return () => {
+      closed = true
+      clearTimeout(retryTimer)
+      socket?.close()
+    }
+  }, [diagramId])
+}
@@ -1,4 +1,4 @@
-import React, { useState, useEffect, useRef } from 'react'
+import React, { useState, useEffect, useRef, useCallback } from 'react'
 import { useParams, useNavigate } from 'react-router-dom'
 import { useQuery, useMutation, useQueryClient } from 'react-query'
 import { projectsAPI, diagramsAPI } from '../api'
@@ -7,9 +7,12 @@ import DiagramEditor from '../components/DiagramEditor'
 import DiagramTree from '../components/DiagramTree'
 import DiagramPalette from '../components/DiagramPalette'
 import { useAuth } from '../hooks/useAuth'
+import { useDiagramChannel } from '../hooks/useDiagramChannel'
 import { ArrowLeft, Plus, FileText, Share2, Copy, X } from 'lucide-react'
 import toast from 'react-hot-toast'
 
+const LOCK_HEARTBEAT_INTERVAL_MS = 20000
+
 const ProjectPage = () => {
   const { projectId } = useParams()
   const navigate = useNavigate()
@@ -31,12 +34,19 @@ const ProjectPage = () => {
     () => projectsAPI.getProject(projectId)
   )
 
-  // Fetch diagrams
+  // Fetch diagrams (summaries only, without content)
   const { data: diagrams = [], isLoading: diagramsLoading } = useQuery(
     ['diagrams', projectId],
     () => diagramsAPI.getDiagrams(projectId)
   )
 
+  // Fetch the full content of the opened diagram; refetching would reset the editor
+  const { data: openedDiagram } = useQuery(
+    ['diagram', selectedDiagram?.id],
+    () => diagramsAPI.getDiagram(selectedDiagram.id),
+    { enabled: !!selectedDiagram?.id, cacheTime: 0, refetchOnWindowFocus: false }
+  )
+
   // Create diagram mutation
   const createDiagramMutation = useMutation(
     (data) => diagramsAPI.createDiagram(projectId, data),
@@ -99,6 +109,21 @@ const ProjectPage = () => {
     }
 
     let cancelled = false
+    let heartbeatTimer = null
+
+    // Locks are leases: keep ours alive while the diagram is open
+    const startHeartbeat = () => {
+      clearInterval(heartbeatTimer)
+      heartbeatTimer = setInterval(() => {
+        diagramsAPI.heartbeatDiagramLock(diagramId).catch((error) => {
+          if (error.response?.status === 409) {
+            // Lease expired (e.g. the tab was asleep): try to take it again
+            clearInterval(heartbeatTimer)
+            acquireLock()
+          }
+        })
+      }, LOCK_HEARTBEAT_INTERVAL_MS)
+    }
 
     const acquireLock = async () => {
       try {
@@ -117,6 +142,7 @@ const ProjectPage = () => {
 
         if (lockData?.user?.id === userId) {
           heldLockRef.current = { diagramId, userId }
+          startHeartbeat()
         } else {
           heldLockRef.current = null
         }
@@ -137,6 +163,7 @@ const ProjectPage = () => {
 
     return () => {
       cancelled = true
+      clearInterval(heartbeatTimer)
 
       const heldLock = heldLockRef.current
       if (heldLock && heldLock.diagramId === diagramId) {
@@ -151,6 +178,24 @@ const ProjectPage = () => {
     }
   }, [selectedDiagram?.id, user?.id])
 
+  // Lock changes are pushed by the server instead of being re-fetched
+  const handleDiagramEvent = useCallback((event) => {
+    if (event.type === 'snapshot' && event.lock) {
+      setDiagramLock(event.lock)
+    } else if (event.type === 'lock.acquired') {
+      setDiagramLock(event.lock)
+    } else if (event.type === 'lock.released') {
+      setDiagramLock((currentLock) =>
+        currentLock?.user?.id === event.user_id ? null : currentLock
+      )
+    } else if (event.type === 'diagram.deleted') {
+      queryClient.invalidateQueries(['diagrams', projectId])
+      setSelectedDiagram(null)
+    }
+  }, [projectId, queryClient])
+
+  useDiagramChannel(selectedDiagram?.id, handleDiagramEvent)
+
   const handleCreateDiagram = () => {
     if (!newDiagramName.trim()) {
       toast.error('Please enter a diagram name')
@@ -264,7 +309,7 @@ const ProjectPage = () => {
         <div className="flex-1 flex flex-col overflow-hidden">
           {selectedDiagram ? (
             <DiagramEditor
-              diagram={selectedDiagram}
+              diagram={openedDiagram}
               diagramType={selectedDiagram.diagram_type}
               isLocked={isDiagramLockedForEditing}
               lockUser={lockOwnerLabel}
@@ -0,0 +1,59 @@
+// Builds an element batch (upserts and deletes of nodes/edges by id) that
+// turns the last saved diagram document into the current one. Returns null
+// when the change cannot be expressed that way, e.g. elements were reordered
+// or an element has no id, so the caller can fall back to a JSON Patch.
+
+const COLLECTIONS = { node: 'nodes', edge: 'edges' }
+
+const isEqual = (a, b) => JSON.stringify(a) === JSON.stringify(b)
+
+const diffCollection = (elementType, before = [], after = []) => {
+  if (![...before, ...after].every((element) => element && element.id != null)) {
+    return null
+  }
+  const hasDuplicates = (elements) =>
+    new Set(elements.map((element) => String(element.id))).size !== elements.length
+  if (hasDuplicates(before) || hasDuplicates(after)) {
+    return null
+  }
+
+  const previousById = new Map(before.map((element) => [String(element.id), element]))
+  const nextIds = new Set(after.map((element) => String(element.id)))
+  const kept = before.filter((element) => nextIds.has(String(element.id)))
+  const added = after.filter((element) => !previousById.has(String(element.id)))
+
+  // The server replaces elements in place and appends new ones, so the new
+  // order must be the surviving old order followed by the additions
+  const expectedOrder = [...kept, ...added].map((element) => String(element.id))
+  if (!isEqual(expectedOrder, after.map((element) => String(element.id)))) {
+    return null
+  }
+
+  const upsert = after
+    .filter((element) => !isEqual(previousById.get(String(element.id)), element))
+    .map((element) => ({ element_type: elementType, data: element }))
+  const remove = before
+    .filter((element) => !nextIds.has(String(element.id)))
+    .map((element) => ({ element_type: elementType, key: String(element.id) }))
+  return { upsert, delete: remove }
+}
+
+export const createElementBatch = (previous, next) => {
+  const keys = new Set([...Object.keys(previous), ...Object.keys(next)])
+  for (const key of keys) {
+    if (!Object.values(COLLECTIONS).includes(key) && !isEqual(previous[key], next[key])) {
+      return null
+    }
+  }
+
+  const batch = { upsert: [], delete: [] }
+  for (const [elementType, collection] of Object.entries(COLLECTIONS)) {
+    const diff = diffCollection(elementType, previous[collection], next[collection])
+    if (diff === null) {
+      return null
+    }
+    batch.upsert.push(...diff.upsert)
+    batch.delete.push(...diff.delete)
+  }
+  return batch
+}
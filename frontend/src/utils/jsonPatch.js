@@ -0,0 +1,58 @@
+// Builds RFC 6902 operations that turn the last saved diagram document into
+// the current one. Arrays are compared element by element so that moving a
+// single node only sends that node instead of the whole diagram.
+
+const escapePointerToken = (token) => String(token).replace(/~/g, '~0').replace(/\//g, '~1')
+
+const isEqual = (a, b) => JSON.stringify(a) === JSON.stringify(b)
+
+const diffArray = (path, before, after) => {
+  const operations = []
+  const common = Math.min(before.length, after.length)
+
+  for (let index = 0; index < common; index += 1) {
+    if (!isEqual(before[index], after[index])) {
+      operations.push({ op: 'replace', path: `${path}/${index}`, value: after[index] })
+    }
+  }
+  for (let index = common; index < after.length; index += 1) {
+    operations.push({ op: 'add', path: `${path}/-`, value: after[index] })
+  }
+  // Remove from the end so earlier indices stay valid
+  for (let index = before.length - 1; index >= common; index -= 1) {
+    operations.push({ op: 'remove', path: `${path}/${index}` })
+  }
+
+  // Shifting an array (e.g. deleting its first item) touches every element;
+  // replacing it outright is smaller in that case
+  if (operations.length > Math.max(after.length / 2, 1)) {
+    return [{ op: 'replace', path, value: after }]
+  }
+  return operations
+}
+
+export const createPatch = (previous, next) => {
+  const operations = []
+
+  Object.keys(next).forEach((key) => {
+    const path = `/${escapePointerToken(key)}`
+    const before = previous[key]
+    const after = next[key]
+
+    if (!(key in previous)) {
+      operations.push({ op: 'add', path, value: after })
+    } else if (Array.isArray(before) && Array.isArray(after)) {
+      operations.push(...diffArray(path, before, after))
+    } else if (!isEqual(before, after)) {
+      operations.push({ op: 'replace', path, value: after })
+    }
+  })
+
+  Object.keys(previous).forEach((key) => {
+    if (!(key in next)) {
+      operations.push({ op: 'remove', path: `/${escapePointerToken(key)}` })
+    }
+  })
+
+  return operations
+}